@@ -0,0 +1,182 @@
+"""Load test: how many inverters can one poller process handle?
+
+Spins up N simulated inverters on localhost (in a separate process, so they do not
+skew the poller's CPU and memory figures) and polls them with `Sermatec` clients
+at a target rate. Results are printed and written as JSON.
+
+Usage:
+    python3 benchmarks/loadtest.py --inverters 50 --rate 1 --duration 30 --output loadtest.json
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sermatec_inverter import Sermatec
+from sermatec_inverter.simulator import SermatecSimulator
+from sermatec_inverter.exceptions import *
+
+DEFAULT_COMMANDS = ["batteryStatus", "gridPVStatus", "runningStatus", "bmsStatus"]
+
+def percentile(sortedValues : list[float], fraction : float) -> float:
+    if not sortedValues:
+        return float("nan")
+    index = min(len(sortedValues) - 1, max(0, round(fraction * (len(sortedValues) - 1))))
+    return sortedValues[index]
+
+def currentRssKiB() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def runSimulators(count : int, options : dict, connection) -> None:
+    """Child process: run `count` simulators and report their ports and request counts."""
+    async def main():
+        simulators = [SermatecSimulator(port = 0, seed = index, **options) for index in range(count)]
+        for simulator in simulators:
+            await simulator.start()
+        connection.send([simulator.port for simulator in simulators])
+        # Wait for the stop request without blocking the loop.
+        await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+        connection.send(sum(simulator.requestsCount for simulator in simulators))
+        for simulator in simulators:
+            await simulator.stop()
+
+    asyncio.run(main())
+
+async def pollInverter(port : int, args : argparse.Namespace, stopAt : float, stats : dict) -> None:
+    smc = Sermatec("127.0.0.1", port)
+    smc.setRateLimit(args.rateLimit, args.rateLimit or 1)
+    if not await smc.connect(version = args.pcuVersion):
+        stats["connectFailures"] += 1
+        return
+
+    interval = 1 / args.rate
+    # The first poll is due one interval after connecting, it can't be late already.
+    nextPoll = time.monotonic() + interval
+    while nextPoll < stopAt:
+        delay = nextPoll - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats["missedDeadlines"] += 1
+
+        started = time.perf_counter()
+        try:
+            for command in args.commands:
+                await smc.get(command)
+        except (CommunicationError, ConnectionResetError, NotConnected):
+            stats["failedPolls"] += 1
+            if not smc.isConnected():
+                await smc.connect(version = args.pcuVersion)
+        else:
+            stats["latencies"].append(time.perf_counter() - started)
+            stats["polls"] += 1
+
+        nextPoll += interval
+
+    # Every attempt above the first of each query (including failed ones) is a retry.
+    stats["retries"] += sum(round(histogram.sum) - histogram.count for histogram in smc.metrics.attempts.values())
+    await smc.disconnect()
+
+async def runLoadTest(args : argparse.Namespace, ports : list[int]) -> dict:
+    stats = {
+        "latencies"         : [],
+        "polls"             : 0,
+        "failedPolls"       : 0,
+        "missedDeadlines"   : 0,
+        "connectFailures"   : 0,
+        "retries"           : 0,
+    }
+
+    cpuStart  = time.process_time()
+    wallStart = time.monotonic()
+    stopAt    = wallStart + args.duration
+
+    await asyncio.gather(*(pollInverter(port, args, stopAt, stats) for port in ports))
+
+    wall = time.monotonic() - wallStart
+    cpu  = time.process_time() - cpuStart
+    latencies = sorted(stats["latencies"])
+
+    return {
+        "polls"             : stats["polls"],
+        "failedPolls"       : stats["failedPolls"],
+        "missedDeadlines"   : stats["missedDeadlines"],
+        "connectFailures"   : stats["connectFailures"],
+        "retries"           : stats["retries"],
+        "throughputPollsPerSecond" : stats["polls"] / wall,
+        "latencyMs"         : {
+            "p50"   : percentile(latencies, 0.50) * 1000,
+            "p95"   : percentile(latencies, 0.95) * 1000,
+            "p99"   : percentile(latencies, 0.99) * 1000,
+            "max"   : (latencies[-1] if latencies else float("nan")) * 1000,
+        },
+        "cpuSeconds"        : cpu,
+        "cpuPercent"        : 100 * cpu / wall,
+        "rssKiB"            : currentRssKiB(),
+        "maxRssKiB"         : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "wallSeconds"       : wall,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Poll many simulated inverters from one process.")
+    parser.add_argument("--inverters", help = "Number of simulated inverters.", type = int, default = 10)
+    parser.add_argument("--rate", help = "Polls per second per inverter.", type = float, default = 1.0)
+    parser.add_argument("--rateLimit", help = "Requests per second per inverter allowed by the client's rate limiter (unlimited by default).", type = float, default = None)
+    parser.add_argument("--duration", help = "Test duration in seconds.", type = float, default = 10.0)
+    parser.add_argument("--commands", help = "Datasets queried in each poll.", nargs = "+", default = DEFAULT_COMMANDS)
+    parser.add_argument("--pcuVersion", help = "PCU version of the simulated inverters.", type = int, default = 603)
+    parser.add_argument("--latency", help = "Simulated reply latency in seconds.", type = float, default = 0.0)
+    parser.add_argument("--jitter", help = "Simulated reply jitter in seconds.", type = float, default = 0.0)
+    parser.add_argument("--dropRate", help = "Probability of a dropped reply.", type = float, default = 0.0)
+    parser.add_argument("--corruptRate", help = "Probability of a corrupted reply.", type = float, default = 0.0)
+    parser.add_argument("--output", help = "Where to write JSON results.", type = Path, default = None)
+    args = parser.parse_args()
+
+    simulatorOptions = {
+        "pcuVersion"    : args.pcuVersion,
+        "latency"       : args.latency,
+        "jitter"        : args.jitter,
+        "dropRate"      : args.dropRate,
+        "corruptRate"   : args.corruptRate,
+    }
+
+    parentConnection, childConnection = multiprocessing.Pipe()
+    simulatorProcess = multiprocessing.Process(target = runSimulators, args = (args.inverters, simulatorOptions, childConnection))
+    simulatorProcess.start()
+    ports = parentConnection.recv()
+
+    results = asyncio.run(runLoadTest(args, ports))
+
+    parentConnection.send("stop")
+    requests = parentConnection.recv()
+    simulatorProcess.join()
+
+    results["requests"] = requests
+
+    report = {
+        "benchmark" : "loadtest",
+        "timestamp" : time.time(),
+        "python"    : platform.python_version(),
+        "platform"  : platform.platform(),
+        "config"    : {key: (str(value) if isinstance(value, Path) else value) for key, value in vars(args).items()},
+        "results"   : results,
+    }
+
+    print(json.dumps(report["results"], indent = 2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent = 2))
+        print(f"Results written to {args.output}.")
+
+if __name__ == "__main__":
+    main()
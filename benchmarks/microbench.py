@@ -0,0 +1,206 @@
+"""Microbenchmarks of the parser, codec and feature discovery hot paths.
+
+Reports operations per second and peak memory allocated by a single call,
+and compares the results against a stored baseline.
+
+Usage:
+    python3 benchmarks/microbench.py                       # run and compare with benchmarks/baseline.json
+    python3 benchmarks/microbench.py --saveBaseline        # store the results as a new baseline
+    python3 benchmarks/microbench.py --filter parseReply   # run only matching benchmarks
+"""
+import sys
+import json
+import time
+import argparse
+import itertools
+import platform
+import subprocess
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from sermatec_inverter import Sermatec
+from sermatec_inverter.protocol_parser import SermatecProtocolParser
+from sermatec_inverter.exceptions import *
+
+REPOSITORY_ROOT     = Path(__file__).resolve().parents[1]
+DUMPS_FOLDER        = REPOSITORY_ROOT / "dumps"
+PACKAGE_FOLDER      = REPOSITORY_ROOT / "src" / "sermatec_inverter"
+PROTOCOL_PATH       = PACKAGE_FOLDER / "protocol-en.json"
+LANGUAGE_PATH       = PACKAGE_FOLDER / "translations" / "en.csv"
+DEFAULT_BASELINE    = Path(__file__).resolve().parent / "baseline.json"
+
+PCU_VERSIONS        = [0, 252, 258, 259, 500, 603]
+REPLY_DUMPS         = ["98", "0a", "0b", "0c_ongrid", "0c_offgrid", "0d"]
+
+def currentCommit() -> str | None:
+    """Get the commit of the measured library ("-dirty" when src has uncommitted changes), None outside of git."""
+    def git(*arguments : str) -> str:
+        return subprocess.run(["git", *arguments], cwd = REPOSITORY_ROOT, capture_output = True, text = True, check = True).stdout.strip()
+
+    try:
+        commit = git("rev-parse", "--short=12", "HEAD")
+        if git("status", "--porcelain", "--", "src"):
+            commit += "-dirty"
+        return commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(function : Callable[[], object], minTime : float, repeats : int) -> dict:
+    """Measure operations per second (best of repeats) and peak allocation of one call."""
+    # Calibrate the number of calls to take at least minTime.
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= minTime / 10:
+            break
+        number *= 2
+
+    # Split minTime among the repeats.
+    number = max(1, int(number * minTime / repeats / elapsed))
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started) / number)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "opsPerSecond"  : 1 / best,
+        "allocBytes"    : peak - before,
+    }
+
+def reframe(parser : SermatecProtocolParser, frame : bytes) -> bytes:
+    # Some dumps are anonymized and have a wrong checksum, build them again.
+    return bytes(parser.generateResponse(frame[4], frame[7:-2]))
+
+def collectBenchmarks() -> dict[str, Callable[[], object]]:
+    parser = SermatecProtocolParser(PROTOCOL_PATH, LANGUAGE_PATH)
+    smc    = Sermatec("127.0.0.1", 8899)
+    benchmarks : dict[str, Callable[[], object]] = {}
+
+    frames = {name: reframe(parser, (DUMPS_FOLDER / name).read_bytes()) for name in REPLY_DUMPS}
+
+    for name, frame in frames.items():
+        for version in PCU_VERSIONS:
+            try:
+                parser.parseReply(frame[4], version, frame)
+            except CommandNotFoundInProtocol:
+                continue
+            benchmarks[f"parseReply[{name}@{version}]"] = lambda frame = frame, version = version: parser.parseReply(frame[4], version, frame)
+
+    # Polling replies alternating in a single field.
+    for name in ["0b", "0c_ongrid"]:
+        frame   = frames[name]
+        changed = bytearray(frame)
+        changed[parser.REPLY_OFFSET_DATA] ^= 0x01
+        changed = reframe(parser, bytes(changed))
+        incrementalParser = SermatecProtocolParser(PROTOCOL_PATH, LANGUAGE_PATH)
+        replies = itertools.cycle([frame, changed])
+        benchmarks[f"parseReplyIncremental[{name}@603]"] = lambda command = frame[4], replies = replies, incrementalParser = incrementalParser: incrementalParser.parseReplyIncremental(command, 603, next(replies))
+
+    parameterFrames = {
+        0x0c : frames["0c_ongrid"],
+        0x95 : bytes(parser.generateResponse(0x95, bytes(parser.getPayloadLength(0x95, 603)))),
+        0x9d : bytes(parser.generateResponse(0x9d, bytes(parser.getPayloadLength(0x9d, 603)))),
+    }
+    for command, frame in parameterFrames.items():
+        benchmarks[f"parseParameterReply[{command:02x}@603]"] = lambda command = command, frame = frame: parser.parseParameterReply(command, 603, frame)
+
+    benchmarks["checkResponseIntegrity[0b]"]    = lambda: parser.checkResponseIntegrity([frames["0b"]], 0x0b)
+    benchmarks["checkResponseIntegrity[95+9d]"] = lambda: parser.checkResponseIntegrity([parameterFrames[0x95], parameterFrames[0x9d]], 0x95)
+
+    taggedData = {}
+    taggedData.update(parser.parseParameterReply(0x95, 603, parameterFrames[0x95]))
+    taggedData.update(parser.parseParameterReply(0x0c, 603, frames["0c_ongrid"]))
+    taggedData.update(parser.parseParameterReply(0x9d, 603, parameterFrames[0x9d]))
+    payload66 = parser.build66Payload(taggedData)
+
+    benchmarks["generateRequest[0b]"]           = lambda: parser.generateRequest(0x0b)
+    benchmarks["generateRequest[66]"]           = lambda: parser.generateRequest(0x66, payload66)
+    benchmarks["build66Payload"]                = lambda: parser.build66Payload(taggedData)
+    benchmarks["build64Payload"]                = lambda: parser.build64Payload(taggedData)
+    benchmarks["buildPayload[6a@603]"]          = lambda: parser.buildPayload(0x6a, taggedData, 603)
+
+    for version in [259, 603]:
+        benchmarks[f"listSensors[{version}]"]       = lambda version = version: smc.listSensors(version)
+        benchmarks[f"listBinarySensors[{version}]"] = lambda version = version: smc.listBinarySensors(version)
+
+    benchmarks["parserConstruction"]            = lambda: SermatecProtocolParser(PROTOCOL_PATH, LANGUAGE_PATH)
+
+    return benchmarks
+
+def compare(results : dict, baseline : dict, threshold : float) -> list[str]:
+    """Print a comparison with the baseline and return names of regressed benchmarks."""
+    regressions = []
+    print(f"{'benchmark':45} {'ops/s':>12} {'baseline':>12} {'change':>8} {'alloc B':>10}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference:
+            change = result["opsPerSecond"] / reference["opsPerSecond"] - 1
+            flag   = ""
+            if change < -threshold:
+                regressions.append(name)
+                flag = " !"
+            print(f"{name:45} {result['opsPerSecond']:12.1f} {reference['opsPerSecond']:12.1f} {change:+8.1%} {result['allocBytes']:10d}{flag}")
+        else:
+            print(f"{name:45} {result['opsPerSecond']:12.1f} {'-':>12} {'-':>8} {result['allocBytes']:10d}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Run microbenchmarks of the library hot paths.")
+    parser.add_argument("--filter", help = "Run only benchmarks containing this string.", default = "")
+    parser.add_argument("--minTime", help = "Minimal time spent in each benchmark in seconds.", type = float, default = 0.5)
+    parser.add_argument("--repeats", help = "How many times to repeat each measurement.", type = int, default = 5)
+    parser.add_argument("--baseline", help = "Baseline JSON to compare with.", type = Path, default = DEFAULT_BASELINE)
+    parser.add_argument("--saveBaseline", help = "Store the results as the baseline.", action = "store_true")
+    parser.add_argument("--threshold", help = "Slowdown reported as a regression (0.1 = 10 %%).", type = float, default = 0.1)
+    parser.add_argument("--output", help = "Where to write JSON results.", type = Path, default = None)
+    args = parser.parse_args()
+
+    results = {}
+    for name, function in collectBenchmarks().items():
+        if args.filter in name:
+            results[name] = measure(function, args.minTime, args.repeats)
+
+    report = {
+        "benchmark" : "microbench",
+        "timestamp" : time.time(),
+        # Baselines are only comparable with the code they were measured at.
+        "commit"    : currentCommit(),
+        "python"    : platform.python_version(),
+        "platform"  : platform.platform(),
+        "results"   : results,
+    }
+
+    baseline = {}
+    if args.baseline.exists():
+        baselineReport = json.loads(args.baseline.read_text())
+        baseline = baselineReport["results"]
+        print(f"Baseline measured at commit {baselineReport.get('commit') or 'unknown'}.")
+
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.output:
+        args.output.write_text(json.dumps(report, indent = 2))
+    if args.saveBaseline:
+        args.baseline.write_text(json.dumps(report, indent = 2))
+        print(f"Baseline written to {args.baseline}.")
+    elif regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
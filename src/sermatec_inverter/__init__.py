@@ -1,11 +1,24 @@
 import logging
 import asyncio
+import time
 from pathlib import Path
 from collections.abc import Callable
 from typing import Type
 
 from . import protocol_parser
 from .exceptions import *
+from .metrics import SermatecMetrics
+from .tracing import SermatecObserver
+from .writequeue import SermatecWriteQueue
+from .events import SermatecBitEvent, SermatecEventDetector
+from .history import SermatecHistory
+from .aggregates import SermatecAggregates
+from .store import SermatecColumnStore
+from .fanout import SermatecFanOut, SermatecOverflowPolicy, SermatecSubscription
+from .ratelimit import SermatecTokenBucket
+from .scheduler import SermatecRequestClass, SermatecRequestScheduler
+from .snapshot import SermatecMultiSnapshot, SermatecSnapshotPart
+from .translations import SermatecTranslations
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -14,6 +27,18 @@ class Sermatec:
     QUERY_WRITE_TIMEOUT     = 5
     QUERY_READ_TIMEOUT      = 5
     QUERY_ATTEMPTS          = 5
+    # How long setDebounced() collects writes before sending them.
+    WRITE_DEBOUNCE_WINDOW   = 0.5
+    # How old cached parameter data can be used for building set payloads [s].
+    PARAMETER_CACHE_MAX_AGE = 30
+    # Requests per second (and burst) sent to one dongle, including retries.
+    # Unlimited by default (requests are serialized anyway), see setRateLimit().
+    RATE_LIMIT              = None
+    RATE_LIMIT_BURST        = 1
+    # Waiting time promoting a queued request by one priority class [s].
+    REQUEST_AGING_INTERVAL  = 5
+    # Commands describing the current state of the inverter, see getSnapshot().
+    SNAPSHOT_COMMANDS       = [0x0a, 0x0b, 0x0c, 0x0d]
 
     LANG_FILES_FOLDER       = Path(__file__).parent / "translations";
 
@@ -30,11 +55,36 @@ class Sermatec:
 
         self.host = host
         self.port = port
+        self.language = language
         self.connected = False
         self.parser = protocol_parser.SermatecProtocolParser(protocolFilePath, lang_file_path)
         self.pcuVersion = 0
+        self.metrics = SermatecMetrics()
+        self.__observers : list[SermatecObserver] = []
+        self.writeQueue = SermatecWriteQueue(self, self.WRITE_DEBOUNCE_WINDOW)
+        # Shared by all connections to the same dongle, see setRateLimit().
+        self.rateLimiter = SermatecTokenBucket.forHost(host, port, self.RATE_LIMIT, self.RATE_LIMIT_BURST)
+        # Queries (e.g. polling and queued writes) must not interleave on the connection,
+        # the scheduler runs them one by one, writes first.
+        self.scheduler = SermatecRequestScheduler(self.REQUEST_AGING_INTERVAL)
+        # Last tagged parameter state and its monotonic timestamp.
+        self.__parameterCache : dict | None = None
+        self.__parameterCacheTime : float = 0.0
+        self.__eventListeners : list[Callable[[SermatecBitEvent], None]] = []
+        self.__eventDetector : SermatecEventDetector | None = None
+        # Optional history of polled values, see enableHistory().
+        self.history : SermatecHistory | None = None
+        # Optional derived sensors, see enableAggregates().
+        self.aggregates : SermatecAggregates | None = None
+        # Optional on-disk history, see enableStore().
+        self.store : SermatecColumnStore | None = None
+        # Subscribers of parsed data, see subscribe().
+        self.fanOut = SermatecFanOut()
+        # Latest reply of each command and the number of the last one, see getSnapshot().
+        self.__latestParts : dict[int, SermatecSnapshotPart] = {}
+        self.__replySequence = 0
     
-    async def __sendQueryAttempt(self, command : int, dataToSend : bytes, responsesCount : int) -> list[bytes]:
+    async def __sendQueryAttempt(self, command : int, dataToSend : bytes, responsesCount : int, attempt : int = 0) -> list[bytes]:
         """Send data to inverter, receive a reponse (or responses) and verify integrity.
         This should not be called anywhere except in __sendQuery.
 
@@ -42,6 +92,7 @@ class Sermatec:
             command (int): A single-byte code of the command to use.
             dataToSend (bytes): Data to send.
             responsesCount (int): How many responses to expect.
+            attempt (int): Number of the attempt (for tracing).
 
         Returns:
             list[bytes]: List of raw replies. Usually contains one reply -- depends on the command.
@@ -54,6 +105,7 @@ class Sermatec:
         """
         responseData : list[bytes] = []
 
+        sentAt = time.perf_counter()
         try:
             self.writer.write(dataToSend)
             await asyncio.wait_for(self.writer.drain(), timeout=self.QUERY_WRITE_TIMEOUT)
@@ -63,8 +115,11 @@ class Sermatec:
             _LOGGER.error("Connection reset by the inverter!")
             self.connected = False
             raise ConnectionResetError()
+        self.metrics.recordSent(command, len(dataToSend))
+        if self.__observers:
+            self.__notify("onSend", command, attempt, dataToSend, time.monotonic())
     
-        for _ in range(responsesCount):
+        for index in range(responsesCount):
             try:
                 currentResponse = await asyncio.wait_for(self.reader.read(256), timeout=self.QUERY_READ_TIMEOUT)
             except asyncio.TimeoutError:
@@ -74,7 +129,11 @@ class Sermatec:
                 self.connected = False
                 raise ConnectionResetError()
 
-            _LOGGER.debug(f"Received data: { currentResponse.hex(' ', 1) }")
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(f"Received data: { currentResponse.hex(' ', 1) }")
+            self.metrics.recordReceived(command, len(currentResponse))
+            if self.__observers:
+                self.__notify("onReceive", command, attempt, index, currentResponse, time.monotonic())
             responseData.append(currentResponse)
 
         if len(responseData) != responsesCount:
@@ -82,17 +141,27 @@ class Sermatec:
             self.connected = False
             raise ConnectionResetError()
         
-        if not self.parser.checkResponseIntegrity(responseData, command):
-            raise FailedResponseIntegrityCheck()
+        self.metrics.recordRoundTrip(command, time.perf_counter() - sentAt)
+
+        integrityFailure = self.parser.getIntegrityFailureReason(responseData, command)
+        if self.__observers:
+            self.__notify("onIntegrityCheck", command, attempt, integrityFailure, time.monotonic())
+        if integrityFailure:
+            raise FailedResponseIntegrityCheck(integrityFailure)
         
         return responseData
 
-    async def __sendQuery(self, command : int, payload : bytes = bytes()) -> list[bytes]:
+    async def __sendQuery(self, command : int, payload : bytes = bytes(), requestClass : SermatecRequestClass | None = None) -> list[bytes]:
         """Send a query to inverter using specified command code using multiple attempts.
         The connection to the inverter must exist already.
 
+        Queries wait for their turn in the scheduler: set commands first, then interactive
+        reads, then background polls.
+
         Args:
             command (int): A single-byte code of the command to use.
+            payload (bytes): Data of the set commands.
+            requestClass (SermatecRequestClass | None): Priority of the query, CONTROL for set commands and INTERACTIVE otherwise if None.
 
         Returns:
             list[bytes]: List of raw replies. Usually contains one reply -- depends on the command.
@@ -102,28 +171,72 @@ class Sermatec:
             CommunicationError: If the inverter failed to send correct data.
             NotConnected: If the function is called when no connection to the inverter exist.
         """
+        if requestClass is None:
+            requestClass = SermatecRequestClass.CONTROL if command in self.parser.ALL_SET_COMMANDS else SermatecRequestClass.INTERACTIVE
+
+        scheduled = time.monotonic()
+        async def execute() -> list[bytes]:
+            self.metrics.recordSchedulerWait(requestClass.name.lower(), time.monotonic() - scheduled)
+            return await self.__sendQueryLocked(command, payload)
+
+        return await self.scheduler.submit(execute, requestClass, (command, bytes(payload)))
+
+    async def __sendQueryLocked(self, command : int, payload : bytes) -> list[bytes]:
         if self.isConnected():
             dataToSend      = self.parser.generateRequest(command, payload)
             responsesCount  = len(self.parser.getResponseCommands(command))
+            # Assigned also without observers, one may be added during the query.
+            queryStart = time.monotonic()
+            if self.__observers:
+                self.__notify("onQueryStart", command, queryStart)
+
+            if command == 0x64:
+                priority = SermatecTokenBucket.PRIORITY_CONTROL
+            elif command in self.parser.ALL_SET_COMMANDS:
+                priority = SermatecTokenBucket.PRIORITY_WRITE
+            else:
+                priority = SermatecTokenBucket.PRIORITY_READ
+
             for attempt in range(self.QUERY_ATTEMPTS):
+                # Every attempt is a request, retries are throttled as well.
+                self.metrics.recordThrottle(command, await self.rateLimiter.acquire(priority))
                 try:
-                    _LOGGER.debug(f"Communicating with inverter, command {command:02x}, attempt {attempt + 1}/{self.QUERY_ATTEMPTS}")
-                    responseData = await self.__sendQueryAttempt(command, dataToSend, responsesCount)
+                    _LOGGER.debug("Communicating with inverter, command %02x, attempt %d/%d", command, attempt + 1, self.QUERY_ATTEMPTS)
+                    responseData = await self.__sendQueryAttempt(command, dataToSend, responsesCount, attempt + 1)
                 except SendTimeout:
-                    _LOGGER.debug(f"Timeout when sending request to inverter, command {command:02x}.")
+                    _LOGGER.debug("Timeout when sending request to inverter, command %02x.", command)
+                    self.metrics.recordTimeout(command, "send")
+                    failureReason = "sendTimeout"
                 except RecvTimeout:
-                    _LOGGER.debug(f"Timeout when waiting for response from the inverter, command {command:02x}.")
-                except FailedResponseIntegrityCheck:
-                    _LOGGER.debug(f"Command 0x{command:02x} data malformed.")
+                    _LOGGER.debug("Timeout when waiting for response from the inverter, command %02x.", command)
+                    self.metrics.recordTimeout(command, "recv")
+                    failureReason = "recvTimeout"
+                except FailedResponseIntegrityCheck as e:
+                    _LOGGER.debug("Command 0x%02x data malformed.", command)
+                    integrityFailure = e.args[0] if e.args else "unknown"
+                    self.metrics.recordIntegrityFailure(command, integrityFailure)
+                    failureReason = f"integrity:{integrityFailure}"
                 except ConnectionResetError:
                     # Connection error is raised immediately.
+                    self.metrics.recordConnectionReset()
+                    self.metrics.recordQuery(command, attempt + 1, False)
+                    if self.__observers:
+                        self.__notify("onQueryEnd", command, attempt + 1, False, queryStart, time.monotonic())
                     raise ConnectionResetError()
                 else:
+                    self.metrics.recordQuery(command, attempt + 1, True)
+                    if self.__observers:
+                        self.__notify("onQueryEnd", command, attempt + 1, True, queryStart, time.monotonic())
                     break
 
                 if attempt + 1 == self.QUERY_ATTEMPTS:
                     _LOGGER.error(f"Unable to receive correct response after {attempt + 1} tries.")
+                    self.metrics.recordQuery(command, attempt + 1, False)
+                    if self.__observers:
+                        self.__notify("onQueryEnd", command, attempt + 1, False, queryStart, time.monotonic())
                     raise CommunicationError()
+                elif self.__observers:
+                    self.__notify("onRetry", command, attempt + 1, failureReason, time.monotonic())
 
             return responseData
                     
@@ -138,14 +251,25 @@ class Sermatec:
         if not self.isConnected():
 
             confut = asyncio.open_connection(host = self.host, port = self.port)
+            connectStart = time.monotonic()
             try:
                 self.reader, self.writer = await asyncio.wait_for(confut, timeout = 3)
             except (asyncio.TimeoutError, OSError):
                 _LOGGER.error("Couldn't connect to the inverter.")
+                connectEnd = time.monotonic()
+                self.metrics.recordConnect(connectEnd - connectStart, False)
+                if self.__observers:
+                    self.__notify("onConnect", self.host, self.port, connectStart, connectEnd, False)
                 self.connected = False
                 return False
             else:
+                connectEnd = time.monotonic()
+                self.metrics.recordConnect(connectEnd - connectStart, True)
+                if self.__observers:
+                    self.__notify("onConnect", self.host, self.port, connectStart, connectEnd, True)
                 self.connected = True
+                # The state may have changed while disconnected (or it is another PCU version).
+                self.invalidateParameterCache()
 
                 # Get version only if not explicitly stated
                 if version == -1:
@@ -169,26 +293,290 @@ class Sermatec:
 
     async def disconnect(self) -> None:
         if self.connected:
+            # Also waits for writes already being sent, the window may have closed.
+            await self.writeQueue.flush()
+            if self.store is not None:
+                self.store.flush()
             self.writer.close()
             await self.writer.wait_closed()
             self.connected = False
+            self.invalidateParameterCache()
+
+# ========================================================================
+# Tracing and metrics
+# ========================================================================
+    def addObserver(self, observer : SermatecObserver) -> None:
+        """Register an observer notified about connecting, each query phase and parsing.
+        See SermatecObserver for the callbacks."""
+        if observer not in self.__observers:
+            self.__observers.append(observer)
+        self.parser.addObserver(observer)
+
+    def removeObserver(self, observer : SermatecObserver) -> None:
+        if observer in self.__observers:
+            self.__observers.remove(observer)
+        self.parser.removeObserver(observer)
+
+    def __notify(self, event : str, *args) -> None:
+        for observer in self.__observers:
+            try:
+                getattr(observer, event)(*args)
+            except Exception:
+                _LOGGER.exception(f"Observer {observer} failed handling '{event}'.")
+
+    def getMetrics(self) -> dict:
+        """Get communication metrics (latencies, attempts, failures, traffic) as a dictionary."""
+        return self.metrics.snapshot()
+
+    def setRateLimit(self, rate : float | None, burst : float = 1) -> None:
+        """Limit requests sent to the inverter's dongle (shared by all connections to it).
+
+        Args:
+            rate (float | None): Sustained requests per second, unlimited if None.
+            burst (float): How many requests can be sent at once after an idle period.
+
+        Raises:
+            ValueError: The rate is not positive.
+        """
+        self.rateLimiter.configure(rate, burst)
+
+    def getPrometheusMetrics(self) -> str:
+        """Get communication metrics in the Prometheus text format, labeled by the inverter's host."""
+        return self.metrics.toPrometheus({"host": self.host})
+
+# ========================================================================
+# History
+# ========================================================================
+    def enableHistory(self, capacity : int = 3600) -> SermatecHistory:
+        """Keep the last `capacity` values of every numeric sensor polled by getCustom() (and get()).
+
+        Args:
+            capacity (int): How many polls of each command to keep.
+
+        Returns:
+            SermatecHistory: The history store (also available as `history`).
+        """
+        self.history = SermatecHistory(capacity)
+        return self.history
+
+    def disableHistory(self) -> None:
+        self.history = None
+
+    def enableStore(self, path : Path | str, batchSize : int = 60) -> SermatecColumnStore:
+        """Append numeric values polled by getCustom() (and get()) to an on-disk columnar store.
+
+        Args:
+            path (Path | str): Folder of the store (one per inverter).
+            batchSize (int): How many polls of a command to buffer before writing them.
+
+        Returns:
+            SermatecColumnStore: The store (also available as `store`).
+
+        Raises:
+            StoreMalformed: The store's metadata can't be read.
+        """
+        if self.store is not None:
+            self.store.close()
+        self.store = SermatecColumnStore(path, batchSize)
+        return self.store
+
+    def disableStore(self) -> None:
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def enableAggregates(self, aggregates : SermatecAggregates | None = None) -> SermatecAggregates:
+        """Compute derived sensors (rolling statistics, energy) from data polled by getCustom() (and get()).
+
+        The derived sensors are returned together with the polled ones and listed by listSensors().
+
+        Args:
+            aggregates (SermatecAggregates | None): Configured aggregates, PV, grid and DC energy if None.
+
+        Returns:
+            SermatecAggregates: The aggregates (also available as `aggregates`).
+        """
+        self.aggregates = aggregates if aggregates is not None else SermatecAggregates.withDefaults()
+        return self.aggregates
+
+    def estimateHistoryMemory(self, capacity : int, pcuVersion : int = None) -> int:
+        """Estimate an upper bound of memory (in bytes) used by a history of all sensors of all query commands."""
+        if not pcuVersion:
+            pcuVersion = self.pcuVersion
+
+        sensorCount  = 0
+        commandCount = 0
+        for responseCode in self.parser.getResponseCodes(pcuVersion):
+            try:
+                sensorCount += len(self.parser.getReplySpans(responseCode, pcuVersion))
+                commandCount += 1
+            except CommandNotFoundInProtocol:
+                continue
+
+        return SermatecHistory.estimateMemory(capacity, sensorCount, commandCount)
+
+# ========================================================================
+# Events
+# ========================================================================
+    def addEventListener(self, listener : Callable[[SermatecBitEvent], None]) -> None:
+        """Register a listener called with every change of a flag (alarms, faults, running states).
+
+        Status words are checked in every reply received by getCustom() (and get()),
+        so events come with the poll which brought the change. Flags set in the first
+        reply after adding the first listener are reported as rising edges.
+        """
+        if listener not in self.__eventListeners:
+            self.__eventListeners.append(listener)
+
+    def removeEventListener(self, listener : Callable[[SermatecBitEvent], None]) -> None:
+        if listener in self.__eventListeners:
+            self.__eventListeners.remove(listener)
+        if not self.__eventListeners:
+            self.__eventDetector = None
+
+    def __detectEvents(self, responseCode : int, response : bytes) -> None:
+        if self.__eventDetector is None or self.__eventDetector.version != self.pcuVersion:
+            self.__eventDetector = SermatecEventDetector(self.parser, self.pcuVersion)
+
+        for event in self.__eventDetector.process(responseCode, response):
+            for listener in self.__eventListeners:
+                try:
+                    listener(event)
+                except Exception:
+                    _LOGGER.exception(f"Event listener {listener} failed handling {event}.")
+
+# ========================================================================
+# Subscriptions
+# ========================================================================
+    def subscribe(self, maxSize : int = 16, policy : SermatecOverflowPolicy = SermatecOverflowPolicy.DROP_OLDEST, name : str | None = None) -> SermatecSubscription:
+        """Subscribe to data received by getCustom() (and get()) without running the consumer inline.
+
+        Each item is a tuple (command, decoded response, time of receiving as seconds since the epoch);
+        render() names the response's fields in a language.
+        Queries never wait for subscribers; with the BLOCK policy, the polling loop
+        should call `await fanOut.drain(idle time)` to let such subscribers catch up.
+
+        Args:
+            maxSize (int): How many items can wait for the subscriber.
+            policy (SermatecOverflowPolicy): What to do when the subscriber's queue is full.
+            name (str | None): Name used in getSubscriberStats().
+
+        Returns:
+            SermatecSubscription: Async iterator of the items, close() it when done.
+        """
+        return self.fanOut.subscribe(maxSize, policy, name)
+
+    def getSubscriberStats(self) -> list[dict]:
+        """Get queue lengths, delivered and dropped counts and lags of all subscribers."""
+        return self.fanOut.stats()
+
+# ========================================================================
+# Snapshots
+# ========================================================================
+    def getLatestSnapshot(self, commands : list[int] | None = None) -> SermatecMultiSnapshot | None:
+        """Assemble a snapshot from the latest replies of the commands (without querying the inverter).
+
+        Args:
+            commands (list[int] | None): Commands of the snapshot, SNAPSHOT_COMMANDS if None.
+
+        Returns:
+            SermatecMultiSnapshot | None: The snapshot, None if no command is given or some was not received yet.
+        """
+        if commands is None:
+            commands = self.SNAPSHOT_COMMANDS
+        if not commands or any(command not in self.__latestParts for command in commands):
+            return None
+        return SermatecMultiSnapshot([self.__latestParts[command] for command in commands])
+
+    async def __querySnapshot(self, commands : list[int], requestClass : SermatecRequestClass) -> SermatecMultiSnapshot:
+        remaining = list(commands)
+        while remaining:
+            scheduled = time.monotonic()
+            async def execute(batch : list[int] = remaining) -> int:
+                # One turn for the commands: nothing is sent in between, the parts are as close as possible.
+                self.metrics.recordSchedulerWait(requestClass.name.lower(), time.monotonic() - scheduled)
+                sent = 0
+                for command in batch:
+                    if sent and self.scheduler.hasWaiting(SermatecRequestClass.CONTROL):
+                        # Writes don't wait for the whole batch, the rest is queried in the next turn.
+                        break
+                    responses = await self.__sendQueryLocked(command, bytes())
+                    # Processed at once, so the received parts are kept when a later query fails.
+                    self.__processResponses(command, responses, time.time(), time.monotonic())
+                    sent += 1
+                return sent
+
+            sent = await self.scheduler.submit(execute, requestClass, ("snapshot", tuple(remaining)))
+            remaining = remaining[sent:]
+        return SermatecMultiSnapshot([self.__latestParts[command] for command in commands])
+
+    async def getSnapshot(
+        self,
+        commands : list[int] | None = None,
+        maxSkew : float | None = None,
+        maxAge : float | None = None,
+        attempts : int = 3,
+        requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE
+    ) -> SermatecMultiSnapshot:
+        """Get replies of several commands taken as close to each other as possible.
+
+        The commands are queried back to back in a single turn of the scheduler, so no other
+        query is sent in between; only a waiting control request (e.g. a write) interrupts
+        the batch, the rest is queried in the next turn. When the parts are more than
+        `maxSkew` apart (e.g. because of retries or writes), the whole snapshot is queried again.
+
+        Args:
+            commands (list[int] | None): Commands of the snapshot, SNAPSHOT_COMMANDS if None.
+            maxSkew (float | None): Maximal time between the oldest and the newest part [s], any if None.
+            maxAge (float | None): Latest replies (e.g. of a poller) are used when none is older than this [s]
+                and they are within `maxSkew`; the inverter is always queried if None.
+            attempts (int): How many times the snapshot is queried to get it within `maxSkew`.
+            requestClass (SermatecRequestClass): Priority of the queries.
+
+        Returns:
+            SermatecMultiSnapshot: Snapshot of the commands, with decoded data (see render()).
+
+        Raises:
+            SnapshotSkewExceeded: No snapshot was within `maxSkew`, the least skewed one is the argument.
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If the function is called when no connection to the inverter exist.
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+        """
+        commands = list(commands) if commands is not None else list(self.SNAPSHOT_COMMANDS)
+
+        if maxAge is not None:
+            latest = self.getLatestSnapshot(commands)
+            if latest is not None and latest.age <= maxAge and (maxSkew is None or latest.skew <= maxSkew):
+                return latest
+
+        best : SermatecMultiSnapshot | None = None
+        for attempt in range(max(1, attempts)):
+            snapshot = await self.__querySnapshot(commands, requestClass)
+            if maxSkew is None or snapshot.skew <= maxSkew:
+                return snapshot
+            _LOGGER.debug(f"Snapshot skew {snapshot.skew * 1000:.1f} ms exceeds {maxSkew * 1000:.1f} ms, attempt {attempt + 1}/{attempts}.")
+            if best is None or snapshot.skew < best.skew:
+                best = snapshot
+
+        raise SnapshotSkewExceeded(best)
 
 # ========================================================================
 # Feature discovery methods
 # These methods do not communicate with inverter nor handle real data,
 # they are used to discover abilities, sensors and controls.
-# However, connection to the inverter is required to find out correct
-# PCU version!
+# Connection to the inverter is required only to find out its PCU
+# version, a known version can be passed instead.
 # This is useful for Home Assistant integration.
 # ========================================================================
     def listSensors(self, pcuVersion : int = None) -> dict:
         # If no specific pcuVersion specified, use (possibly) previously discovered.
-        if not pcuVersion:
+        if pcuVersion is None:
             pcuVersion = self.pcuVersion
         
         sensorList : dict = {}
-        for cmd in self.parser.getResponseCodes(pcuVersion):
-            for key, field in self.parser.parseReply(cmd, pcuVersion, bytearray(), dryrun=True).items():
+        for fields in self.parser.getCatalog(pcuVersion).values():
+            for key, field in self.parser.renderReply(fields).items():
                 if "listIgnore" in field and field["listIgnore"]:
                     continue
                 elif "unit" in field and field["unit"] == "binary":
@@ -196,16 +584,19 @@ class Sermatec:
                 else:
                     sensorList.update({key: field})
 
+        if self.aggregates is not None:
+            sensorList.update(self.aggregates.listSensors(sensorList))
+
         return sensorList
     
     def listBinarySensors(self, pcuVersion : int = None) -> dict:
         # If no specific pcuVersion specified, use (possibly) previously discovered.
-        if not pcuVersion:
+        if pcuVersion is None:
             pcuVersion = self.pcuVersion
         
         sensorList : dict = {}
-        for cmd in self.parser.getResponseCodes(pcuVersion):
-            for key, field in self.parser.parseReply(cmd, pcuVersion, bytearray(), dryrun=True).items():
+        for fields in self.parser.getCatalog(pcuVersion).values():
+            for key, field in self.parser.renderReply(fields).items():
                 if "listIgnore" in field and field["listIgnore"]:
                     continue
                 elif "unit" in field and field["unit"] == "binary":
@@ -215,7 +606,7 @@ class Sermatec:
     
     def __listParams(self, paramType : Type[protocol_parser.SermatecProtocolParser.SermatecParameter], pcuVersion : int = None) -> dict:
         # If no specific pcuVersion specified, use (possibly) previously discovered.
-        if not pcuVersion:
+        if pcuVersion is None:
             pcuVersion = self.pcuVersion
 
         paramList : dict = {}
@@ -236,7 +627,7 @@ class Sermatec:
 
     def getQueryCommands(self, pcuVersion : int = None) -> dict:
         # If no specific pcuVersion specified, use (possibly) previously discovered.
-        if not pcuVersion:
+        if pcuVersion is None:
             pcuVersion = self.pcuVersion
         
         return self.parser.getQueryCommands(pcuVersion)
@@ -244,14 +635,15 @@ class Sermatec:
 # ========================================================================
 # Query methods
 # ========================================================================   
-    async def getCustom(self, command : int) -> dict:
+    async def getCustom(self, command : int, requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE) -> dict:
         """Get data from the inverter using specified command code.
 
         Args:
             command (int): A single-byte code of the command to use.
+            requestClass (SermatecRequestClass): Priority of the query, BACKGROUND for periodic polling.
 
         Returns:
-            dict: Parsed reply.
+            dict: Parsed reply, names in the inverter's language.
 
         Raises:
             ConnectionResetError: If the inverter disconnects.
@@ -261,18 +653,75 @@ class Sermatec:
             ProtocolFileMalformed: There was an unexpected error in the protocol file.
             ParsingNotImplemented: There is a field in command reply which is not supported.
         """
-        responses = await self.__sendQuery(command)
-        
+        return self.parser.renderReply(await self.getCustomDecoded(command, requestClass))
+
+    async def getCustomDecoded(self, command : int, requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE) -> dict:
+        """Get data from the inverter using specified command code, with names as in the protocol.
+
+        The data can be rendered in any language by render(), e.g. once per client's language.
+
+        Args:
+            command (int): A single-byte code of the command to use.
+            requestClass (SermatecRequestClass): Priority of the query, BACKGROUND for periodic polling.
+
+        Returns:
+            dict: Decoded reply (don't modify it, it is shared with the subscribers).
+
+        Raises:
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If the function is called when no connection to the inverter exist.
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: There is a field in command reply which is not supported.
+        """
+        responses = await self.__sendQuery(command, requestClass = requestClass)
+        return self.__processResponses(command, responses, time.time(), time.monotonic())
+
+    def __processResponses(self, command : int, responses : list[bytes], receivedAt : float, receivedMonotonic : float) -> dict:
         responseCodes = self.parser.getResponseCommands(command)
         
         parsedResponse = {}
         for response, responseCode in zip(responses, responseCodes):
-            parsedResponse.update(self.parser.parseReply(responseCode, self.pcuVersion, response))
+            parseStart = time.perf_counter()
+            # Polled replies mostly repeat, only changed fields are decoded.
+            parsedReply = self.parser.decodeReplyIncremental(responseCode, self.pcuVersion, response)
+            parsedResponse.update(parsedReply)
+            self.metrics.recordParse(responseCode, time.perf_counter() - parseStart)
+            if self.__eventListeners:
+                self.__detectEvents(responseCode, response)
+            if self.history is not None:
+                self.history.append(responseCode, parsedReply, receivedAt)
+            if self.store is not None:
+                self.store.append(responseCode, parsedReply, receivedAt)
+            if self.aggregates is not None:
+                parsedResponse.update(self.aggregates.update(parsedReply, receivedMonotonic))
+
+        self.__replySequence += 1
+        self.__latestParts[command] = SermatecSnapshotPart(command, self.__replySequence, receivedAt, receivedMonotonic, parsedResponse)
+
+        if len(self.fanOut):
+            self.fanOut.publish((command, parsedResponse, receivedAt))
         
         return parsedResponse
     
-    async def getCustomRaw(self, command : int) -> list[bytes]:
-        return await self.__sendQuery(command)
+    def render(self, decodedData : dict, language : str | None = None) -> dict:
+        """Name the fields of decoded data (e.g. from getCustomDecoded() or a snapshot) in a language.
+
+        Args:
+            decodedData (dict): Decoded data (not modified).
+            language (str | None): Code of a bundled language (e.g. "cs"), the inverter's language if None.
+
+        Returns:
+            dict: Parsed data, as from getCustom().
+
+        Raises:
+            FileNotFoundError: The language is not available.
+        """
+        return self.parser.renderReply(decodedData, SermatecTranslations.forLanguage(language) if language else None)
+
+    async def getCustomRaw(self, command : int, requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE) -> list[bytes]:
+        return await self.__sendQuery(command, requestClass = requestClass)
 
     async def get(self, commandName : str) -> dict:
         """Get data from the inverter from the specified dataset.
@@ -343,64 +792,189 @@ class Sermatec:
         serial : str = parsedData["product_sn"]["value"]
         return serial
     
-    async def getParameterData(self) -> dict:
+    async def getParameterData(self, requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE) -> dict:
+        """Query the current parameter state (raw tagged values) and store it in the parameter cache.
+
+        Args:
+            requestClass (SermatecRequestClass): Priority of the queries.
+
+        Returns:
+            dict: Tag -> raw bytes.
+
+        Raises:
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If the function is called when no connection to the inverter exist.
+        """
         parsedResponse = {}
         for commandCode in self.parser.ALL_PARAMETER_QUERY_COMMANDS:
-            responses      = await self.__sendQuery(commandCode)
+            responses      = await self.__sendQuery(commandCode, requestClass = requestClass)
             responseCodes  = self.parser.getResponseCommands(commandCode)
             for response, responseCode in zip(responses, responseCodes):
+                parseStart = time.perf_counter()
                 parsedResponse.update(self.parser.parseParameterReply(responseCode, self.pcuVersion, response))
+                self.metrics.recordParse(responseCode, time.perf_counter() - parseStart)
+
+        self.__parameterCache     = dict(parsedResponse)
+        self.__parameterCacheTime = time.monotonic()
             
         return parsedResponse
 
+    async def getCachedParameterData(self, maxAge : float = None, requestClass : SermatecRequestClass = SermatecRequestClass.INTERACTIVE) -> dict:
+        """Get the parameter state from the cache if it is fresh enough, query the inverter otherwise.
+
+        Args:
+            maxAge (float): Maximal age of the cached data [s], PARAMETER_CACHE_MAX_AGE by default.
+            requestClass (SermatecRequestClass): Priority of the queries.
+
+        Returns:
+            dict: Tag -> raw bytes.
+
+        Raises:
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If the function is called when no connection to the inverter exist.
+        """
+        if maxAge is None:
+            maxAge = self.PARAMETER_CACHE_MAX_AGE
+
+        if self.__parameterCache is not None and time.monotonic() - self.__parameterCacheTime <= maxAge:
+            _LOGGER.debug("Using cached parameter data.")
+            return dict(self.__parameterCache)
+
+        return await self.getParameterData(requestClass)
+
+    def invalidateParameterCache(self) -> None:
+        """Drop the cached parameter state, e.g. when it was changed by another client."""
+        self.__parameterCache = None
+
 # ========================================================================
 # Set methods
 # ========================================================================
-    async def set(self, tag : str, value : bool | int | str, previousData : dict = {}) -> None:
+    async def set(self, tag : str, value : bool | int | str, previousData : dict | None = None, verify : bool = True) -> None:
+        """Set a single parameter.
+
+        Args:
+            tag (str): Tag of the parameter (see SermatecProtocolParser.SERMATEC_PARAMETERS).
+            value (bool | int | str): Friendly value to set.
+            previousData (dict | None): Current parameter state from getParameterData(),
+                the cached state (queried when stale) is used if None.
+            verify (bool): Read the parameter back after writing and check it was applied (see setMany()).
+
+        Raises:
+            MissingTaggedData: If not enough data was supplied to build payload.
+            CommandNotFoundInProtocol: The requested command is not available.
+            ParameterNotFound: This parameter is not supported.
+            ValueError: If supplied value is invalid.
+            InverterIsNotOff: If the inverter should be off to set this value.
+            ParameterVerificationFailed: If the read-back value differs from the written one.
         """
+        await self.setMany({tag: value}, previousData, verify)
+
+    async def setMany(self, values : dict[str, bool | int | str], previousData : dict | None = None, verify : bool = True) -> None:
+        """Set multiple parameters at once: the parameter state is read once, all values are validated
+        before anything is sent and each set command (0x66, 0x64) is written at most once.
+
+        If the inverter is being turned off together with parameters which require it to be off,
+        it is turned off first. When it is being turned on, parameters are written first.
 
         Args:
-            
-        Returns:
-            
+            values (dict[str, bool | int | str]): Tag -> friendly value.
+            previousData (dict | None): Current parameter state from getParameterData(),
+                the cached state (queried when stale) is used if None.
+            verify (bool): Read the parameters back once after writing and check they were applied.
+                The read-back refreshes the whole parameter cache, without it only the written
+                values are updated in the cache.
+
         Raises:
             MissingTaggedData: If not enough data was supplied to build payload.
             CommandNotFoundInProtocol: The requested command is not available.
             ParameterNotFound: This parameter is not supported.
             ValueError: If supplied value is invalid.
             InverterIsNotOff: If the inverter should be off to set this value.
+            ParameterVerificationFailed: If the read-back values differ from the written ones.
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If the function is called when no connection to the inverter exist.
         """
-        
-        taggedDataToSend = previousData
-        _LOGGER.debug(f"Provided previous data: {taggedDataToSend}")
+        if not values:
+            return
+
+        # Validate everything before talking to the inverter.
+        # This may throw ParameterNotFound or ValueError.
+        encoded = {tag: (self.parser.getParameterInfo(tag), self.parser.encodeParameter(tag, value)) for tag, value in values.items()}
+
+        if previousData is None:
+            # Reads of a write are as urgent as the write itself.
+            previousData = await self.getCachedParameterData(requestClass = SermatecRequestClass.CONTROL)
+        _LOGGER.debug("Provided previous data: %s", previousData)
+
+        taggedDataToSend = dict(previousData)
+        commands : list[int] = []
+        for tag, (parameterInfo, rawValue) in encoded.items():
+            taggedDataToSend[tag] = rawValue
+            if parameterInfo.command not in commands:
+                commands.append(parameterInfo.command)
+
+        # The inverter may be turned off in the same transaction.
+        turningOff = "onOff" in encoded and self.parser.isInverterOff(taggedDataToSend["onOff"])
+        stateAfterOnOff = taggedDataToSend if turningOff else previousData
+
+        for tag, (parameterInfo, _) in encoded.items():
+            if parameterInfo.shouldBeOff:
+                if "onOff" not in stateAfterOnOff:
+                    _LOGGER.debug("The inverter should be off to set the value, but no 'onOff' state supplied!")
+                    raise MissingTaggedData()
+                elif not self.parser.isInverterOff(stateAfterOnOff["onOff"]):
+                    _LOGGER.debug("The inverter has to be off to set this value, but it is on.")
+                    raise InverterIsNotOff()
+
+        # Build all payloads first, so nothing is sent when data is missing.
+        # The newest layout is used when the version is unknown.
+        version = self.pcuVersion if self.pcuVersion else None
+        payloads : list[tuple[int, bytes]] = []
+        for command in sorted(commands, key = lambda command: (command == 0x64) != turningOff):
+            payloads.append((command, self.parser.buildPayload(command, taggedDataToSend, version)))
 
-        # This may throw ParameterNotFound.    
-        parameterInfo = self.parser.getParameterInfo(tag)
-        
-        convertedValue = parameterInfo.converter.fromFriendly(value)
-        _LOGGER.debug(f"Setting up tag '{tag}' with converted value '{hex(convertedValue)}'")
-
-        if not parameterInfo.validator.validate(convertedValue):
-            raise ValueError
-
-        taggedDataToSend[tag] = int.to_bytes(convertedValue, byteorder="big", signed=False, length = parameterInfo.byteLength)
-
-        if parameterInfo.shouldBeOff:
-            if "onOff" not in previousData:
-                _LOGGER.debug("The inverter should be off to set the value, but no 'onOff' state supplied!")
-                raise MissingTaggedData()
-            elif not self.parser.isInverterOff(previousData["onOff"]):
-                _LOGGER.debug("The inverter has to be off to set this value, but it is on.")
-                raise InverterIsNotOff()
-
-        if parameterInfo.command == 0x66:
-            payload = self.parser.build66Payload(taggedDataToSend)
-        elif parameterInfo.command == 0x64:
-            payload = self.parser.build64Payload(taggedDataToSend)
-        else:
-            raise CommandNotFoundInProtocol
-        
-        _LOGGER.debug(f"Query payload: {payload.hex(' ')}")
+        try:
+            for command, payload in payloads:
+                if _LOGGER.isEnabledFor(logging.DEBUG):
+                    _LOGGER.debug(f"Query 0x{command:02x} payload: {payload.hex(' ')}")
+                await self.__sendQuery(command, payload)
+        except BaseException:
+            # Some commands may have been applied already, the cached state is unknown.
+            self.invalidateParameterCache()
+            raise
+
+        # Write-through: the cache keeps its timestamp, it still expires with the unwritten values.
+        if self.__parameterCache is not None:
+            for tag in encoded:
+                self.__parameterCache[tag] = taggedDataToSend[tag]
+
+        if verify:
+            # Refreshes the cache with the real state, also when it disagrees.
+            currentData = await self.getParameterData(SermatecRequestClass.CONTROL)
+            mismatched = [tag for tag in encoded if currentData.get(tag) != taggedDataToSend[tag]]
+            if mismatched:
+                _LOGGER.error(f"Parameters not applied by the inverter: {', '.join(mismatched)}")
+                raise ParameterVerificationFailed(mismatched)
+
+    def setDebounced(self, tag : str, value : bool | int | str) -> asyncio.Future:
+        """Queue a parameter write, coalescing rapid changes (e.g. from UI sliders).
+
+        Writes (of any set command) arriving within WRITE_DEBOUNCE_WINDOW are sent
+        together by a single setMany() call, keeping only the latest value of each tag.
+        Must be called from a running event loop.
 
-        await self.__sendQuery(parameterInfo.command, payload)
-        
\ No newline at end of file
+        Args:
+            tag (str): Tag of the parameter.
+            value (bool | int | str): Friendly value to set.
+
+        Returns:
+            asyncio.Future: Resolved with the outcome of the write containing the value.
+
+        Raises:
+            ParameterNotFound: This parameter is not supported.
+            ValueError: If supplied value is invalid.
+        """
+        return self.writeQueue.set(tag, value)
@@ -2,9 +2,15 @@ import sys
 import argparse
 import logging
 import asyncio
+import json
 from pathlib import Path
 from . import Sermatec
 from .protocol_parser import SermatecProtocolParser
+from .simulator import SermatecSimulator
+from .poller import SermatecPoller
+from .server import SermatecSnapshotServer
+from .modbus import SermatecModbusGateway
+from .adaptive import SermatecAdaptiveSchedule
 from .exceptions import *
 
 async def customgetFunc(**kwargs):
@@ -105,10 +111,8 @@ async def setFunc(**kwargs):
         return
 
     try:
-        print("Contacting inverter...")
-        data = await smc.getParameterData()
         print("Setting data...")
-        await smc.set(kwargs["tag"], convertedValue, data)
+        await smc.setMany({kwargs["tag"]: convertedValue})
     except CommandNotFoundInProtocol:
         print("The command was not found in protocol for inverter's version, unable to parse. Try --raw to get raw bytes.")
     except (ProtocolFileMalformed, ParsingNotImplemented):
@@ -123,6 +127,8 @@ async def setFunc(**kwargs):
         print("Supplied value is not valid.")
     except (InverterIsNotOff):
         print("Inverter has to be turned off to set this value! Please turn off the inverter.")
+    except (ParameterVerificationFailed):
+        print("The inverter did not apply the value.")
     else:
         print("OK!")
 
@@ -130,8 +136,35 @@ async def setFunc(**kwargs):
     await smc.disconnect()
     print("OK")
 
+def listCatalog(smc : Sermatec, listType : str, pcuVersion : int | None = None) -> dict:
+    if listType == "sensors":
+        return smc.listSensors(pcuVersion)
+    return smc.listBinarySensors(pcuVersion)
+
 async def listFunc(**kwargs):
+    """List supported features, connecting to the inverter only to find out its version.
+
+    Keyword Args:
+        type (str): What to list ("sensors" or "binarysensors").
+        ip (str | None): Inverter's IP, None when listing offline.
+        port (str): Inverter's API port.
+        protocolFilePath (str): Path to the protocol JSON.
+        pcuVersion (int | None): List for this PCU version without connecting.
+        allVersions (bool): List for every PCU version in the protocol (as JSON) without connecting.
+        json (bool): Print JSON instead of Python representation.
+    """
     smc = Sermatec(kwargs["ip"], kwargs["port"], kwargs["protocolFilePath"])
+
+    if kwargs["allVersions"]:
+        catalogs = {version: listCatalog(smc, kwargs["type"], version) for version in smc.parser.getVersions()}
+        print(json.dumps(catalogs, indent = 2, default = str))
+        return
+
+    if kwargs["pcuVersion"] is not None:
+        catalog = listCatalog(smc, kwargs["type"], kwargs["pcuVersion"])
+        print(json.dumps(catalog, indent = 2, default = str) if kwargs["json"] else catalog)
+        return
+
     print(f"Connecting to Sermatec at {kwargs['ip']}:{kwargs['port']}...", end = "")
     if await smc.connect():
         print("OK")
@@ -139,28 +172,98 @@ async def listFunc(**kwargs):
         print("Can't connect.")
         return
 
-    if kwargs["type"] == "sensors":
-        print(smc.listSensors())
-    elif kwargs["type"] == "binarysensors":
-        print(smc.listBinarySensors())
+    catalog = listCatalog(smc, kwargs["type"])
+    print(json.dumps(catalog, indent = 2, default = str) if kwargs["json"] else catalog)
     
     print("Disconnecting...", end = "")
     await smc.disconnect()
     print("OK")
 
+async def simulateFunc(**kwargs):
+    """Run a simulated inverter.
+
+    Keyword Args:
+        ip (str): Address to listen on.
+        port (str): Port to listen on.
+        protocolFilePath (str): Path to the protocol JSON.
+    """
+    dumpsFolder = kwargs["dumps"]
+    if dumpsFolder is None and SermatecSimulator.DEFAULT_DUMPS_FOLDER.exists():
+        dumpsFolder = SermatecSimulator.DEFAULT_DUMPS_FOLDER
+
+    simulator = SermatecSimulator(
+        host             = kwargs["ip"],
+        port             = int(kwargs["port"]),
+        protocolFilePath = kwargs["protocolFilePath"],
+        pcuVersion       = kwargs["pcuVersion"],
+        dumpsFolder      = dumpsFolder,
+        latency          = kwargs["latency"],
+        jitter           = kwargs["jitter"],
+        dropRate         = kwargs["dropRate"],
+        splitRate        = kwargs["splitRate"],
+        corruptRate      = kwargs["corruptRate"],
+        seed             = kwargs["seed"]
+    )
+
+    await simulator.start()
+    print(f"Simulated inverter listening at {simulator.host}:{simulator.port}, press Ctrl+C to stop.")
+    try:
+        await simulator.serveForever()
+    except asyncio.CancelledError:
+        pass
+
+async def serveFunc(**kwargs):
+    """Poll the inverter and serve the latest data over HTTP.
+
+    Keyword Args:
+        ip (str): Inverter's IP.
+        port (str): Inverter's API port.
+        protocolFilePath (str): Path to the protocol JSON.
+        listen (str): Address of the HTTP server.
+        httpPort (int): Port of the HTTP server.
+        interval (float): Polling interval in seconds.
+        queueSize (int): How many snapshots can wait for a slow stream client.
+        modbusPort (int | None): Port of the Modbus-TCP gateway, no gateway if None.
+        adaptive (bool): Adapt the interval of each command to how often its data change.
+        requestBudget (float): Maximal requests per second in the adaptive mode.
+        rateLimit (float | None): Maximal requests per second to the dongle (including retries and writes), unlimited if None.
+    """
+    smc = Sermatec(kwargs["ip"], kwargs["port"], kwargs["protocolFilePath"])
+    schedule = SermatecAdaptiveSchedule(requestBudget = kwargs["requestBudget"]) if kwargs["adaptive"] else None
+    if kwargs["rateLimit"] is not None:
+        smc.setRateLimit(kwargs["rateLimit"], kwargs["rateLimit"])
+    poller = SermatecPoller(smc, interval = kwargs["interval"], subscriberQueueSize = kwargs["queueSize"], schedule = schedule)
+    server = SermatecSnapshotServer(poller, kwargs["listen"], kwargs["httpPort"])
+    gateway = None
+
+    await server.start()
+    print(f"Polling Sermatec at {kwargs['ip']}:{kwargs['port']}, serving at http://{server.host}:{server.port}/, press Ctrl+C to stop.")
+    if kwargs["modbusPort"] is not None:
+        gateway = SermatecModbusGateway(poller, kwargs["listen"], kwargs["modbusPort"])
+        await gateway.start()
+        print(f"Modbus-TCP gateway at {gateway.host}:{gateway.port}.")
+    poller.start()
+    try:
+        await server.serveForever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if gateway is not None:
+            await gateway.stop()
+        await poller.stop()
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog = "sermatec_inverter",
         description = "Sermatec Inverter communication script.",
     )
-    parser.add_argument(
-        "ip",
-        help = "IP address of the inverter."
-    )
-    
     subparsers = parser.add_subparsers(dest = "cmd")
     getParser = subparsers.add_parser("get", help = "Get data from the inverter.")
     getParser.set_defaults(cmdFunc = getFunc)
+    getParser.add_argument(
+        "ip",
+        help = "IP address of the inverter."
+    )
 
     cmdShortNames = SermatecProtocolParser.COMMAND_SHORT_NAMES.keys()
     getParser.add_argument(
@@ -171,6 +274,10 @@ if __name__ == "__main__":
 
     setParser = subparsers.add_parser("set", help = "Configure a value in the inverter.")
     setParser.set_defaults(cmdFunc = setFunc)
+    setParser.add_argument(
+        "ip",
+        help = "IP address of the inverter."
+    )
     setParser.add_argument(
         "tag",
         help = "Tag of configured value.",
@@ -189,9 +296,33 @@ if __name__ == "__main__":
         help = "What type of features to list.",
         choices = ["sensors", "binarysensors"]
     )
+    listParser.add_argument(
+        "ip",
+        help = "IP address of the inverter, not needed with --pcuVersion or --allVersions.",
+        nargs = "?"
+    )
+    listParser.add_argument(
+        "--pcuVersion",
+        help = "List for this PCU version without connecting to the inverter (e.g. for generating configurations).",
+        type = int
+    )
+    listParser.add_argument(
+        "--allVersions",
+        help = "List for every PCU version of the protocol as JSON, without connecting to the inverter.",
+        action = "store_true"
+    )
+    listParser.add_argument(
+        "--json",
+        help = "Print the list as JSON.",
+        action = "store_true"
+    )
 
     customgetParser = subparsers.add_parser("customget", help = "Query the inverter using custom command.")
     customgetParser.set_defaults(cmdFunc = customgetFunc)
+    customgetParser.add_argument(
+        "ip",
+        help = "IP address of the inverter."
+    )
     customgetParser.add_argument(
         "command",
         help = "A single-byte command to send.",
@@ -202,6 +333,114 @@ if __name__ == "__main__":
         action = "store_true"
     )
     
+    simulateParser = subparsers.add_parser("simulate", help = "Run a simulated inverter listening at an IP address.")
+    simulateParser.set_defaults(cmdFunc = simulateFunc)
+    simulateParser.add_argument(
+        "ip",
+        help = "IP address to listen on."
+    )
+    simulateParser.add_argument(
+        "--pcuVersion",
+        help = "PCU version of the simulated inverter. Defaults to 603.",
+        type = int,
+        default = 603
+    )
+    simulateParser.add_argument(
+        "--dumps",
+        help = "Folder with raw replies to serve. Defaults to the repository's dumps folder, if available.",
+        type = Path,
+        default = None
+    )
+    simulateParser.add_argument(
+        "--latency",
+        help = "Delay before every reply in seconds.",
+        type = float,
+        default = 0.0
+    )
+    simulateParser.add_argument(
+        "--jitter",
+        help = "Maximal random deviation of the reply delay in seconds.",
+        type = float,
+        default = 0.0
+    )
+    simulateParser.add_argument(
+        "--dropRate",
+        help = "Probability of not replying.",
+        type = float,
+        default = 0.0
+    )
+    simulateParser.add_argument(
+        "--splitRate",
+        help = "Probability of splitting a reply into two TCP segments.",
+        type = float,
+        default = 0.0
+    )
+    simulateParser.add_argument(
+        "--corruptRate",
+        help = "Probability of sending a reply with a bad checksum.",
+        type = float,
+        default = 0.0
+    )
+    simulateParser.add_argument(
+        "--seed",
+        help = "Seed for the fault injection.",
+        type = int,
+        default = None
+    )
+
+    serveParser = subparsers.add_parser("serve", help = "Poll the inverter and serve the data to local clients over HTTP.")
+    serveParser.set_defaults(cmdFunc = serveFunc)
+    serveParser.add_argument(
+        "ip",
+        help = "IP address of the inverter."
+    )
+    serveParser.add_argument(
+        "--listen",
+        help = "Address of the HTTP server. Defaults to 127.0.0.1.",
+        default = "127.0.0.1"
+    )
+    serveParser.add_argument(
+        "--httpPort",
+        help = "Port of the HTTP server. Defaults to 8080.",
+        type = int,
+        default = 8080
+    )
+    serveParser.add_argument(
+        "--interval",
+        help = "Polling interval in seconds. Defaults to 10.",
+        type = float,
+        default = 10.0
+    )
+    serveParser.add_argument(
+        "--queueSize",
+        help = "How many snapshots can wait for a slow stream client before the oldest are dropped.",
+        type = int,
+        default = 16
+    )
+    serveParser.add_argument(
+        "--modbusPort",
+        help = "Also serve the data as Modbus-TCP registers at this port (e.g. 502).",
+        type = int,
+        default = None
+    )
+    serveParser.add_argument(
+        "--adaptive",
+        help = "Poll each command as often as its data change (within built-in bounds) instead of every --interval.",
+        action = "store_true"
+    )
+    serveParser.add_argument(
+        "--requestBudget",
+        help = "Maximal requests per second to the inverter in the adaptive mode. Defaults to 1.",
+        type = float,
+        default = 1.0
+    )
+    serveParser.add_argument(
+        "--rateLimit",
+        help = "Hard limit of requests per second sent to the dongle, including retries and writes. Unlimited by default.",
+        type = float,
+        default = None
+    )
+
     parser.add_argument(
         "--port",
         help = "API port. Defaults to 8899.",
@@ -227,5 +466,10 @@ if __name__ == "__main__":
         print("Error: No command specified.")
         parser.print_help()
         sys.exit()
+    elif args.cmd == "list" and args.ip is None and args.pcuVersion is None and not args.allVersions:
+        listParser.error("the IP address is required, unless --pcuVersion or --allVersions is given")
     else:
-        asyncio.run(args.cmdFunc(**vars(args)))
+        try:
+            asyncio.run(args.cmdFunc(**vars(args)))
+        except KeyboardInterrupt:
+            pass
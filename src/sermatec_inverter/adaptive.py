@@ -0,0 +1,177 @@
+import logging
+import time
+
+from .changefilter import Deadband
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecAdaptiveSchedule:
+    """Per-command poll intervals adapted to how often the command's data change.
+
+    After each poll, the fields are compared with the previous poll of the command
+    (numeric ones through a deadband). The share of polls bringing a change is
+    smoothed by an exponential moving average: a volatile command has its interval
+    shortened, a quiet one lengthened, always within the command's bounds.
+
+    A global request budget caps the total polling rate: when the adapted intervals
+    would need more requests per second than the budget, all of them are stretched
+    by the same factor, and consecutive requests are spaced by at least 1 / budget.
+    """
+
+    # command -> (minimal interval, maximal interval) [s]
+    DEFAULT_BOUNDS = {
+        0x0a : (10, 120),   # battery
+        0x0b : (2, 30),     # grid and PV
+        0x0c : (5, 120),    # status
+        0x0d : (10, 300),   # BMS
+        0x95 : (60, 900),   # parameters
+    }
+    DEFAULT_DEADBAND = Deadband(percent = 2)
+
+    def __init__(
+        self,
+        bounds : dict[int, tuple[float, float]] | None = None,
+        requestBudget : float = 1.0,
+        deadbands : dict[str, Deadband] = {},
+        smoothing : float = 0.3,
+        speedup : float = 0.5,
+        slowdown : float = 1.5,
+        volatileShare : float = 0.5,
+        quietShare : float = 0.2
+    ):
+        """
+        Args:
+            bounds (dict[int, tuple[float, float]] | None): Command -> (minimal, maximal) interval [s], DEFAULT_BOUNDS if None.
+            requestBudget (float): Maximal number of requests per second of all commands together.
+            deadbands (dict[str, Deadband]): Field key -> smallest change counted as a change (DEFAULT_DEADBAND otherwise).
+            smoothing (float): Weight of the latest poll in the moving average of changes (0-1].
+            speedup (float): Interval multiplier for volatile commands (< 1).
+            slowdown (float): Interval multiplier for quiet commands (> 1).
+            volatileShare (float): Share of polls with a change above which the command is volatile.
+            quietShare (float): Share of polls with a change below which the command is quiet.
+        """
+        if requestBudget <= 0:
+            raise ValueError("Request budget has to be positive.")
+
+        self.bounds         = dict(bounds if bounds is not None else self.DEFAULT_BOUNDS)
+        self.requestBudget  = requestBudget
+        self.deadbands      = dict(deadbands)
+        self.smoothing      = smoothing
+        self.speedup        = speedup
+        self.slowdown       = slowdown
+        self.volatileShare  = volatileShare
+        self.quietShare     = quietShare
+
+        # command -> adapted interval (before the budget) [s]
+        self.intervals      : dict[int, float] = {command: low for command, (low, high) in self.bounds.items()}
+        # command -> moving average of polls with a change
+        self.volatility     : dict[int, float] = {command: 1.0 for command in self.bounds}
+        # command -> monotonic time of the next poll
+        self.__due          : dict[int, float] = {}
+        # command -> field key -> value of the previous poll
+        self.__previous     : dict[int, dict[str, object]] = {}
+        self.__polls        : dict[int, int] = {command: 0 for command in self.bounds}
+        self.__lastRequest  : float | None = None
+
+    @property
+    def commands(self) -> list[int]:
+        return list(self.bounds)
+
+    def remove(self, command : int) -> None:
+        """Stop scheduling a command (e.g. not supported by the inverter)."""
+        for collection in (self.bounds, self.intervals, self.volatility, self.__due, self.__previous, self.__polls):
+            collection.pop(command, None)
+
+    def reset(self) -> None:
+        """Poll every command as soon as possible (e.g. after reconnecting)."""
+        self.__due.clear()
+        self.__previous.clear()
+
+    @property
+    def budgetFactor(self) -> float:
+        """How much the adapted intervals are stretched to fit into the request budget."""
+        demand = sum(1 / interval for interval in self.intervals.values())
+        return max(1.0, demand / self.requestBudget)
+
+    def effectiveInterval(self, command : int) -> float:
+        return self.intervals[command] * self.budgetFactor
+
+    def next(self, now : float | None = None) -> tuple[int, float]:
+        """Get the command to poll next and the monotonic time to poll it at.
+
+        Raises:
+            ValueError: No command is scheduled.
+        """
+        if not self.bounds:
+            raise ValueError("No command to schedule.")
+        if now is None:
+            now = time.monotonic()
+
+        command = min(self.bounds, key = lambda command: self.__due.get(command, now))
+        at = self.__due.get(command, now)
+        if self.__lastRequest is not None:
+            at = max(at, self.__lastRequest + 1 / self.requestBudget)
+        return command, at
+
+    def __changed(self, command : int, parsedData : dict) -> bool:
+        previous = self.__previous.get(command)
+        current  = {key: field.get("value") for key, field in parsedData.items()}
+        self.__previous[command] = current
+        if previous is None:
+            return True
+
+        for key, value in current.items():
+            if key not in previous:
+                return True
+            if self.deadbands.get(key, self.DEFAULT_DEADBAND).exceeded(previous[key], value):
+                return True
+        return False
+
+    def observe(self, command : int, parsedData : dict, now : float | None = None) -> None:
+        """Adapt the command's interval to a poll's result and schedule its next poll.
+
+        Args:
+            command (int): The polled command.
+            parsedData (dict): Parsed reply of the poll.
+            now (float | None): Monotonic time of the poll, now if None.
+        """
+        if now is None:
+            now = time.monotonic()
+        self.__lastRequest = now
+
+        if command not in self.bounds:
+            return
+        self.__polls[command] += 1
+
+        changed = self.__changed(command, parsedData)
+        volatility = self.volatility[command] = self.smoothing * changed + (1 - self.smoothing) * self.volatility[command]
+
+        low, high = self.bounds[command]
+        interval = self.intervals[command]
+        if volatility >= self.volatileShare:
+            interval = max(low, interval * self.speedup)
+        elif volatility <= self.quietShare:
+            interval = min(high, interval * self.slowdown)
+
+        if interval != self.intervals[command]:
+            self.intervals[command] = interval
+            _LOGGER.debug(f"Polling 0x{command:02x} every {interval:.1f} s (volatility {volatility:.2f}, budget factor {self.budgetFactor:.2f}).")
+
+        self.__due[command] = now + self.effectiveInterval(command)
+
+    def failed(self, now : float | None = None) -> None:
+        """Count a failed request against the budget."""
+        self.__lastRequest = time.monotonic() if now is None else now
+
+    def stats(self) -> dict:
+        """Get the current interval, volatility and poll count of every command."""
+        factor = self.budgetFactor
+        return {
+            f"{command:02x}" : {
+                "interval"          : self.intervals[command],
+                "effectiveInterval" : self.intervals[command] * factor,
+                "volatility"        : self.volatility[command],
+                "polls"             : self.__polls[command],
+            }
+            for command in self.bounds
+        }
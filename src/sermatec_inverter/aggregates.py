@@ -0,0 +1,289 @@
+import math
+from collections import deque
+
+class RollingAggregate:
+    """Statistics of values in a sliding time window.
+
+    Mean and variance are kept as running sums (shifted by the first value to limit
+    cancellation), minimum and maximum as monotonic deques, so adding a value and
+    evicting old ones is amortized O(1).
+    """
+
+    def __init__(self, window : float):
+        """
+        Args:
+            window (float): Length of the window [s].
+        """
+        self.window     = window
+        self.__values   : deque[tuple[float, float]] = deque()
+        self.__minimums : deque[tuple[float, float]] = deque()
+        self.__maximums : deque[tuple[float, float]] = deque()
+        self.__shift    : float | None = None
+        self.__sum      = 0.0
+        self.__sumSq    = 0.0
+
+    def add(self, timestamp : float, value : float) -> None:
+        if math.isnan(value):
+            return
+
+        if self.__shift is None:
+            self.__shift = value
+        shifted = value - self.__shift
+
+        self.__values.append((timestamp, value))
+        self.__sum   += shifted
+        self.__sumSq += shifted * shifted
+
+        while self.__minimums and self.__minimums[-1][1] >= value:
+            self.__minimums.pop()
+        self.__minimums.append((timestamp, value))
+
+        while self.__maximums and self.__maximums[-1][1] <= value:
+            self.__maximums.pop()
+        self.__maximums.append((timestamp, value))
+
+        self.__evict(timestamp - self.window)
+
+    def __evict(self, before : float) -> None:
+        while self.__values and self.__values[0][0] < before:
+            _, value = self.__values.popleft()
+            shifted = value - self.__shift
+            self.__sum   -= shifted
+            self.__sumSq -= shifted * shifted
+        while self.__minimums and self.__minimums[0][0] < before:
+            self.__minimums.popleft()
+        while self.__maximums and self.__maximums[0][0] < before:
+            self.__maximums.popleft()
+
+    @property
+    def count(self) -> int:
+        return len(self.__values)
+
+    @property
+    def mean(self) -> float:
+        if not self.__values:
+            return math.nan
+        return self.__shift + self.__sum / len(self.__values)
+
+    @property
+    def variance(self) -> float:
+        """Population variance of the values in the window."""
+        count = len(self.__values)
+        if not count:
+            return math.nan
+        return max(0.0, (self.__sumSq - self.__sum * self.__sum / count) / count)
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self) -> float:
+        return self.__minimums[0][1] if self.__minimums else math.nan
+
+    @property
+    def max(self) -> float:
+        return self.__maximums[0][1] if self.__maximums else math.nan
+
+class EnergyIntegrator:
+    """Integrates power samples to energy using the trapezoidal rule.
+
+    Intervals longer than `maxGap` (e.g. while disconnected) are not integrated, the
+    integration continues from the next sample. With `sign` set, only the positive (1)
+    or negative (-1) part of the power is integrated, e.g. to split grid import and export.
+    """
+
+    def __init__(self, maxGap : float = 300, sign : int = 0):
+        """
+        Args:
+            maxGap (float): Longest interval between samples to integrate [s].
+            sign (int): 0 = net energy, 1 = positive power only, -1 = negative power only (as a positive energy).
+        """
+        self.maxGap     = maxGap
+        self.sign       = sign
+        # [kWh]
+        self.energy     = 0.0
+        self.__last     : tuple[float, float] | None = None
+
+    def add(self, timestamp : float, power : float) -> None:
+        """Add a power sample [kW]."""
+        if math.isnan(power):
+            self.__last = None
+            return
+
+        if self.sign > 0:
+            power = max(power, 0.0)
+        elif self.sign < 0:
+            power = max(-power, 0.0)
+
+        if self.__last is not None:
+            lastTimestamp, lastPower = self.__last
+            interval = timestamp - lastTimestamp
+            if 0 < interval <= self.maxGap:
+                self.energy += (lastPower + power) / 2 * interval / 3600
+
+        self.__last = (timestamp, power)
+
+    def reset(self, energy : float = 0.0) -> None:
+        self.energy = energy
+        self.__last = None
+
+class SermatecAggregates:
+    """Derived sensors computed from parsed replies: rolling statistics and energy.
+
+    Derived values are returned in the same format as parseReply fields, so they can be
+    merged into polled data and listed among sensors (see Sermatec.enableAggregates()).
+    """
+
+    # key -> (source power sensor, sign, name)
+    DEFAULT_ENERGY_SENSORS = {
+        "pv1_energy"                    : ("pv1_power", 1, "PV1 energy"),
+        "pv2_energy"                    : ("pv2_power", 1, "PV2 energy"),
+        "grid_active_energy_positive"   : ("grid_active_power", 1, "Grid active energy (positive power)"),
+        "grid_active_energy_negative"   : ("grid_active_power", -1, "Grid active energy (negative power)"),
+        "dc_energy_positive"            : ("dc_power", 1, "DC energy (positive power)"),
+        "dc_energy_negative"            : ("dc_power", -1, "DC energy (negative power)"),
+    }
+
+    ROLLING_STATISTICS = ("mean", "variance", "stddev", "min", "max")
+
+    # Multipliers converting power units to kW.
+    POWER_UNITS = {"W": 0.001, "kW": 1.0}
+
+    def __init__(self, energyMaxGap : float = 300):
+        """
+        Args:
+            energyMaxGap (float): Longest interval between power samples to integrate [s].
+        """
+        self.energyMaxGap = energyMaxGap
+
+        # key -> (source, statistic, aggregate, name suffix)
+        self.__rolling      : dict[str, tuple[str, str, RollingAggregate, str]] = {}
+        # key -> (source, integrator, name)
+        self.__energy       : dict[str, tuple[str, EnergyIntegrator, str]] = {}
+        # source -> derived keys
+        self.__bySource     : dict[str, list[str]] = {}
+        # Shared aggregates of the same source and window.
+        self.__aggregates   : dict[tuple[str, float], RollingAggregate] = {}
+
+    @classmethod
+    def withDefaults(cls, energyMaxGap : float = 300) -> "SermatecAggregates":
+        """Create aggregates integrating PV, grid and DC (battery) power to energy."""
+        aggregates = cls(energyMaxGap)
+        for key, (source, sign, name) in cls.DEFAULT_ENERGY_SENSORS.items():
+            aggregates.addEnergy(key, source, name, sign)
+        return aggregates
+
+    def addRolling(self, source : str, window : float, statistics : tuple[str, ...] = ("mean", "min", "max")) -> list[str]:
+        """Add rolling statistics of a sensor.
+
+        Args:
+            source (str): Key of the source sensor (as in parseReply).
+            window (float): Length of the window [s].
+            statistics (tuple[str, ...]): Some of ROLLING_STATISTICS.
+
+        Returns:
+            list[str]: Keys of the derived sensors ("<source>_<statistic>_<window>s").
+
+        Raises:
+            ValueError: Unknown statistic.
+        """
+        aggregate = self.__aggregates.get((source, window))
+        if aggregate is None:
+            aggregate = self.__aggregates[(source, window)] = RollingAggregate(window)
+
+        keys = []
+        for statistic in statistics:
+            if statistic not in self.ROLLING_STATISTICS:
+                raise ValueError(f"Unknown statistic '{statistic}'.")
+            key = f"{source}_{statistic}_{window:g}s"
+            self.__rolling[key] = (source, statistic, aggregate, f"{statistic} ({window:g} s)")
+            self.__bySource.setdefault(source, []).append(key)
+            keys.append(key)
+        return keys
+
+    def addEnergy(self, key : str, source : str, name : str, sign : int = 0) -> None:
+        """Add an energy sensor integrating a power sensor (in W or kW) to kWh.
+
+        Args:
+            key (str): Key of the derived sensor.
+            source (str): Key of the source power sensor (as in parseReply).
+            name (str): Friendly name of the derived sensor.
+            sign (int): See EnergyIntegrator.
+        """
+        self.__energy[key] = (source, EnergyIntegrator(self.energyMaxGap, sign), name)
+        self.__bySource.setdefault(source, []).append(key)
+
+    def update(self, parsedData : dict, timestamp : float) -> dict:
+        """Feed values of a parsed reply to the aggregates.
+
+        Args:
+            parsedData (dict): Decoded reply (from decodeReply or decodeReplyIncremental).
+            timestamp (float): Monotonic time of the reply [s].
+
+        Returns:
+            dict: Derived sensors depending on the reply's sensors, in the format of decodeReply
+                (names of rolling statistics are completed by "nameSuffix" when rendered).
+        """
+        derived = {}
+        fed = set()
+        for source, keys in self.__bySource.items():
+            field = parsedData.get(source)
+            if field is None:
+                continue
+            value = field.get("value")
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+
+            for key in keys:
+                if key in self.__energy:
+                    _, integrator, name = self.__energy[key]
+                    multiplier = self.POWER_UNITS.get(field.get("unit"), self.POWER_UNITS["W"])
+                    integrator.add(timestamp, value * multiplier)
+                    derived[key] = {"name": name, "unit": "kWh", "device_class": "ENERGY", "value": round(integrator.energy, 4), "listIgnore": False}
+                else:
+                    _, statistic, aggregate, suffix = self.__rolling[key]
+                    # The aggregate may be shared by more statistics.
+                    if id(aggregate) not in fed:
+                        aggregate.add(timestamp, float(value))
+                        fed.add(id(aggregate))
+                    derivedField = self.__describeRolling(key, field)
+                    derivedField["value"] = getattr(aggregate, statistic)
+                    derived[key] = derivedField
+
+        return derived
+
+    def __describeRolling(self, key : str, sourceField : dict) -> dict:
+        source, statistic, aggregate, suffix = self.__rolling[key]
+
+        # The suffix is appended when rendering, after translating the source's name.
+        derivedField = {"name": sourceField.get("name", source), "nameSuffix": suffix}
+        if "unit" in sourceField:
+            derivedField["unit"] = sourceField["unit"] if statistic != "variance" else f"{sourceField['unit']}²"
+        if "device_class" in sourceField and statistic != "variance":
+            derivedField["device_class"] = sourceField["device_class"]
+        derivedField["listIgnore"] = False
+        return derivedField
+
+    def listSensors(self, sensors : dict) -> dict:
+        """Describe derived sensors whose sources are among the specified sensors.
+
+        Args:
+            sensors (dict): Available sensors (e.g. from Sermatec.listSensors()).
+
+        Returns:
+            dict: Derived sensors without values, in the format of listSensors.
+        """
+        derived = {}
+        for key, (source, integrator, name) in self.__energy.items():
+            if source in sensors:
+                derived[key] = {"name": name, "unit": "kWh", "device_class": "ENERGY", "listIgnore": False}
+
+        for key, (source, statistic, aggregate, suffix) in self.__rolling.items():
+            if source in sensors:
+                # The sensors are already rendered.
+                derivedField = self.__describeRolling(key, sensors[source])
+                derivedField["name"] = f"{derivedField['name']} {derivedField.pop('nameSuffix')}"
+                derived[key] = derivedField
+
+        return derived
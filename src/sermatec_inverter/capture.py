@@ -0,0 +1,272 @@
+import re
+import struct
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from .exceptions import *
+
+class SermatecCaptureWriter:
+    """Write raw reply frames to a capture file.
+
+    Consecutive replies to the same command usually differ in a few bytes only,
+    so every frame except keyframes is stored as a XOR against the previous frame
+    of the same command, with the runs of zeroes packed away. A keyframe (raw frame)
+    is stored every `keyframeInterval` frames of a command, when the frame length
+    changes or when there is no previous frame, so that a reader can start decoding
+    from any keyframe.
+
+    File layout:
+        header: magic (5 B), format version (1 B), keyframe interval (2 B, big endian)
+        record: command (1 B), flags (1 B), timestamp (8 B double), frame length (2 B), body length (2 B), body
+
+    Delta body is a sequence of tokens (zero run length, literal length, literal bytes),
+    each length being a single byte.
+    """
+
+    MAGIC           = b"SMCAP"
+    FORMAT_VERSION  = 1
+
+    FLAG_KEYFRAME   = 0x00
+    FLAG_DELTA      = 0x01
+
+    HEADER_STRUCT   = struct.Struct(">5sBH")
+    RECORD_STRUCT   = struct.Struct(">BBdHH")
+
+    __NONZERO_RUNS  = re.compile(rb"[^\x00]+")
+
+    def __init__(self, file : BinaryIO, keyframeInterval : int = 64):
+        """
+        Args:
+            file (BinaryIO): A file opened for binary writing.
+            keyframeInterval (int): Store a keyframe every N frames of the same command.
+        """
+        if not 1 <= keyframeInterval <= 0xffff:
+            raise ValueError("Keyframe interval has to be in range [1, 65535].")
+
+        self.__file             = file
+        self.__keyframeInterval = keyframeInterval
+        # command -> (previous frame, frames since the last keyframe)
+        self.__previous : dict[int, tuple[bytes, int]] = {}
+
+        self.__file.write(self.HEADER_STRUCT.pack(self.MAGIC, self.FORMAT_VERSION, keyframeInterval))
+
+    @classmethod
+    def open(cls, path : str | Path, keyframeInterval : int = 64) -> "SermatecCaptureWriter":
+        return cls(open(path, "wb"), keyframeInterval)
+
+    @classmethod
+    def encodeDelta(cls, previous : bytes, current : bytes) -> bytes:
+        """XOR two frames of the same length and pack the zero runs.
+
+        Args:
+            previous (bytes): Previous frame of the same command.
+            current (bytes): Frame to encode.
+
+        Returns:
+            bytes: Packed delta.
+        """
+        length = len(current)
+        xored  = (int.from_bytes(previous, "big") ^ int.from_bytes(current, "big")).to_bytes(length, "big")
+
+        body     = bytearray()
+        position = 0
+        for run in cls.__NONZERO_RUNS.finditer(xored):
+            start, end = run.span()
+            zeroes = start - position
+            while zeroes > 0xff:
+                body += b"\xff\x00"
+                zeroes -= 0xff
+            while end - start > 0xff:
+                body.append(zeroes)
+                body.append(0xff)
+                body += xored[start:start + 0xff]
+                start += 0xff
+                zeroes = 0
+            body.append(zeroes)
+            body.append(end - start)
+            body += xored[start:end]
+            position = end
+
+        # Trailing zeroes are implied by the frame length.
+        return bytes(body)
+
+    def write(self, command : int, frame : bytes, timestamp : float = None) -> None:
+        """Append a frame to the capture.
+
+        Args:
+            command (int): A single-byte code of the reply.
+            frame (bytes): Raw reply frame.
+            timestamp (float): Receive time (UNIX time), current time if not specified.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        frame    = bytes(frame)
+        previous = self.__previous.get(command)
+
+        if previous and previous[1] < self.__keyframeInterval - 1 and len(previous[0]) == len(frame):
+            flags      = self.FLAG_DELTA
+            body       = self.encodeDelta(previous[0], frame)
+            sinceKey   = previous[1] + 1
+        else:
+            flags      = self.FLAG_KEYFRAME
+            body       = frame
+            sinceKey   = 0
+
+        self.__previous[command] = (frame, sinceKey)
+        self.__file.write(self.RECORD_STRUCT.pack(command, flags, timestamp, len(frame), len(body)))
+        self.__file.write(body)
+
+    def flush(self) -> None:
+        self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
+
+    def __enter__(self) -> "SermatecCaptureWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class SermatecCaptureReader:
+    """Read frames from a capture written by SermatecCaptureWriter.
+
+    The whole capture is read into memory once; records are then located by
+    an index of record offsets, which allows random access to any frame
+    by decoding from the nearest preceding keyframe of the same command.
+    """
+
+    def __init__(self, data : bytes):
+        """
+        Args:
+            data (bytes): Contents of the capture file.
+
+        Raises:
+            CaptureFileMalformed: If the data is not a valid capture.
+        """
+        header = SermatecCaptureWriter.HEADER_STRUCT
+        if len(data) < header.size:
+            raise CaptureFileMalformed("Capture is too short.")
+
+        magic, version, keyframeInterval = header.unpack_from(data)
+        if magic != SermatecCaptureWriter.MAGIC or version != SermatecCaptureWriter.FORMAT_VERSION:
+            raise CaptureFileMalformed("Unknown capture format.")
+
+        self.keyframeInterval = keyframeInterval
+        self.__data           = memoryview(data)
+        # (offset of body, command, flags, timestamp, frame length, body length)
+        self.__records : list[tuple[int, int, int, float, int, int]] = []
+        # Index of the last keyframe of the same command for every record.
+        self.__keyframeOf : list[int] = []
+
+        self.__buildIndex(header.size)
+
+    @classmethod
+    def open(cls, path : str | Path) -> "SermatecCaptureReader":
+        with open(path, "rb") as captureFile:
+            return cls(captureFile.read())
+
+    def __buildIndex(self, offset : int) -> None:
+        record        = SermatecCaptureWriter.RECORD_STRUCT
+        dataLength    = len(self.__data)
+        lastKeyframes : dict[int, int] = {}
+
+        while offset < dataLength:
+            if offset + record.size > dataLength:
+                raise CaptureFileMalformed("Truncated record header.")
+
+            command, flags, timestamp, frameLength, bodyLength = record.unpack_from(self.__data, offset)
+            offset += record.size
+
+            if offset + bodyLength > dataLength:
+                raise CaptureFileMalformed("Truncated record body.")
+
+            if flags == SermatecCaptureWriter.FLAG_KEYFRAME:
+                lastKeyframes[command] = len(self.__records)
+            elif command not in lastKeyframes:
+                raise CaptureFileMalformed("Delta record without a preceding keyframe.")
+
+            self.__keyframeOf.append(lastKeyframes[command])
+            self.__records.append((offset, command, flags, timestamp, frameLength, bodyLength))
+            offset += bodyLength
+
+    @staticmethod
+    def decodeDelta(previous : bytes, body : bytes, frameLength : int) -> bytes:
+        """Apply a packed delta to the previous frame.
+
+        Args:
+            previous (bytes): Previous frame of the same command.
+            body (bytes): Packed delta created by SermatecCaptureWriter.encodeDelta.
+            frameLength (int): Length of the decoded frame.
+
+        Returns:
+            bytes: Decoded frame.
+        """
+        xored    = bytearray(frameLength)
+        position = 0
+        index    = 0
+        bodyLength = len(body)
+
+        while index < bodyLength:
+            position += body[index]
+            literalLength = body[index + 1]
+            index += 2
+            xored[position:position + literalLength] = body[index:index + literalLength]
+            position += literalLength
+            index += literalLength
+
+        return (int.from_bytes(previous, "big") ^ int.from_bytes(xored, "big")).to_bytes(frameLength, "big")
+
+    def __len__(self) -> int:
+        return len(self.__records)
+
+    def __body(self, recordIndex : int) -> bytes:
+        offset, _, _, _, _, bodyLength = self.__records[recordIndex]
+        return self.__data[offset:offset + bodyLength]
+
+    def frameAt(self, recordIndex : int) -> tuple[int, float, bytes]:
+        """Decode a single frame using the nearest preceding keyframe.
+
+        Args:
+            recordIndex (int): Position of the frame in the capture.
+
+        Returns:
+            tuple[int, float, bytes]: Command, timestamp and raw frame.
+        """
+        command   = self.__records[recordIndex][1]
+        keyframe  = self.__keyframeOf[recordIndex]
+        frame     = bytes(self.__body(keyframe))
+
+        for index in range(keyframe + 1, recordIndex + 1):
+            if self.__records[index][1] == command:
+                frame = self.decodeDelta(frame, self.__body(index), self.__records[index][4])
+
+        return command, self.__records[recordIndex][3], frame
+
+    def frames(self, command : int = None) -> Iterator[tuple[int, float, bytes]]:
+        """Decode frames sequentially.
+
+        Args:
+            command (int): Yield only frames of this command, all frames if not specified.
+
+        Yields:
+            tuple[int, float, bytes]: Command, timestamp and raw frame.
+        """
+        previous : dict[int, bytes] = {}
+
+        for index, (_, recordCommand, flags, timestamp, frameLength, _) in enumerate(self.__records):
+            if command is not None and recordCommand != command:
+                continue
+
+            if flags == SermatecCaptureWriter.FLAG_KEYFRAME:
+                frame = bytes(self.__body(index))
+            else:
+                frame = self.decodeDelta(previous[recordCommand], self.__body(index), frameLength)
+
+            previous[recordCommand] = frame
+            yield recordCommand, timestamp, frame
+
+    def __iter__(self) -> Iterator[tuple[int, float, bytes]]:
+        return self.frames()
@@ -0,0 +1,176 @@
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from .exceptions import *
+from .protocol_parser import SermatecProtocolParser
+
+_LOGGER = logging.getLogger(__name__)
+
+class Deadband:
+    """Minimal change of a numeric value worth publishing.
+
+    A value is published when it differs from the last published one by more than
+    `absolute` or by more than `percent` % of the last published value (whichever is larger).
+    Non-numeric values are published on any change.
+    """
+
+    __slots__ = ("absolute", "percent")
+
+    def __init__(self, absolute : float = 0, percent : float = 0):
+        self.absolute = absolute
+        self.percent  = percent
+
+    def exceeded(self, last : object, current : object) -> bool:
+        if isinstance(current, bool) or not isinstance(current, (int, float)) or not isinstance(last, (int, float)):
+            return current != last
+        return abs(current - last) > max(self.absolute, abs(last) * self.percent / 100)
+
+class SermatecChangeFilter:
+    """Pipeline stage publishing only the fields which changed since the previous poll.
+
+    Raw bytes of every field are compared with the previous reply first, so unchanged
+    replies (and fields) are never decoded. Changed fields pass when they exceed their
+    deadband (any change by default). Every field is published at least once per
+    `maxSilence` seconds as a heartbeat, so consumers can tell stale from steady values.
+
+    Typical use with raw replies:
+
+        changeFilter = SermatecChangeFilter(smc.parser, smc.pcuVersion, consumer = publish)
+        await changeFilter.process(0x0b, await smc.getCustomRaw(0x0b))
+    """
+
+    DEFAULT_DEADBAND = Deadband()
+
+    def __init__(
+        self,
+        parser : SermatecProtocolParser,
+        version : int,
+        deadbands : dict[str, Deadband] = {},
+        maxSilence : float | None = 300,
+        consumer : Callable[[int, dict], Awaitable[None]] | None = None
+    ):
+        """
+        Args:
+            parser (SermatecProtocolParser): Parser used to decode the replies.
+            version (int): PCU version of the inverter.
+            deadbands (dict[str, Deadband]): Field key (as returned by parseReply) -> deadband.
+            maxSilence (float | None): Publish unchanged fields after this time [s], never if None.
+            consumer (Callable[[int, dict], Awaitable[None]] | None): Coroutine function awaited
+                by process() with the response code and the published fields.
+        """
+        self.parser     = parser
+        self.version    = version
+        self.deadbands  = dict(deadbands)
+        self.maxSilence = maxSilence
+        self.consumer   = consumer
+
+        # responseCode -> data of the previous reply
+        self.__previousData     : dict[int, bytes] = {}
+        # responseCode -> key -> (offset, length)
+        self.__spans            : dict[int, dict[str, tuple[int, int]]] = {}
+        # responseCode -> key -> last published value
+        self.__publishedValues  : dict[int, dict[str, object]] = {}
+        # responseCode -> key -> monotonic time of the last publishing
+        self.__publishedTimes   : dict[int, dict[str, float]] = {}
+
+    def reset(self) -> None:
+        """Forget all previous replies, the next one is published whole."""
+        self.__previousData.clear()
+        self.__publishedValues.clear()
+        self.__publishedTimes.clear()
+
+    def filter(self, responseCode : int, reply : bytes, timestamp : float | None = None) -> dict:
+        """Get the fields of a reply which should be published.
+
+        Args:
+            responseCode (int): Code of the reply.
+            reply (bytes): Whole reply frame.
+            timestamp (float | None): Monotonic time of the reply, now if None.
+
+        Returns:
+            dict: Fields to publish, in the format of parseReply.
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: There is a field in command reply which is not supported.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        data         = bytes(reply[self.parser.REPLY_OFFSET_DATA:])
+        previousData = self.__previousData.get(responseCode)
+        self.__previousData[responseCode] = data
+
+        spans = self.__spans.get(responseCode)
+        if spans is None:
+            spans = self.__spans[responseCode] = self.parser.getReplySpans(responseCode, self.version)
+
+        publishedValues = self.__publishedValues.setdefault(responseCode, {})
+        publishedTimes  = self.__publishedTimes.setdefault(responseCode, {})
+
+        # Keys whose raw bytes changed (or were never seen).
+        if previousData is None or len(previousData) != len(data):
+            changedKeys = set(spans)
+        elif previousData == data:
+            changedKeys = set()
+        else:
+            changedKeys = {key for key, (start, length) in spans.items() if previousData[start:start + length] != data[start:start + length]}
+
+        # Unchanged keys only need publishing as a heartbeat.
+        if self.maxSilence is not None:
+            silentSince = timestamp - self.maxSilence
+            heartbeatKeys = {key for key, publishedAt in publishedTimes.items() if publishedAt <= silentSince}
+        else:
+            heartbeatKeys = set()
+
+        if not changedKeys and not heartbeatKeys:
+            return {}
+
+        # Only fields whose bytes changed since the previous reply are decoded again.
+        decoded = self.parser.decodeReplyIncremental(responseCode, self.version, reply)
+        changes = {}
+        for key in changedKeys | heartbeatKeys:
+            field = decoded.get(key)
+            if field is None:
+                continue
+
+            if key in changedKeys and key in publishedValues:
+                deadband = self.deadbands.get(key, self.DEFAULT_DEADBAND)
+                if not deadband.exceeded(publishedValues[key], field.get("value")) and key not in heartbeatKeys:
+                    continue
+
+            changes[key]         = field
+            publishedValues[key] = field.get("value")
+            publishedTimes[key]  = timestamp
+
+        return self.parser.renderReply(changes)
+
+    async def process(self, command : int, responses : list[bytes], timestamp : float | None = None) -> dict:
+        """Filter all responses to a command and pass the changes to the consumer.
+
+        Args:
+            command (int): Command the responses belong to.
+            responses (list[bytes]): Responses, e.g. from Sermatec.getCustomRaw().
+            timestamp (float | None): Monotonic time of the responses, now if None.
+
+        Returns:
+            dict: Published fields of all responses.
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: There is a field in command reply which is not supported.
+        """
+        changes = {}
+        for response, responseCode in zip(responses, self.parser.getResponseCommands(command)):
+            responseChanges = self.filter(responseCode, response, timestamp)
+            if responseChanges:
+                changes.update(responseChanges)
+                if self.consumer:
+                    await self.consumer(responseCode, responseChanges)
+
+        if changes:
+            _LOGGER.debug(f"Publishing {len(changes)} changed field(s) of 0x{command:02x}.")
+        return changes
@@ -66,5 +66,23 @@ class DummyConverter(BaseConverter):
     def fromFriendly(self, value):
         return value
     
+    def listFriendly(self) -> list:
+        return []
+
+class ScaleConverter(BaseConverter):
+    """Convert between a scaled friendly value (e.g. 0.95) and a raw integer (e.g. 950)."""
+    def __init__(self, multiplier : float):
+        """
+        Args:
+            multiplier (float): Value of one raw unit, like the unitValue of a protocol field.
+        """
+        self.__multiplier = multiplier
+
+    def toFriendly(self, value : int):
+        return value * self.__multiplier
+
+    def fromFriendly(self, value) -> int:
+        return round(float(value) / self.__multiplier)
+
     def listFriendly(self) -> list:
         return []
\ No newline at end of file
@@ -0,0 +1,150 @@
+import logging
+import time
+from enum import Enum
+
+from .exceptions import *
+from .protocol_parser import SermatecProtocolParser
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecEdge(Enum):
+    RISING  = "rising"
+    FALLING = "falling"
+    # Multi-bit fields (bitRange) change their value instead.
+    CHANGED = "changed"
+
+class SermatecBitEvent:
+    """A change of a flag (bit, bit range or binary word) in a status word."""
+
+    __slots__ = ("command", "key", "name", "edge", "value", "previousValue", "deviceClass", "timestamp")
+
+    def __init__(self, command : int, key : str, name : str, edge : SermatecEdge, value : bool | int | str, previousValue : bool | int | str | None, deviceClass : str | None, timestamp : float):
+        self.command        = command
+        self.key            = key
+        self.name           = name
+        self.edge           = edge
+        self.value          = value
+        self.previousValue  = previousValue
+        self.deviceClass    = deviceClass
+        self.timestamp      = timestamp
+
+    def __repr__(self) -> str:
+        return f"SermatecBitEvent(0x{self.command:02x}, {self.key}, {self.edge.value}, {self.previousValue!r} -> {self.value!r})"
+
+class SermatecEventDetector:
+    """Detects changes of flags in status words of polled replies.
+
+    Flags sharing a status word are grouped, so each word is compared with its previous
+    value by a single XOR and only the flags covered by changed bits produce events.
+    """
+
+    def __init__(self, parser : SermatecProtocolParser, version : int, reportInitial : bool = True):
+        """
+        Args:
+            parser (SermatecProtocolParser): Parser providing layouts and translated names.
+            version (int): PCU version of the inverter.
+            reportInitial (bool): Report flags set in the first reply as rising edges
+                (the first reply is compared with all flags cleared).
+        """
+        self.parser         = parser
+        self.version        = version
+        self.reportInitial  = reportInitial
+
+        # responseCode -> [(start, end, [(mask, fromBit, bitMask, field)])]
+        self.__words        : dict[int, list[tuple[int, int, list[tuple]]]] = {}
+        # responseCode -> previous values of the words
+        self.__previous     : dict[int, list[int]] = {}
+
+    def reset(self) -> None:
+        self.__previous.clear()
+
+    def __compileWords(self, responseCode : int) -> list[tuple[int, int, list[tuple]]]:
+        words = []
+        for start, length, fields in self.parser.getStatusWords(responseCode, self.version):
+            compiledFields = []
+            for field in fields:
+                bitMask = (1 << (field["endBit"] - field["fromBit"])) - 1
+                compiledFields.append((bitMask << field["fromBit"], field["fromBit"], bitMask, field))
+            words.append((start, start + length, compiledFields))
+        return words
+
+    @staticmethod
+    def __fieldValue(word : int, fromBit : int, bitMask : int, field : dict) -> bool | int | str:
+        value = (word >> fromBit) & bitMask
+        if field["converter"]:
+            # Converters map the raw value (e.g. 0xee00 of a whole binary word).
+            return field["converter"].toFriendly(value)
+        if field["type"] != "bitRange":
+            return bool(value)
+        return value
+
+    def process(self, responseCode : int, reply : bytes, timestamp : float | None = None) -> list[SermatecBitEvent]:
+        """Compare status words of a reply with the previous reply.
+
+        Args:
+            responseCode (int): Code of the reply.
+            reply (bytes): Whole reply frame.
+            timestamp (float | None): Monotonic time of the reply, now if None.
+
+        Returns:
+            list[SermatecBitEvent]: Changes of the flags (empty if the reply has no flags).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        words = self.__words.get(responseCode)
+        if words is None:
+            words = self.__words[responseCode] = self.__compileWords(responseCode)
+        if not words:
+            return []
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        data     = reply[self.parser.REPLY_OFFSET_DATA:]
+        current  = [int.from_bytes(data[start:end], byteorder = "big") for start, end, _ in words]
+        previous = self.__previous.get(responseCode)
+        self.__previous[responseCode] = current
+
+        if previous is None:
+            if not self.reportInitial:
+                return []
+            previous = [0] * len(words)
+
+        events : list[SermatecBitEvent] = []
+        for (start, end, fields), word, previousWord in zip(words, current, previous):
+            changed = word ^ previousWord
+            if not changed:
+                continue
+
+            for mask, fromBit, bitMask, field in fields:
+                if not changed & mask:
+                    continue
+
+                value         = self.__fieldValue(word, fromBit, bitMask, field)
+                previousValue = self.__fieldValue(previousWord, fromBit, bitMask, field)
+                if value == previousValue:
+                    # Raw values meaning the same (e.g. 0x00ee and 0x0000 are both off).
+                    continue
+
+                # The edge follows the friendly value, converters may invert the raw one.
+                if field["type"] == "bitRange":
+                    edge = SermatecEdge.CHANGED
+                else:
+                    edge = SermatecEdge.RISING if value else SermatecEdge.FALLING
+
+                events.append(SermatecBitEvent(
+                    command       = responseCode,
+                    key           = field["key"],
+                    name          = field["name"],
+                    edge          = edge,
+                    value         = value,
+                    previousValue = previousValue,
+                    deviceClass   = field["deviceClass"],
+                    timestamp     = timestamp
+                ))
+
+        if events:
+            _LOGGER.debug(f"Detected {len(events)} flag change(s) in 0x{responseCode:02x}.")
+        return events
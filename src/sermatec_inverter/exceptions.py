@@ -38,4 +38,16 @@ class MissingTaggedData(BaseException):
     pass
 
 class InverterIsNotOff(BaseException):
+    pass
+
+class CaptureFileMalformed(BaseException):
+    pass
+
+class ParameterVerificationFailed(BaseException):
+    pass
+
+class SnapshotSkewExceeded(BaseException):
+    pass
+
+class StoreMalformed(BaseException):
     pass
\ No newline at end of file
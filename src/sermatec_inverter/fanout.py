@@ -0,0 +1,216 @@
+import asyncio
+import time
+from collections import deque
+from enum import Enum
+from typing import Any
+
+class SermatecOverflowPolicy(Enum):
+    """What happens when a subscriber's queue is full."""
+    # Keep only the newest item (the queue size is 1).
+    LATEST      = "latest"
+    # Drop the oldest queued item.
+    DROP_OLDEST = "dropOldest"
+    # Keep every item; the publisher lets the subscriber catch up in its idle time (see SermatecFanOut.drain()).
+    # Without draining, up to twice the queue size is kept and the oldest items are dropped.
+    BLOCK       = "block"
+
+class SermatecSubscription:
+    """Bounded queue of published items for a single consumer, iterated by `async for`.
+
+    Publishing never waits for the consumer; the policy decides what happens when the
+    queue is full. The iteration ends when the subscription is closed.
+    """
+
+    def __init__(self, fanOut : "SermatecFanOut", maxSize : int, policy : SermatecOverflowPolicy, name : str):
+        if maxSize < 1:
+            raise ValueError("Subscription queue size has to be positive.")
+
+        self.name       = name
+        self.policy     = policy
+        self.maxSize    = 1 if policy == SermatecOverflowPolicy.LATEST else maxSize
+
+        self.delivered  = 0
+        self.dropped    = 0
+        self.maxQueued  = 0
+        # Longest time an item waited in the queue [s].
+        self.maxLag     = 0.0
+
+        self.__fanOut   = fanOut
+        # (monotonic time of publishing, item)
+        self.__queue    : deque[tuple[float, Any]] = deque()
+        # Items of BLOCK subscriptions above maxSize (at most maxSize), kept until the publisher's drain deadline.
+        self.__overflow : deque[tuple[float, Any]] = deque()
+        self.__waiter   : asyncio.Future | None = None
+        self.__drained  : asyncio.Future | None = None
+        self.__closed   = False
+
+    # ====================================================================
+    # Publisher side
+    # ====================================================================
+    def offer(self, item : Any, timestamp : float) -> None:
+        if self.__closed:
+            return
+
+        if len(self.__queue) < self.maxSize:
+            self.__queue.append((timestamp, item))
+        elif self.policy == SermatecOverflowPolicy.BLOCK:
+            if len(self.__overflow) >= self.maxSize:
+                # Nobody drains (e.g. the fan-out of Sermatec), don't grow without bound.
+                self.__queue.popleft()
+                self.__queue.append(self.__overflow.popleft())
+                self.dropped += 1
+            self.__overflow.append((timestamp, item))
+        else:
+            self.__queue.popleft()
+            self.__queue.append((timestamp, item))
+            self.dropped += 1
+
+        self.maxQueued = max(self.maxQueued, self.queued)
+        if self.__waiter is not None and not self.__waiter.done():
+            self.__waiter.set_result(None)
+
+    @property
+    def overflowing(self) -> bool:
+        return bool(self.__overflow)
+
+    async def waitForCapacity(self) -> None:
+        """Wait until the overflowing items fit into the queue."""
+        while self.__overflow and not self.__closed:
+            self.__drained = asyncio.get_running_loop().create_future()
+            await self.__drained
+
+    def dropOverflow(self) -> None:
+        """Make room for the overflowing items by dropping the oldest ones."""
+        while self.__overflow:
+            if len(self.__queue) >= self.maxSize:
+                self.__queue.popleft()
+                self.dropped += 1
+            self.__queue.append(self.__overflow.popleft())
+        if self.__drained is not None and not self.__drained.done():
+            self.__drained.set_result(None)
+
+    # ====================================================================
+    # Consumer side
+    # ====================================================================
+    @property
+    def queued(self) -> int:
+        return len(self.__queue) + len(self.__overflow)
+
+    @property
+    def lag(self) -> float:
+        """How long the oldest queued item waits [s]."""
+        if not self.__queue:
+            return 0.0
+        return time.monotonic() - self.__queue[0][0]
+
+    async def get(self) -> Any:
+        """Wait for the next item.
+
+        Raises:
+            StopAsyncIteration: The subscription is closed.
+        """
+        while not self.__queue:
+            if self.__closed:
+                raise StopAsyncIteration()
+            self.__waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.__waiter
+            finally:
+                self.__waiter = None
+
+        timestamp, item = self.__queue.popleft()
+        if self.__overflow:
+            self.__queue.append(self.__overflow.popleft())
+            if not self.__overflow and self.__drained is not None and not self.__drained.done():
+                self.__drained.set_result(None)
+
+        self.delivered += 1
+        self.maxLag = max(self.maxLag, time.monotonic() - timestamp)
+        return item
+
+    def __aiter__(self) -> "SermatecSubscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self.get()
+
+    def close(self) -> None:
+        """Stop receiving items, the iteration ends after the queued ones."""
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__fanOut.unsubscribe(self)
+        for future in (self.__waiter, self.__drained):
+            if future is not None and not future.done():
+                future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "name"      : self.name,
+            "policy"    : self.policy.value,
+            "queued"    : self.queued,
+            "maxQueued" : self.maxQueued,
+            "delivered" : self.delivered,
+            "dropped"   : self.dropped,
+            "lag"       : self.lag,
+            "maxLag"    : self.maxLag,
+        }
+
+class SermatecFanOut:
+    """Delivers published items to any number of subscriptions without waiting for them."""
+
+    def __init__(self):
+        self.__subscriptions : list[SermatecSubscription] = []
+
+    def subscribe(self, maxSize : int = 16, policy : SermatecOverflowPolicy = SermatecOverflowPolicy.DROP_OLDEST, name : str | None = None) -> SermatecSubscription:
+        """Create a subscription receiving items published from now on.
+
+        Args:
+            maxSize (int): Capacity of the subscription's queue (1 with the LATEST policy).
+            policy (SermatecOverflowPolicy): What to do when the queue is full.
+            name (str | None): Name used in stats().
+
+        Returns:
+            SermatecSubscription: Async iterator of the items, close() it when done.
+        """
+        subscription = SermatecSubscription(self, maxSize, policy, name or f"subscriber{len(self.__subscriptions)}")
+        self.__subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription : SermatecSubscription) -> None:
+        if subscription in self.__subscriptions:
+            self.__subscriptions.remove(subscription)
+            subscription.close()
+
+    def __len__(self) -> int:
+        return len(self.__subscriptions)
+
+    def publish(self, item : Any) -> None:
+        """Queue an item for all subscriptions (never waits)."""
+        timestamp = time.monotonic()
+        for subscription in self.__subscriptions:
+            subscription.offer(item, timestamp)
+
+    async def drain(self, timeout : float) -> None:
+        """Let BLOCK subscriptions catch up, at most for `timeout` seconds.
+
+        Items still not fitting into their queues after the timeout are dropped (the oldest first),
+        so a stuck subscriber delays the publisher at most by the timeout.
+        """
+        overflowing = [subscription for subscription in self.__subscriptions if subscription.overflowing]
+        if not overflowing:
+            return
+
+        if timeout > 0:
+            await asyncio.wait([asyncio.ensure_future(subscription.waitForCapacity()) for subscription in overflowing], timeout = timeout)
+        for subscription in overflowing:
+            subscription.dropOverflow()
+
+    def close(self) -> None:
+        """Close all subscriptions."""
+        for subscription in list(self.__subscriptions):
+            subscription.close()
+
+    def stats(self) -> list[dict]:
+        """Get queue lengths, delivered and dropped counts and lags of all subscriptions."""
+        return [subscription.stats() for subscription in self.__subscriptions]
@@ -0,0 +1,160 @@
+import bisect
+import math
+import time
+from array import array
+
+class SermatecHistory:
+    """Fixed-capacity in-memory history of numeric sensor values.
+
+    Values of every reply code are stored in ring buffers: one `array('q')` column
+    of timestamps (milliseconds since the epoch) shared by one `array('d')` column per
+    sensor. Appending a snapshot and dropping the oldest one is O(1) per sensor, time
+    range queries use a binary search over the timestamps. Missing values are NaN.
+
+    Memory is allocated when a reply code (or a sensor) is seen for the first time and
+    does not grow afterwards, see estimateMemory().
+    """
+
+    ITEM_SIZE = 8
+
+    def __init__(self, capacity : int = 3600):
+        """
+        Args:
+            capacity (int): How many snapshots to keep per reply code.
+        """
+        if capacity < 1:
+            raise ValueError("History capacity has to be positive.")
+
+        self.capacity = capacity
+
+        # responseCode -> timestamps [ms]
+        self.__timestamps   : dict[int, array] = {}
+        # responseCode -> sensor key -> values
+        self.__values       : dict[int, dict[str, array]] = {}
+        # responseCode -> index of the next write
+        self.__heads        : dict[int, int] = {}
+        # responseCode -> number of stored snapshots
+        self.__counts       : dict[int, int] = {}
+        # sensor key -> responseCode
+        self.__sensors      : dict[str, int] = {}
+
+    @staticmethod
+    def estimateMemory(capacity : int, sensorCount : int, commandCount : int = 1) -> int:
+        """Estimate memory used by the buffers (in bytes) for a number of sensors spread among reply codes."""
+        return capacity * SermatecHistory.ITEM_SIZE * (sensorCount + commandCount)
+
+    def memoryUsage(self) -> int:
+        """Get memory used by the allocated buffers (in bytes)."""
+        columns = len(self.__timestamps) + sum(len(values) for values in self.__values.values())
+        return columns * self.capacity * self.ITEM_SIZE
+
+    def keys(self) -> list[str]:
+        """Get keys of all sensors with a history."""
+        return list(self.__sensors)
+
+    def __len__(self) -> int:
+        return max(self.__counts.values(), default = 0)
+
+    def append(self, responseCode : int, parsedData : dict, timestamp : float | None = None) -> None:
+        """Store numeric values of a parsed reply.
+
+        Args:
+            responseCode (int): Code of the reply.
+            parsedData (dict): Parsed reply (from parseReply).
+            timestamp (float | None): Time of the reply (seconds since the epoch), now if None.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        timestamps = self.__timestamps.get(responseCode)
+        if timestamps is None:
+            timestamps = self.__timestamps[responseCode] = array("q", bytes(self.ITEM_SIZE * self.capacity))
+            self.__values[responseCode] = {}
+            self.__heads[responseCode]  = 0
+            self.__counts[responseCode] = 0
+
+        columns = self.__values[responseCode]
+        head    = self.__heads[responseCode]
+
+        timestamps[head] = int(timestamp * 1000)
+        written = set()
+        for key, field in parsedData.items():
+            value = field.get("value")
+            if not isinstance(value, (int, float)):
+                continue
+
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = array("d", [math.nan]) * self.capacity
+                self.__sensors[key] = responseCode
+
+            column[head] = value
+            written.add(key)
+
+        for key, column in columns.items():
+            if key not in written:
+                column[head] = math.nan
+
+        self.__heads[responseCode]  = (head + 1) % self.capacity
+        self.__counts[responseCode] = min(self.__counts[responseCode] + 1, self.capacity)
+
+    def __chronological(self, column : array, oldest : int, first : int, last : int) -> array:
+        """Get items first..last-1 (counted from the oldest) of a ring buffer column."""
+        start = (oldest + first) % self.capacity
+        end   = start + (last - first)
+        if end <= self.capacity:
+            return column[start:end]
+        return column[start:] + column[:end - self.capacity]
+
+    def query(self, key : str, since : float | None = None, until : float | None = None) -> tuple[array, array]:
+        """Get values of a sensor in a time range (inclusive), the oldest first.
+
+        Args:
+            key (str): Sensor key (as in parseReply).
+            since (float | None): Start of the range (seconds since the epoch), the oldest value if None.
+            until (float | None): End of the range (seconds since the epoch), the newest value if None.
+
+        Returns:
+            tuple[array, array]: Timestamps [ms] and values.
+
+        Raises:
+            KeyError: No history of the sensor.
+        """
+        responseCode = self.__sensors[key]
+        timestamps   = self.__timestamps[responseCode]
+        count        = self.__counts[responseCode]
+        oldest       = (self.__heads[responseCode] - count) % self.capacity
+
+        position = lambda index: timestamps[(oldest + index) % self.capacity]
+        first = 0 if since is None else bisect.bisect_left(range(count), int(since * 1000), key = position)
+        last  = count if until is None else bisect.bisect_right(range(count), int(until * 1000), key = position)
+        if last <= first:
+            return array("q"), array("d")
+
+        return (
+            self.__chronological(timestamps, oldest, first, last),
+            self.__chronological(self.__values[responseCode][key], oldest, first, last)
+        )
+
+    def last(self, key : str, count : int) -> tuple[array, array]:
+        """Get the newest values of a sensor, the oldest first.
+
+        Raises:
+            KeyError: No history of the sensor.
+        """
+        responseCode = self.__sensors[key]
+        stored       = self.__counts[responseCode]
+        oldest       = (self.__heads[responseCode] - stored) % self.capacity
+        first        = max(0, stored - count)
+
+        return (
+            self.__chronological(self.__timestamps[responseCode], oldest, first, stored),
+            self.__chronological(self.__values[responseCode][key], oldest, first, stored)
+        )
+
+    def clear(self) -> None:
+        self.__timestamps.clear()
+        self.__values.clear()
+        self.__heads.clear()
+        self.__counts.clear()
+        self.__sensors.clear()
@@ -0,0 +1,234 @@
+import bisect
+import time
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds (Prometheus-style)."""
+
+    # Upper bounds in seconds, suited for network round trips and parsing.
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets : tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last item counts values above the highest bound.
+        self.counts  = [0] * (len(buckets) + 1)
+        self.sum     = 0.0
+        self.count   = 0
+
+    def observe(self, value : float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum   += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets    = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+
+        return {
+            "count"   : self.count,
+            "sum"     : self.sum,
+            "buckets" : buckets,
+        }
+
+class SermatecMetrics:
+    """Counters and histograms describing communication with a single inverter.
+
+    Updating is a few dictionary operations per query, so the metrics are always enabled.
+    Commands are stored as integer codes and formatted as hex strings in the outputs.
+    """
+
+    ATTEMPT_BUCKETS = (1, 2, 3, 4, 5)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.createdAt          = time.time()
+
+        self.connects           = 0
+        self.connectFailures    = 0
+        self.connectTime        = Histogram()
+
+        self.queries            : dict[int, int] = {}
+        self.failedQueries      : dict[int, int] = {}
+        self.attempts           : dict[int, Histogram] = {}
+        self.roundTripTime      : dict[int, Histogram] = {}
+        self.parseTime          : dict[int, Histogram] = {}
+        # (command, reason) -> count
+        self.integrityFailures  : dict[tuple[int, str], int] = {}
+        # (command, "send" | "recv") -> count
+        self.timeouts           : dict[tuple[int, str], int] = {}
+        self.connectionResets   = 0
+
+        # Time requests waited for the rate limiter, including zero waits.
+        self.throttleWait       : dict[int, Histogram] = {}
+        self.throttled          : dict[int, int] = {}
+        # Request class -> time requests waited for their turn in the scheduler.
+        self.schedulerWait      : dict[str, Histogram] = {}
+
+        self.bytesSent          : dict[int, int] = {}
+        self.bytesReceived      : dict[int, int] = {}
+
+    # ====================================================================
+    # Recording
+    # ====================================================================
+    def recordConnect(self, duration : float, success : bool) -> None:
+        if success:
+            self.connects += 1
+            self.connectTime.observe(duration)
+        else:
+            self.connectFailures += 1
+
+    def recordQuery(self, command : int, attempts : int, success : bool) -> None:
+        if success:
+            self.queries[command] = self.queries.get(command, 0) + 1
+        else:
+            self.failedQueries[command] = self.failedQueries.get(command, 0) + 1
+
+        histogram = self.attempts.get(command)
+        if histogram is None:
+            histogram = self.attempts[command] = Histogram(self.ATTEMPT_BUCKETS)
+        histogram.observe(attempts)
+
+    def recordRoundTrip(self, command : int, duration : float) -> None:
+        histogram = self.roundTripTime.get(command)
+        if histogram is None:
+            histogram = self.roundTripTime[command] = Histogram()
+        histogram.observe(duration)
+
+    def recordParse(self, command : int, duration : float) -> None:
+        histogram = self.parseTime.get(command)
+        if histogram is None:
+            histogram = self.parseTime[command] = Histogram()
+        histogram.observe(duration)
+
+    def recordIntegrityFailure(self, command : int, reason : str) -> None:
+        key = (command, reason)
+        self.integrityFailures[key] = self.integrityFailures.get(key, 0) + 1
+
+    def recordTimeout(self, command : int, direction : str) -> None:
+        key = (command, direction)
+        self.timeouts[key] = self.timeouts.get(key, 0) + 1
+
+    def recordConnectionReset(self) -> None:
+        self.connectionResets += 1
+
+    def recordThrottle(self, command : int, duration : float) -> None:
+        histogram = self.throttleWait.get(command)
+        if histogram is None:
+            histogram = self.throttleWait[command] = Histogram()
+        histogram.observe(duration)
+        if duration > 0:
+            self.throttled[command] = self.throttled.get(command, 0) + 1
+
+    def recordSchedulerWait(self, requestClass : str, duration : float) -> None:
+        histogram = self.schedulerWait.get(requestClass)
+        if histogram is None:
+            histogram = self.schedulerWait[requestClass] = Histogram()
+        histogram.observe(duration)
+
+    def recordSent(self, command : int, count : int) -> None:
+        self.bytesSent[command] = self.bytesSent.get(command, 0) + count
+
+    def recordReceived(self, command : int, count : int) -> None:
+        self.bytesReceived[command] = self.bytesReceived.get(command, 0) + count
+
+    # ====================================================================
+    # Outputs
+    # ====================================================================
+    def snapshot(self) -> dict:
+        """Get all metrics as a (JSON-serializable) dictionary."""
+        def perCommand(values : dict) -> dict:
+            return {f"{command:02x}": (value.snapshot() if isinstance(value, Histogram) else value) for command, value in values.items()}
+
+        def perCommandAndLabel(values : dict) -> dict:
+            result : dict = {}
+            for (command, label), value in values.items():
+                result.setdefault(f"{command:02x}", {})[label] = value
+            return result
+
+        return {
+            "since"             : self.createdAt,
+            "connects"          : self.connects,
+            "connectFailures"   : self.connectFailures,
+            "connectTime"       : self.connectTime.snapshot(),
+            "connectionResets"  : self.connectionResets,
+            "queries"           : perCommand(self.queries),
+            "failedQueries"     : perCommand(self.failedQueries),
+            "attempts"          : perCommand(self.attempts),
+            "roundTripTime"     : perCommand(self.roundTripTime),
+            "parseTime"         : perCommand(self.parseTime),
+            "integrityFailures" : perCommandAndLabel(self.integrityFailures),
+            "timeouts"          : perCommandAndLabel(self.timeouts),
+            "throttleWait"      : perCommand(self.throttleWait),
+            "throttled"         : perCommand(self.throttled),
+            "schedulerWait"     : {requestClass: histogram.snapshot() for requestClass, histogram in self.schedulerWait.items()},
+            "bytesSent"         : perCommand(self.bytesSent),
+            "bytesReceived"     : perCommand(self.bytesReceived),
+        }
+
+    def toPrometheus(self, labels : dict[str, str] = {}, prefix : str = "sermatec") -> str:
+        """Format metrics in the Prometheus text exposition format.
+
+        Args:
+            labels (dict[str, str]): Labels added to every sample (e.g. the inverter's host).
+            prefix (str): Prefix of the metric names.
+
+        Returns:
+            str: Metrics text.
+        """
+        lines : list[str] = []
+
+        def formatLabels(extra : dict) -> str:
+            allLabels = {**labels, **extra}
+            if not allLabels:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"") for value in allLabels.values())
+            return "{" + ",".join(f"{key}=\"{value}\"" for key, value in zip(allLabels.keys(), escaped)) + "}"
+
+        def counter(name : str, help : str, samples : list[tuple[dict, float]]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for sampleLabels, value in samples:
+                lines.append(f"{prefix}_{name}{formatLabels(sampleLabels)} {value}")
+
+        def histogram(name : str, help : str, samples : list[tuple[dict, Histogram]]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for sampleLabels, hist in samples:
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    lines.append(f"{prefix}_{name}_bucket{formatLabels({**sampleLabels, 'le': bound})} {cumulative}")
+                lines.append(f"{prefix}_{name}_bucket{formatLabels({**sampleLabels, 'le': '+Inf'})} {hist.count}")
+                lines.append(f"{prefix}_{name}_sum{formatLabels(sampleLabels)} {hist.sum}")
+                lines.append(f"{prefix}_{name}_count{formatLabels(sampleLabels)} {hist.count}")
+
+        def byCommand(values : dict) -> list:
+            return [({"command": f"{command:02x}"}, value) for command, value in values.items()]
+
+        def byCommandAnd(label : str, values : dict) -> list:
+            return [({"command": f"{command:02x}", label: other}, value) for (command, other), value in values.items()]
+
+        counter("connects_total", "Successful connections.", [({}, self.connects)])
+        counter("connect_failures_total", "Failed connection attempts.", [({}, self.connectFailures)])
+        histogram("connect_seconds", "Time to establish a connection.", [({}, self.connectTime)])
+        counter("connection_resets_total", "Connections reset by the inverter.", [({}, self.connectionResets)])
+        counter("queries_total", "Successful queries.", byCommand(self.queries))
+        counter("query_failures_total", "Queries failed after all attempts.", byCommand(self.failedQueries))
+        histogram("query_attempts", "Attempts needed per query.", byCommand(self.attempts))
+        histogram("round_trip_seconds", "Time from sending a request to receiving the whole reply.", byCommand(self.roundTripTime))
+        histogram("parse_seconds", "Time spent parsing replies.", byCommand(self.parseTime))
+        counter("integrity_failures_total", "Replies failing the integrity check.", byCommandAnd("reason", self.integrityFailures))
+        counter("timeouts_total", "Timeouts when sending or receiving.", byCommandAnd("direction", self.timeouts))
+        histogram("throttle_wait_seconds", "Time requests waited for the rate limiter.", byCommand(self.throttleWait))
+        counter("throttled_total", "Requests delayed by the rate limiter.", byCommand(self.throttled))
+        histogram("scheduler_wait_seconds", "Time requests waited for their turn, by priority class.", [({"class": requestClass}, value) for requestClass, value in self.schedulerWait.items()])
+        counter("sent_bytes_total", "Bytes sent to the inverter.", byCommand(self.bytesSent))
+        counter("received_bytes_total", "Bytes received from the inverter.", byCommand(self.bytesReceived))
+
+        return "\n".join(lines) + "\n"
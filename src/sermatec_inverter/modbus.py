@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import math
+import struct
+from array import array
+from collections.abc import Callable
+
+from .exceptions import *
+from .fanout import SermatecOverflowPolicy
+from .poller import SermatecPoller, SermatecSnapshot
+from .protocol_parser import SermatecProtocolParser
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecRegisterMap:
+    """Assignment of decoded fields to Modbus registers.
+
+    Input registers carry polled fields: the fields of a reply code start at the address
+    `reply code * 256` and follow the protocol layout, e.g. the first field of 0x0b is at
+    2816. Values are the raw integers of the protocol (multiply by "scale" to get the
+    parsed value), signed values are two's complements, longer fields take more registers
+    (big-endian), strings are ASCII packed two characters per register.
+
+    Holding registers carry configurable parameters (SERMATEC_PARAMETERS, in their order,
+    from address 0), as the raw values sent to the inverter.
+    """
+
+    REGISTERS_PER_REPLY = 256
+
+    def __init__(self, parser : SermatecProtocolParser, version : int, commands : list[int]):
+        """
+        Args:
+            parser (SermatecProtocolParser): Parser providing the layouts.
+            version (int): PCU version of the inverter.
+            commands (list[int]): Polled commands (as in the poller's snapshots).
+
+        Raises:
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        self.version = version
+
+        # (address, register count, snapshot command key, field key, encode function, description)
+        self.inputs  : list[tuple[int, int, str, str, Callable, dict]] = []
+        # address -> parameter tag
+        self.holding : dict[int, str] = {}
+
+        for command in commands:
+            for responseCode in parser.getResponseCommands(command):
+                try:
+                    fields = parser.getReplyFields(responseCode, version)
+                except CommandNotFoundInProtocol:
+                    continue
+                self.__addReply(f"{command:02x}", responseCode, fields)
+
+        for address, tag in enumerate(parser.SERMATEC_PARAMETERS):
+            self.holding[address] = tag
+
+    def __addReply(self, snapshotKey : str, responseCode : int, fields : list[dict]) -> None:
+        base    = responseCode * self.REGISTERS_PER_REPLY
+        address = base
+        for field in fields:
+            if field["type"] in ("bit", "bitRange"):
+                count = 1
+            else:
+                count = (field["byteLength"] + 1) // 2
+
+            if address + count > base + self.REGISTERS_PER_REPLY:
+                _LOGGER.warning(f"Reply 0x{responseCode:02x} has too many fields for Modbus registers, mapping only the first ones.")
+                break
+
+            description = {
+                "table"     : "input",
+                "address"   : address,
+                "count"     : count,
+                "reply"     : f"{responseCode:02x}",
+                "key"       : field["key"],
+                "type"      : field["type"],
+                "scale"     : field["multiplier"],
+                "signed"    : field["type"] in ("int", "long"),
+            }
+            self.inputs.append((address, count, snapshotKey, field["key"], self.__compileEncoder(field, count), description))
+            address += count
+
+    @staticmethod
+    def __compileEncoder(field : dict, count : int) -> Callable[[object], list[int] | None]:
+        """Get a function converting a parsed value back to register values (None if not possible)."""
+        fieldType  = field["type"]
+        multiplier = field["multiplier"]
+        converter  = field["converter"]
+        bits       = 16 * count
+
+        def toRegisters(raw : int) -> list[int]:
+            raw &= (1 << bits) - 1
+            return [(raw >> (16 * (count - 1 - index))) & 0xffff for index in range(count)]
+
+        if fieldType == "string":
+            def encode(value) -> list[int] | None:
+                data = str(value).encode("ascii", "replace")[:2 * count].ljust(2 * count, b"\x00")
+                return list(struct.unpack(f">{count}H", data))
+        elif converter is not None:
+            def encode(value) -> list[int] | None:
+                raw = converter.fromFriendly(value)
+                return toRegisters(int(raw)) if isinstance(raw, (int, bool)) else None
+        elif fieldType in ("bit", "bitRange", "hex"):
+            def encode(value) -> list[int] | None:
+                return toRegisters(int(value)) if isinstance(value, (int, bool)) else None
+        else:
+            def encode(value) -> list[int] | None:
+                if not isinstance(value, (int, float)) or math.isnan(value):
+                    return None
+                return toRegisters(round(value / multiplier))
+
+        return encode
+
+    def describe(self, parser : SermatecProtocolParser) -> list[dict]:
+        """Get descriptions of all mapped registers (e.g. for configuring a Modbus client)."""
+        registers = [description for *_, description in self.inputs]
+        for address, tag in self.holding.items():
+            parameter = parser.getParameterInfo(tag)
+            registers.append({
+                "table"     : "holding",
+                "address"   : address,
+                "count"     : 1,
+                "tag"       : tag,
+                "name"      : parameter.name,
+                "key"       : parameter.statusTag,
+            })
+        return registers
+
+class SermatecModbusGateway:
+    """Modbus-TCP server answering from a register image of the poller's snapshots.
+
+    The image is updated once per published snapshot, reads never reach the inverter.
+    Writes to holding registers are validated and handed to Sermatec.setDebounced(), so
+    writes arriving together are sent as a single set command.
+
+    Supported functions: 3 (read holding registers), 4 (read input registers),
+    6 (write single register) and 16 (write multiple registers).
+    """
+
+    MAX_READ_COUNT  = 125
+    MAX_WRITE_COUNT = 123
+
+    # Function codes.
+    READ_HOLDING            = 0x03
+    READ_INPUT              = 0x04
+    WRITE_SINGLE            = 0x06
+    WRITE_MULTIPLE          = 0x10
+
+    # Exception codes.
+    ILLEGAL_FUNCTION        = 0x01
+    ILLEGAL_DATA_ADDRESS    = 0x02
+    ILLEGAL_DATA_VALUE      = 0x03
+    SERVER_DEVICE_FAILURE   = 0x04
+
+    MBAP_HEADER = struct.Struct(">HHHB")
+
+    def __init__(self, poller : SermatecPoller, host : str = "127.0.0.1", port : int = 502):
+        """
+        Args:
+            poller (SermatecPoller): Source of the snapshots, its inverter receives the writes.
+            host (str): Address to listen on.
+            port (int): Port to listen on (0 = any free port).
+        """
+        self.poller         = poller
+        self.host           = host
+        self.port           = port
+        self.registerMap    : SermatecRegisterMap | None = None
+
+        # Whole address spaces, 128 kB each.
+        self.inputRegisters   = array("H", bytes(2 * 65536))
+        self.holdingRegisters = array("H", bytes(2 * 65536))
+
+        self.__server       : asyncio.AbstractServer | None = None
+        self.__updater      : asyncio.Task | None = None
+        self.__writes       : set[asyncio.Future] = set()
+
+    # ====================================================================
+    # Register image
+    # ====================================================================
+    def update(self, snapshot : SermatecSnapshot) -> None:
+        """Write values of a snapshot to the register image."""
+        if self.registerMap is None or self.registerMap.version != snapshot.pcuVersion:
+            self.registerMap = SermatecRegisterMap(self.poller.smc.parser, snapshot.pcuVersion, self.poller.commands)
+            self.inputRegisters   = array("H", bytes(2 * 65536))
+            self.holdingRegisters = array("H", bytes(2 * 65536))
+            _LOGGER.info(f"Mapped {len(self.registerMap.inputs)} fields to input registers.")
+
+        for address, count, snapshotKey, key, encode, _ in self.registerMap.inputs:
+            field = snapshot.data.get(snapshotKey, {}).get(key)
+            if field is None:
+                continue
+            try:
+                registers = encode(field["value"])
+            except (ValueError, TypeError, OverflowError):
+                registers = None
+            if registers is not None:
+                self.inputRegisters[address:address + count] = array("H", registers)
+
+        merged = {}
+        for parsedData in snapshot.data.values():
+            merged.update(parsedData)
+
+        parameters = self.poller.smc.parser.SERMATEC_PARAMETERS
+        for address, tag in self.registerMap.holding.items():
+            field = merged.get(parameters[tag].statusTag)
+            if field is None:
+                continue
+            raw = parameters[tag].converter.fromFriendly(field["value"])
+            if isinstance(raw, (int, bool)):
+                self.holdingRegisters[address] = int(raw) & 0xffff
+
+    async def __consumeSnapshots(self) -> None:
+        # Only the newest snapshot matters for the image.
+        subscription = self.poller.subscribe(policy = SermatecOverflowPolicy.LATEST, name = "modbus")
+        try:
+            async for snapshot in subscription:
+                self.update(snapshot)
+        finally:
+            subscription.close()
+
+    # ====================================================================
+    # Server
+    # ====================================================================
+    async def start(self) -> None:
+        self.__updater = asyncio.ensure_future(self.__consumeSnapshots())
+        self.__server = await asyncio.start_server(self.__handleClient, self.host, self.port)
+        # Resolve the port when listening on any free one.
+        self.port = self.__server.sockets[0].getsockname()[1]
+        _LOGGER.info(f"Serving Modbus-TCP at {self.host}:{self.port}")
+
+    async def serveForever(self) -> None:
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def stop(self) -> None:
+        if self.__updater is not None:
+            self.__updater.cancel()
+            self.__updater = None
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    async def __handleClient(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readexactly(self.MBAP_HEADER.size)
+                transactionId, protocolId, length, unitId = self.MBAP_HEADER.unpack(header)
+                if protocolId != 0 or not 2 <= length <= 254:
+                    break
+                pdu = await reader.readexactly(length - 1)
+
+                response = self.handlePdu(pdu)
+                writer.write(self.MBAP_HEADER.pack(transactionId, 0, len(response) + 1, unitId) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    # ====================================================================
+    # Functions
+    # ====================================================================
+    def handlePdu(self, pdu : bytes) -> bytes:
+        """Process a Modbus request PDU (function code and data) and get the response PDU."""
+        function = pdu[0]
+        try:
+            if function == self.READ_HOLDING:
+                return self.__read(function, self.holdingRegisters, pdu)
+            elif function == self.READ_INPUT:
+                return self.__read(function, self.inputRegisters, pdu)
+            elif function == self.WRITE_SINGLE:
+                address, value = struct.unpack(">HH", pdu[1:5])
+                self.__write(address, [value])
+                return pdu[:5]
+            elif function == self.WRITE_MULTIPLE:
+                address, count, byteCount = struct.unpack(">HHB", pdu[1:6])
+                if not 1 <= count <= self.MAX_WRITE_COUNT or byteCount != 2 * count or len(pdu) < 6 + byteCount:
+                    return self.__exception(function, self.ILLEGAL_DATA_VALUE)
+                self.__write(address, list(struct.unpack(f">{count}H", pdu[6:6 + byteCount])))
+                return pdu[:5]
+            else:
+                return self.__exception(function, self.ILLEGAL_FUNCTION)
+        except struct.error:
+            return self.__exception(function, self.ILLEGAL_DATA_VALUE)
+        except ParameterNotFound:
+            return self.__exception(function, self.ILLEGAL_DATA_ADDRESS)
+        except ValueError:
+            return self.__exception(function, self.ILLEGAL_DATA_VALUE)
+        except (NotConnected, CommunicationError):
+            return self.__exception(function, self.SERVER_DEVICE_FAILURE)
+
+    @staticmethod
+    def __exception(function : int, code : int) -> bytes:
+        return bytes([function | 0x80, code])
+
+    def __read(self, function : int, registers : array, pdu : bytes) -> bytes:
+        address, count = struct.unpack(">HH", pdu[1:5])
+        if not 1 <= count <= self.MAX_READ_COUNT:
+            return self.__exception(function, self.ILLEGAL_DATA_VALUE)
+        if address + count > len(registers):
+            return self.__exception(function, self.ILLEGAL_DATA_ADDRESS)
+        if self.registerMap is None:
+            # Nothing polled yet.
+            return self.__exception(function, self.SERVER_DEVICE_FAILURE)
+        return struct.pack(f">BB{count}H", function, 2 * count, *registers[address:address + count])
+
+    def __write(self, address : int, values : list[int]) -> None:
+        """Validate writes to holding registers and queue them.
+
+        Raises:
+            ParameterNotFound: A register is not mapped to a parameter.
+            ValueError: A value is not valid for its parameter.
+            NotConnected: Nothing polled yet.
+        """
+        if self.registerMap is None:
+            raise NotConnected()
+
+        parser = self.poller.smc.parser
+        writes = []
+        for offset, raw in enumerate(values):
+            tag = self.registerMap.holding.get(address + offset)
+            if tag is None:
+                raise ParameterNotFound()
+            parameter = parser.getParameterInfo(tag)
+            if not parameter.validator.validate(raw):
+                raise ValueError()
+            writes.append((address + offset, tag, parameter.converter.toFriendly(raw), raw))
+
+        # All values are valid, queue them together so they coalesce into one set command.
+        for registerAddress, tag, value, raw in writes:
+            future = self.poller.smc.setDebounced(tag, value)
+            future.add_done_callback(self.__writeDone)
+            self.__writes.add(future)
+            self.holdingRegisters[registerAddress] = raw
+
+    def __writeDone(self, future : asyncio.Future) -> None:
+        self.__writes.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            _LOGGER.error(f"Writing a Modbus register to the inverter failed ({type(future.exception()).__name__}).")
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from .exceptions import *
+from .adaptive import SermatecAdaptiveSchedule
+from .fanout import SermatecFanOut, SermatecOverflowPolicy, SermatecSubscription
+from .scheduler import SermatecRequestClass
+
+if TYPE_CHECKING:
+    from . import Sermatec
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecSnapshot:
+    """Data of all polled commands, serialized once per language for all readers."""
+
+    __slots__ = ("sequence", "timestamp", "pcuVersion", "data", "parts", "skew", "json", "etag", "__render", "__jsonByLanguage")
+
+    def __init__(
+        self,
+        sequence : int,
+        timestamp : float,
+        pcuVersion : int,
+        data : dict,
+        etagPrefix : str,
+        parts : dict[str, dict] = {},
+        render : Callable[[dict, str | None], dict] | None = None
+    ):
+        """
+        Args:
+            sequence (int): Number of the snapshot.
+            timestamp (float): Time of the change as seconds since the epoch.
+            pcuVersion (int): PCU version of the inverter.
+            data (dict): Command (hex) -> decoded data.
+            etagPrefix (str): Prefix of the ETag, unique for the poller.
+            parts (dict[str, dict]): Command (hex) -> sequence number and time of receiving the reply.
+            render (Callable[[dict, str | None], dict] | None): Names decoded data in a language
+                (None = the inverter's one), e.g. Sermatec.render; the data are serialized as they are if None.
+        """
+        self.sequence   = sequence
+        self.timestamp  = timestamp
+        self.pcuVersion = pcuVersion
+        # command (hex) -> decoded data
+        self.data       = data
+        # command (hex) -> sequence number and time of receiving the reply
+        self.parts      = parts
+        # Time between receiving the oldest and the newest reply [s].
+        self.skew       = max(part["receivedAt"] for part in parts.values()) - min(part["receivedAt"] for part in parts.values()) if parts else 0.0
+        self.etag       = f"\"{etagPrefix}-{sequence}\""
+        self.__render   = render
+        # language -> serialized snapshot
+        self.__jsonByLanguage : dict[str | None, bytes] = {}
+        # In the inverter's language.
+        self.json       = self.toJson()
+
+    def toJson(self, language : str | None = None) -> bytes:
+        """Serialize the snapshot with names in a language (the inverter's one if None), once per language.
+
+        Raises:
+            FileNotFoundError: The language is not available.
+        """
+        serialized = self.__jsonByLanguage.get(language)
+        if serialized is None:
+            data = self.data
+            if self.__render is not None:
+                data = {command: self.__render(fields, language) for command, fields in data.items()}
+            serialized = self.__jsonByLanguage[language] = json.dumps({
+                "sequence"   : self.sequence,
+                "timestamp"  : self.timestamp,
+                "pcuVersion" : self.pcuVersion,
+                "skew"       : self.skew,
+                "parts"      : self.parts,
+                "data"       : data,
+            }, default = str).encode()
+        return serialized
+
+    def etagFor(self, language : str | None = None) -> str:
+        """Get the ETag of the snapshot serialized in a language."""
+        return self.etag if language is None else f"{self.etag[:-1]}-{language}\""
+
+class SermatecPoller:
+    """Polls an inverter over one managed connection and shares the latest snapshot.
+
+    The connection is (re)established when needed, with an exponential backoff.
+    A new snapshot (with a new sequence number) is published only when the data changed.
+
+    All commands are polled together every `interval` seconds, unless an adaptive
+    schedule is given: then each command is polled on its own, as often as its data
+    change (see SermatecAdaptiveSchedule), and every poll publishes a snapshot.
+    """
+
+    DEFAULT_COMMANDS = [0x0a, 0x0b, 0x0c, 0x0d, 0x95]
+    # Longest wait for the polling task to close the connection when stopping [s].
+    STOP_TIMEOUT = 10
+
+    def __init__(
+        self,
+        smc : "Sermatec",
+        commands : list[int] | None = None,
+        interval : float = 10,
+        reconnectDelay : float = 5,
+        maxReconnectDelay : float = 300,
+        subscriberQueueSize : int = 16,
+        schedule : SermatecAdaptiveSchedule | None = None
+    ):
+        """
+        Args:
+            smc (Sermatec): Inverter to poll (not connected yet).
+            commands (list[int] | None): Commands to poll, DEFAULT_COMMANDS if None.
+            interval (float): Time between starts of polling cycles [s].
+            reconnectDelay (float): Delay before the first reconnection attempt [s].
+            maxReconnectDelay (float): Maximal delay between reconnection attempts [s].
+            subscriberQueueSize (int): Default number of snapshots that can wait for a subscriber.
+            schedule (SermatecAdaptiveSchedule | None): Adaptive per-command intervals (then `commands`
+                and `interval` are not used), fixed interval if None.
+        """
+        self.smc                    = smc
+        self.schedule               = schedule
+        if schedule is not None:
+            commands = schedule.commands
+        self.commands               = list(commands) if commands is not None else list(self.DEFAULT_COMMANDS)
+        self.interval               = interval
+        self.reconnectDelay         = reconnectDelay
+        self.maxReconnectDelay      = maxReconnectDelay
+        self.subscriberQueueSize    = subscriberQueueSize
+
+        self.snapshot       : SermatecSnapshot | None = None
+        self.lastPollTime   : float | None = None
+        self.failedPolls    = 0
+
+        self.__etagPrefix   = os.urandom(4).hex()
+        self.__sequence     = 0
+        self.fanOut         = SermatecFanOut()
+        self.__unsupported  : set[int] = set()
+        self.__task         : asyncio.Task | None = None
+        # Latest data of each command (hex) when polling by the adaptive schedule.
+        self.__data         : dict[str, dict] = {}
+
+    # ====================================================================
+    # Subscribers
+    # ====================================================================
+    def subscribe(self, maxSize : int | None = None, policy : SermatecOverflowPolicy = SermatecOverflowPolicy.DROP_OLDEST, name : str | None = None) -> SermatecSubscription:
+        """Subscribe to new snapshots (starting with the current one).
+
+        The poller never waits for subscribers: depending on the policy, a slow subscriber
+        gets only the latest snapshot, loses the oldest ones or (BLOCK) is waited for only
+        in the idle time before the next poll.
+
+        Args:
+            maxSize (int | None): How many snapshots can wait for the subscriber, subscriberQueueSize if None.
+            policy (SermatecOverflowPolicy): What to do when the subscriber's queue is full.
+            name (str | None): Name used in subscriberStats().
+
+        Returns:
+            SermatecSubscription: Async iterator of SermatecSnapshot, close() it when done.
+        """
+        subscription = self.fanOut.subscribe(maxSize or self.subscriberQueueSize, policy, name)
+        if self.snapshot is not None:
+            subscription.offer(self.snapshot, time.monotonic())
+        return subscription
+
+    def unsubscribe(self, subscription : SermatecSubscription) -> None:
+        subscription.close()
+
+    @property
+    def subscriberCount(self) -> int:
+        return len(self.fanOut)
+
+    def subscriberStats(self) -> list[dict]:
+        """Get queue lengths, delivered and dropped counts and lags of all subscribers."""
+        return self.fanOut.stats()
+
+    def __publish(self, data : dict) -> None:
+        if self.snapshot is not None and self.snapshot.data == data and self.snapshot.pcuVersion == self.smc.pcuVersion:
+            return
+
+        # Receiving times of the published data, the snapshot describes the moments of its parts.
+        parts = {}
+        latest = self.smc.getLatestSnapshot([int(command, 16) for command in data])
+        if latest is not None:
+            parts = {f"{part.command:02x}": {"sequence": part.sequence, "receivedAt": part.receivedAt} for part in latest.parts.values()}
+
+        self.__sequence += 1
+        self.snapshot = SermatecSnapshot(self.__sequence, time.time(), self.smc.pcuVersion, data, self.__etagPrefix, parts, self.smc.render)
+        self.fanOut.publish(self.snapshot)
+
+    # ====================================================================
+    # Polling
+    # ====================================================================
+    async def __connect(self) -> None:
+        delay = self.reconnectDelay
+        while not await self.smc.connect():
+            _LOGGER.warning(f"Can't connect to the inverter, retrying in {delay:.0f} s.")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.maxReconnectDelay)
+        self.__unsupported.clear()
+        if self.schedule is not None:
+            self.schedule.reset()
+        _LOGGER.info(f"Connected to the inverter, PCU version {self.smc.pcuVersion}.")
+
+    async def __disconnect(self) -> None:
+        try:
+            await self.smc.disconnect()
+        except (OSError, CommunicationError):
+            # The connection is already broken (also when flushing the queued writes).
+            self.smc.connected = False
+
+    async def __query(self, command : int) -> dict | None:
+        """Query a command, None if the inverter doesn't support it."""
+        if command in self.__unsupported:
+            return None
+        try:
+            # Decoded once, rendered in the readers' languages.
+            return await self.smc.getCustomDecoded(command, SermatecRequestClass.BACKGROUND)
+        except CommandNotFoundInProtocol:
+            _LOGGER.info(f"Command 0x{command:02x} is not supported by the inverter's version, not polling it.")
+        except (ProtocolFileMalformed, ParsingNotImplemented):
+            # Reconnecting doesn't help, the other commands are still polled.
+            _LOGGER.error(f"Replies to 0x{command:02x} can't be parsed, not polling it.")
+
+        self.__unsupported.add(command)
+        if self.schedule is not None:
+            self.schedule.remove(command)
+        return None
+
+    async def pollOnce(self) -> None:
+        """Query all commands and publish the data if they changed.
+
+        Raises:
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If there is no connection to the inverter.
+        """
+        data = {}
+        for command in self.commands:
+            parsedData = await self.__query(command)
+            if parsedData is not None:
+                data[f"{command:02x}"] = parsedData
+
+        self.lastPollTime = time.time()
+        self.__publish(data)
+
+    async def pollCommand(self, command : int) -> None:
+        """Query a single command and publish the data (with the latest data of the other commands) if they changed.
+
+        Raises:
+            ConnectionResetError: If the inverter disconnects.
+            CommunicationError: If the inverter failed to send correct data.
+            NotConnected: If there is no connection to the inverter.
+        """
+        parsedData = await self.__query(command)
+        if parsedData is None:
+            return
+
+        if self.schedule is not None:
+            self.schedule.observe(command, parsedData, asyncio.get_running_loop().time())
+        self.__data[f"{command:02x}"] = parsedData
+        self.lastPollTime = time.time()
+        self.__publish(dict(self.__data))
+
+    async def run(self) -> None:
+        """Poll until cancelled."""
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        try:
+            # Stops also when a callee swallowed the cancellation.
+            while not task.cancelling():
+                if not self.smc.connected:
+                    await self.__connect()
+
+                if self.schedule is not None:
+                    if not self.schedule.commands:
+                        _LOGGER.error("None of the scheduled commands is supported by the inverter, stopping polling.")
+                        return
+                    command, nextPoll = self.schedule.next(loop.time())
+                    await self.fanOut.drain(nextPoll - loop.time())
+                    await asyncio.sleep(max(0, nextPoll - loop.time()))
+
+                started = loop.time()
+                try:
+                    if self.schedule is not None:
+                        await self.pollCommand(command)
+                    else:
+                        await self.pollOnce()
+                except (ConnectionResetError, CommunicationError, NotConnected, OSError) as e:
+                    if self.schedule is not None:
+                        self.schedule.failed(loop.time())
+                    self.failedPolls += 1
+                    _LOGGER.warning(f"Polling failed ({type(e).__name__}), reconnecting in {self.reconnectDelay:.0f} s.")
+                    await self.__disconnect()
+                    await asyncio.sleep(self.reconnectDelay)
+                    continue
+
+                if self.schedule is not None:
+                    continue
+
+                # Subscribers which must not lose snapshots may catch up until the next poll.
+                await self.fanOut.drain(started + self.interval - loop.time())
+                await asyncio.sleep(max(0, started + self.interval - loop.time()))
+        finally:
+            await self.__disconnect()
+
+    def start(self) -> asyncio.Task:
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.ensure_future(self.run())
+            self.__task.add_done_callback(self.__taskDone)
+        return self.__task
+
+    @staticmethod
+    def __taskDone(task : asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.error("Polling stopped by an unexpected error.", exc_info = task.exception())
+
+    async def stop(self) -> None:
+        """Cancel polling and wait for closing the connection (at most STOP_TIMEOUT).
+
+        Raises:
+            asyncio.CancelledError: If stop() itself is cancelled (the polling is cancelled anyway).
+        """
+        task, self.__task = self.__task, None
+        try:
+            if task is not None:
+                task.cancel()
+                # Unlike awaiting the task, raises CancelledError only when the caller is cancelled.
+                done, _ = await asyncio.wait({task}, timeout = self.STOP_TIMEOUT)
+                if not done:
+                    _LOGGER.warning(f"Polling didn't stop in {self.STOP_TIMEOUT} s, leaving it to finish in the background.")
+        finally:
+            self.fanOut.close()
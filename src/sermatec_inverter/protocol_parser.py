@@ -1,13 +1,19 @@
 import logging
 import json
 import re
-from typing import Any, Callable
+import time
+import struct
+import operator
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
 from .exceptions import *
 from pathlib import Path
 from enum import Enum, auto
 
 from .converters import *
 from .validators import *
+from .tracing import SermatecObserver
+from .translations import SermatecTranslations
 
 # Local module logger.
 logger = logging.getLogger(__name__)
@@ -30,6 +36,9 @@ class SermatecProtocolParser:
             # Set commands have no response.
             0x64: [],
             0x66: [],
+            0x67: [],
+            0x68: [],
+            0x69: [],
             0x6A: []
         }
 
@@ -53,6 +62,12 @@ class SermatecProtocolParser:
 
     ALL_PARAMETER_QUERY_COMMANDS = [0x0c, 0x95]
 
+    # Field types with a value in parseReply output.
+    PARSED_FIELD_TYPES = ("int", "uInt", "string", "bit", "bitRange", "hex", "long")
+
+    # Commands with a payload which can be built by buildPayload().
+    ALL_SET_COMMANDS = [0x64, 0x66, 0x67, 0x68, 0x69, 0x6a]
+
     __CONVERTER_BATTERY_STATUS = MapConverter({
         0x0011 : "charging",
         0x0022 : "discharging",
@@ -177,7 +192,10 @@ class SermatecProtocolParser:
         "Battery communication connection status": __CONVERTER_INVERTED_BINARY,
         "AC side operation mode": __CONVERTER_AC_OP_STATUS,
         "AC side running status": __CONVERTER_AC_OP_MODE,
-        "anti-backflow function": __CONVERTER_EE_BINARY
+        "anti-backflow function": __CONVERTER_EE_BINARY,
+        "backup output function": __CONVERTER_EE_BINARY,
+        "shadow scan": __CONVERTER_EE_BINARY,
+        "Battery power manual limiter": __CONVERTER_EE_BINARY
     }
 
 
@@ -250,6 +268,122 @@ class SermatecProtocolParser:
             shouldBeOff  = False,
             min          = 10,
             max          = 100
+        ),
+        "powerFactor": SermatecNumberParamter(
+            command      = 0x67,
+            name         = "Power factor",
+            statusTag    = "power_factor_setting",
+            byteLength   = 2,
+            converter    = ScaleConverter(0.001),
+            validator    = IntRangeValidator(800, 1000),
+            friendlyType = float,
+            shouldBeOff  = False,
+            min          = 0.8,
+            max          = 1
+        ),
+        "dcBatteryType": SermatecSelectParameter(
+            command      = 0x69,
+            name         = "Battery type",
+            statusTag    = "dc_side_battery_type",
+            byteLength   = 2,
+            converter    = __CONVERTER_BATTERY_TYPE,
+            validator    = EnumValidator([1, 2, 3]),
+            friendlyType = str,
+            shouldBeOff  = True
+        ),
+        "batteryProtocol": SermatecSelectParameter(
+            command      = 0x69,
+            name         = "Battery communication protocol",
+            statusTag    = "battery_communication_protocol_selection",
+            byteLength   = 2,
+            converter    = __CONVERTER_BATTERY_MANUFACTURER,
+            validator    = EnumValidator([*range(1, 8), *range(9, 29)]),
+            friendlyType = str,
+            shouldBeOff  = True
+        ),
+        "meterProtocol": SermatecSelectParameter(
+            command      = 0x69,
+            name         = "Meter communication protocol",
+            statusTag    = "meter_communication_protocol_selection",
+            byteLength   = 2,
+            converter    = __CONVERTER_METER_PROTOCOL,
+            validator    = EnumValidator([1, 2, 3, 4, 5]),
+            friendlyType = str,
+            shouldBeOff  = True
+        ),
+        "meterMonitor" : SermatecSwitchParameter(
+            command      = 0x6a,
+            name         = "Meter detection",
+            statusTag    = "meter_detection_function",
+            byteLength   = 2,
+            converter    = __CONVERTER_EE_BINARY,
+            validator    = EnumValidator([0xee00, 0x00ee]),
+            friendlyType = int,
+            shouldBeOff  = True
+        ),
+        "threePhase" : SermatecSwitchParameter(
+            command      = 0x6a,
+            name         = "Three-phase unbalanced output",
+            statusTag    = "three_phase_unbalanced_output",
+            byteLength   = 2,
+            converter    = __CONVERTER_EE_BINARY,
+            validator    = EnumValidator([0xee00, 0x00ee]),
+            friendlyType = int,
+            shouldBeOff  = True
+        ),
+        "offGridSoc": SermatecNumberParamter(
+            command      = 0x6a,
+            name         = "Battery SOC lower limit (off-grid)",
+            statusTag    = "off_grid_soc_lower_limit_setting",
+            byteLength   = 2,
+            converter    = DummyConverter(),
+            validator    = IntRangeValidator(10, 100),
+            friendlyType = int,
+            shouldBeOff  = False,
+            min          = 10,
+            max          = 100
+        ),
+        "socDiff": SermatecNumberParamter(
+            command      = 0x6a,
+            name         = "Battery SOC hysteresis (micro-grid)",
+            statusTag    = "in_the_micro_grid_mode_the_battery_soc_hysteresis",
+            byteLength   = 2,
+            converter    = DummyConverter(),
+            validator    = IntRangeValidator(0, 100),
+            friendlyType = int,
+            shouldBeOff  = False,
+            min          = 0,
+            max          = 100
+        ),
+        "backUpOutEnable" : SermatecSwitchParameter(
+            command      = 0x6a,
+            name         = "Backup output",
+            statusTag    = "backup_output_function",
+            byteLength   = 2,
+            converter    = __CONVERTER_EE_BINARY,
+            validator    = EnumValidator([0xee00, 0x00ee]),
+            friendlyType = int,
+            shouldBeOff  = False
+        ),
+        "shadowScan" : SermatecSwitchParameter(
+            command      = 0x6a,
+            name         = "Shadow scan",
+            statusTag    = "shadow_scan",
+            byteLength   = 2,
+            converter    = __CONVERTER_EE_BINARY,
+            validator    = EnumValidator([0xee00, 0x00ee]),
+            friendlyType = int,
+            shouldBeOff  = False
+        ),
+        "batPowerAdjustable" : SermatecSwitchParameter(
+            command      = 0x6a,
+            name         = "Battery power manual limiter",
+            statusTag    = "battery_power_manual_limiter",
+            byteLength   = 2,
+            converter    = __CONVERTER_EE_BINARY,
+            validator    = EnumValidator([0xee00, 0x00ee]),
+            friendlyType = int,
+            shouldBeOff  = False
         )
     }
 
@@ -267,6 +401,23 @@ class SermatecProtocolParser:
         else:
             return self.SERMATEC_PARAMETERS[parameterTag]
 
+    def encodeParameter(self, parameterTag : str, value : bool | int | str) -> bytes:
+        """Convert a friendly parameter value to raw bytes used in a set command payload.
+
+        Raises:
+            ParameterNotFound: Parameter was not found.
+            ValueError: If supplied value is invalid.
+        """
+        parameterInfo = self.getParameterInfo(parameterTag)
+
+        convertedValue = parameterInfo.converter.fromFriendly(value)
+        logger.debug("Setting up tag '%s' with converted value '%s'", parameterTag, convertedValue)
+
+        if not parameterInfo.validator.validate(convertedValue):
+            raise ValueError
+
+        return int.to_bytes(convertedValue, byteorder="big", signed=False, length = parameterInfo.byteLength)
+
     def __init__(self, protocolPath : str, languageFilePath : Path):
         with open(protocolPath, "r") as protocolFile:
             protocolData = json.load(protocolFile)
@@ -275,13 +426,36 @@ class SermatecProtocolParser:
             except KeyError:
                 logger.error("Protocol file malformed, 'osim' key not found.")
                 raise ProtocolFileMalformed()
-        self.translations = {}
-        with languageFilePath.open("r") as langFile:
-            for line in langFile.readlines():
-                splitLine = line.replace("\"", "").replace("\n", "").split(";")
-                original_name = splitLine[0]
-                translated_name = splitLine[1]
-                self.translations[original_name] = translated_name
+        # Shared with other parsers of the same language, read on the first use.
+        self.translations : SermatecTranslations = SermatecTranslations.forFile(languageFilePath)
+
+        self.__observers : list[SermatecObserver] = []
+        # (command, version) -> (pack function, getter of the packed fields' values)
+        self.__payloadPlans : dict[tuple[int, int], tuple[Callable, Callable, tuple, tuple]] = {}
+        self.__latestVersion : int = max((ver["version"] for ver in self.osim["versions"]), default = 0)
+        # (command, version) -> compiled reply layout
+        self.__replyLayouts : dict[tuple[int, int], list[tuple]] = {}
+        # command -> (version, reply data, decoded values in layout order)
+        self.__previousReplies : dict[int, tuple[int, bytes, list]] = {}
+        # version -> response code -> fields without values
+        self.__catalogs : dict[int, dict[int, dict]] = {}
+
+    def addObserver(self, observer : SermatecObserver) -> None:
+        """Register an observer notified about parsing (see SermatecObserver)."""
+        if observer not in self.__observers:
+            self.__observers.append(observer)
+
+    def removeObserver(self, observer : SermatecObserver) -> None:
+        if observer in self.__observers:
+            self.__observers.remove(observer)
+
+    def __notifyParse(self, command : int, version : int, parseStart : float) -> None:
+        parseEnd = time.monotonic()
+        for observer in self.__observers:
+            try:
+                observer.onParse(command, version, parseStart, parseEnd)
+            except Exception:
+                logger.exception(f"Observer {observer} failed handling 'onParse'.")
             
     def getCommandCodeFromName(self, commandName : str) -> int:
         if commandName in self.COMMAND_SHORT_NAMES:
@@ -307,6 +481,36 @@ class SermatecProtocolParser:
     def getResponseCodes(self, version : int) -> list:
         return self.ALL_RESPONSE_CODES
 
+    def getVersions(self) -> list[int]:
+        """Get all PCU versions defined in the protocol."""
+        return sorted(ver["version"] for ver in self.osim["versions"])
+
+    def getCatalog(self, version : int) -> dict[int, dict]:
+        """Describe the fields of all replies known in a version, without communicating with the inverter.
+
+        The catalog is compiled on the first use and kept for the parser's lifetime.
+
+        Args:
+            version (int): A PCU version (used to look up a correct format).
+
+        Returns:
+            dict[int, dict]: Response code -> fields as from decodeReply (dry run), don't modify them.
+                Replies not defined in the version are left out.
+
+        Raises:
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        catalog = self.__catalogs.get(version)
+        if catalog is None:
+            catalog = {}
+            for responseCode in self.getResponseCodes(version):
+                try:
+                    catalog[responseCode] = self.decodeReply(responseCode, version, bytes(), dryrun = True)
+                except CommandNotFoundInProtocol:
+                    logger.debug(f"Reply 0x{responseCode:02x} is not defined in version {version}, not listing it.")
+            self.__catalogs[version] = catalog
+        return catalog
+
     def __getCommandByVersion(self, command : int, version : int) -> dict:
         """Get a newest version of a reply to a command specified.
 
@@ -331,7 +535,199 @@ class SermatecProtocolParser:
             raise CommandNotFoundInProtocol(f"Specified command 0x'{command:02x}' not found.")
 
         return cmd
-    
+
+    @contextmanager
+    def __layoutErrors(self, command : int) -> Iterator[None]:
+        """Report a missing or invalid attribute of a command layout as ProtocolFileMalformed."""
+        try:
+            yield
+        except (KeyError, ValueError):
+            logger.error(f"Protocol file malformed, can't process command 0x'{command:02x}'")
+            raise ProtocolFileMalformed()
+
+    def __walkLayout(self, command : int, version : int) -> Iterator[tuple[dict, int, int]]:
+        """Walk fields of a command layout, placing them the same way parseParameterReply and decodeReply do.
+
+        Fields marked "same" share the bytes of the previous field. Must be iterated
+        inside __layoutErrors().
+
+        Yields:
+            tuple[dict, int, int]: (field, offset from the start of the data, byte length including repeats).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+        """
+        cmd : dict = self.__getCommandByVersion(command, version)
+
+        position : int     = 0
+        prevPosition : int = 0
+
+        for field in cmd["fields"]:
+            if field.get("same", False):
+                position = prevPosition
+
+            fieldLength = int(field["byteLen"]) * int(field.get("repeat", 1))
+            yield field, position, fieldLength
+
+            prevPosition = position
+            position += fieldLength
+
+    def getFieldSpans(self, command : int, version : int) -> dict[str, tuple[int, int]]:
+        """Get positions of tagged fields in a command's data, the same way parseParameterReply walks them.
+
+        Args:
+            command (int): A single-byte code of the command.
+            version (int): A PCU version (used to look up a correct format).
+
+        Returns:
+            dict[str, tuple[int, int]]: Tag -> (offset from the start of the data, byte length).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        spans : dict = {}
+
+        with self.__layoutErrors(command):
+            for field, offset, length in self.__walkLayout(command, version):
+                if field.get("tag") and "repeat" not in field and field["type"] != "preserve":
+                    spans[field["tag"]] = (offset, length)
+
+        return spans
+
+    def getReplySpans(self, command : int, version : int) -> dict[str, tuple[int, int]]:
+        """Get positions of the fields returned by parseReply in a command's data.
+
+        Args:
+            command (int): A single-byte code of the command.
+            version (int): A PCU version (used to look up a correct format).
+
+        Returns:
+            dict[str, tuple[int, int]]: Key used by parseReply -> (offset from the start of the data, byte length).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        spans : dict = {}
+
+        with self.__layoutErrors(command):
+            for field, offset, length in self.__walkLayout(command, version):
+                if "repeat" not in field and field["type"] in self.PARSED_FIELD_TYPES:
+                    spans[re.sub(r"[^A-Za-z0-9]", "_", field["name"]).lower()] = (offset, length)
+
+        return spans
+
+    def getReplyFields(self, command : int, version : int) -> list[dict]:
+        """Describe raw encoding of the fields returned by parseReply, in the layout order.
+
+        Args:
+            command (int): A single-byte code of the command.
+            version (int): A PCU version (used to look up a correct format).
+
+        Returns:
+            list[dict]: Fields with the "key" (as in parseReply), "offset" (from the start of the data),
+                "byteLength", "type", "multiplier", "fromBit", "endBit" (bit fields only, else None)
+                and "converter" (name-based parser or None).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        fields : list[dict] = []
+
+        with self.__layoutErrors(command):
+            for field, offset, length in self.__walkLayout(command, version):
+                fieldType = field["type"]
+                if "repeat" in field or fieldType not in self.PARSED_FIELD_TYPES:
+                    continue
+
+                fromBit = endBit = None
+                if fieldType == "bit":
+                    fromBit = int(field["bitPosition"])
+                    endBit  = fromBit + 1
+                elif fieldType == "bitRange":
+                    fromBit = int(field["fromBit"])
+                    endBit  = int(field["endBit"])
+
+                fields.append({
+                    "key"        : re.sub(r"[^A-Za-z0-9]", "_", field["name"]).lower(),
+                    "offset"     : offset,
+                    "byteLength" : length,
+                    "type"       : fieldType,
+                    "multiplier" : float(field["unitValue"]) if "unitValue" in field else 1,
+                    "fromBit"    : fromBit,
+                    "endBit"     : endBit,
+                    "converter"  : self.NAME_BASED_FIELD_PARSERS.get(field["name"]),
+                })
+
+        return fields
+
+    def getStatusWords(self, command : int, version : int) -> list[tuple[int, int, list[dict]]]:
+        """Get fields carrying flags grouped by the status word they are stored in.
+
+        Flags are "bit" and "bitRange" fields and whole-word fields with the "binary" unit.
+
+        Args:
+            command (int): A single-byte code of the command.
+            version (int): A PCU version (used to look up a correct format).
+
+        Returns:
+            list[tuple[int, int, list[dict]]]: (offset of the word from the start of the data, byte length, fields).
+                Each field has a "key" (as in parseReply), translated "name", "type", "fromBit", "endBit",
+                "deviceClass" (or None) and "converter" (name-based parser or None).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        words : dict[tuple[int, int], list[dict]] = {}
+
+        with self.__layoutErrors(command):
+            for field, offset, length in self.__walkLayout(command, version):
+                fieldType = field["type"]
+                if "repeat" in field:
+                    continue
+
+                if fieldType == "bit":
+                    fromBit = int(field["bitPosition"])
+                    endBit  = fromBit + 1
+                elif fieldType == "bitRange":
+                    fromBit = int(field["fromBit"])
+                    endBit  = int(field["endBit"])
+                elif fieldType in ("int", "uInt", "hex") and field.get("unitType") == "binary":
+                    fromBit = 0
+                    endBit  = 8 * length
+                else:
+                    continue
+
+                words.setdefault((offset, length), []).append({
+                    "key"         : re.sub(r"[^A-Za-z0-9]", "_", field["name"]).lower(),
+                    "name"        : self.translations.get(field["name"], field["name"]),
+                    "type"        : fieldType if fieldType in ("bit", "bitRange") else "binary",
+                    "fromBit"     : fromBit,
+                    "endBit"      : endBit,
+                    "deviceClass" : field.get("deviceClass"),
+                    "converter"   : self.NAME_BASED_FIELD_PARSERS.get(field["name"]),
+                })
+
+        return [(start, length, fields) for (start, length), fields in words.items()]
+
+    def getPayloadLength(self, command : int, version : int) -> int:
+        """Get length of a command's data (without header, checksum and footer).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        payloadLength : int = 0
+
+        with self.__layoutErrors(command):
+            for _, offset, length in self.__walkLayout(command, version):
+                payloadLength = max(payloadLength, offset + length)
+
+        return payloadLength
+
     def __getMultiplierDecimalPlaces(self, multiplier : float) -> int:
         if "." in str(multiplier):
             return len(str(multiplier).split(".")[1])
@@ -354,8 +750,11 @@ class SermatecProtocolParser:
             CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
             ProtocolFileMalformed: There was an unexpected error in the protocol file.
             ParsingNotImplemented: There is a field in command reply which is not supported.
-        """           
-        logger.debug(f"Reply to parse: {reply[self.REPLY_OFFSET_DATA:].hex(' ')}")
+        """
+        parseStart = time.monotonic()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reply to parse: %s", reply[self.REPLY_OFFSET_DATA:].hex(' '))
         
         logger.debug("Looking for the command in protocol.")
         # This may throw CommandNotFoundInProtocol.
@@ -369,7 +768,7 @@ class SermatecProtocolParser:
             logger.error(f"Protocol file malformed, can't process command 0x'{command:02x}'")
             raise ProtocolFileMalformed()
         
-        logger.debug(f"It is command 0x{cmdType}: {cmdName} with {len(cmdFields)} fields")
+        logger.debug("It is command 0x%s: %s with %s fields", cmdType, cmdName, len(cmdFields))
 
         parsedData : dict       = {}
         replyPosition : int     = self.REPLY_OFFSET_DATA
@@ -379,10 +778,10 @@ class SermatecProtocolParser:
             ignoreField = False
 
             if ("same" in field and field["same"]):
-                logger.debug(f"Staying at the same byte.")
+                logger.debug("Staying at the same byte.")
                 replyPosition = prevReplyPosition
 
-            logger.debug(f"== Field #{idx} (reply byte #{replyPosition})")
+            logger.debug("== Field #%s (reply byte #%s)", idx, replyPosition)
 
             if not (("name" or "byteLen" or "type") in field):
                 logger.error(f"Field has a 'name', 'byteLen' or 'type' missing: {field}.")
@@ -410,7 +809,7 @@ class SermatecProtocolParser:
                     logger.debug("Detected type bit, tag onOff. Converting.")
                     rawFieldData = self.__CONVERTER_ON_OFF.fromFriendly(extractedBit).to_bytes(byteorder = "big", signed = False)
                 
-            logger.debug(f"Storing raw field data: {rawFieldData}")
+            logger.debug("Storing raw field data: %s", rawFieldData)
 
             # Fields with "repeat" are not supported for now, skipping.
             if "repeat" in field:
@@ -425,15 +824,18 @@ class SermatecProtocolParser:
 
             if not ignoreField and "tag" in field:
                 parsedData[field["tag"]] =  rawFieldData
-                logger.debug(f"Stored data to tag {field["tag"]}.")
+                logger.debug("Stored data to tag %s.", field['tag'])
 
             prevReplyPosition = replyPosition
             replyPosition += fieldLength
+
+        if self.__observers:
+            self.__notifyParse(command, version, parseStart)
         
         return parsedData
 
     def parseReply(self, command : int, version : int, reply : bytes, dryrun : bool = False) -> dict:
-        """Parse a command reply using a specified version definition.
+        """Parse a command reply using a specified version definition, with names in the parser's language.
 
         Args:
             command (int): A single-byte code of the command to parse.
@@ -447,9 +849,53 @@ class SermatecProtocolParser:
             CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
             ProtocolFileMalformed: There was an unexpected error in the protocol file.
             ParsingNotImplemented: There is a field in command reply which is not supported.
-        """      
-        
-        logger.debug(f"Reply to parse: {reply[self.REPLY_OFFSET_DATA:].hex(' ')}")
+        """
+        return self.__render(self.decodeReply(command, version, reply, dryrun), self.translations)
+
+    def renderReply(self, decodedData : dict, translations : SermatecTranslations | None = None) -> dict:
+        """Name the fields of a decoded reply in a language.
+
+        Decoding is independent of the language, so a reply decoded once can be rendered
+        in any number of languages.
+
+        Args:
+            decodedData (dict): Reply from decodeReply() or decodeReplyIncremental() (not modified).
+            translations (SermatecTranslations | None): Language of the names, the parser's language if None.
+
+        Returns:
+            dict: Parsed reply (same as from parseReply).
+        """
+        return self.__render({key: field.copy() for key, field in decodedData.items()}, translations or self.translations)
+
+    @staticmethod
+    def __render(decodedData : dict, translations : SermatecTranslations) -> dict:
+        for field in decodedData.values():
+            field["name"] = translations.get(field["name"], field["name"])
+            if "nameSuffix" in field:
+                # Derived fields (see SermatecAggregates) name their source.
+                field["name"] = f"{field['name']} {field.pop('nameSuffix')}"
+        return decodedData
+
+    def decodeReply(self, command : int, version : int, reply : bytes, dryrun : bool = False) -> dict:
+        """Decode a command reply using a specified version definition, with names as in the protocol.
+
+        Args:
+            command (int): A single-byte code of the command to parse.
+            version (int): A MCU version (used to look up a correct response format).
+            reply (bytes): A reply to parse.
+
+        Returns:
+            dict: Decoded reply (as from parseReply, but the names are not translated).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: There is a field in command reply which is not supported.
+        """
+        parseStart = time.monotonic()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reply to parse: %s", reply[self.REPLY_OFFSET_DATA:].hex(' '))
         
         logger.debug("Looking for the command in protocol.")
         # This may throw CommandNotFoundInProtocol.
@@ -463,7 +909,7 @@ class SermatecProtocolParser:
             logger.error(f"Protocol file malformed, can't process command 0x'{command:02x}'")
             raise ProtocolFileMalformed()
         
-        logger.debug(f"It is command 0x{cmdType}: {cmdName} with {len(cmdFields)} fields")
+        logger.debug("It is command 0x%s: %s with %s fields", cmdType, cmdName, len(cmdFields))
 
         parsedData : dict       = {}
         replyPosition : int     = self.REPLY_OFFSET_DATA
@@ -475,10 +921,10 @@ class SermatecProtocolParser:
             ignoreField : bool = False
 
             if ("same" in field and field["same"]):
-                logger.debug(f"Staying at the same byte.")
+                logger.debug("Staying at the same byte.")
                 replyPosition = prevReplyPosition
 
-            logger.debug(f"== Field #{idx} (reply byte #{replyPosition})")
+            logger.debug("== Field #%s (reply byte #%s)", idx, replyPosition)
 
             if not (("name" or "byteLen" or "type") in field):
                 logger.error(f"Field has a 'name', 'byteLen' or 'type' missing: {field}.")
@@ -510,13 +956,10 @@ class SermatecProtocolParser:
             
 
             fieldTag = re.sub(r"[^A-Za-z0-9]", "_", field["name"]).lower()
-            logger.debug(f"Created tag from name: {fieldTag}")
-
-            if field["name"] in self.translations:
-                fieldName = self.translations[field["name"]]
-            else:
-                fieldName = field["name"]
+            logger.debug("Created tag from name: %s", fieldTag)
 
+            # Translated when rendering, see renderReply().
+            fieldName = field["name"]
             newField["name"] = fieldName
 
             if "unitValue" in field:
@@ -527,11 +970,11 @@ class SermatecProtocolParser:
                     raise ProtocolFileMalformed()
             else:
                 fieldMultiplier : float = 1
-                logger.debug(f"Field {fieldName} has not 'unitValue' key, using 1 as a default multiplier.")          
+                logger.debug("Field %s has not 'unitValue' key, using 1 as a default multiplier.", fieldName)
             
 
             if "unitType" in field:
-                logger.debug(f"Field has a unit: {field['unitType']}")
+                logger.debug("Field has a unit: %s", field['unitType'])
                 newField["unit"] = field['unitType']
 
                 if newField["unit"] == "V":
@@ -550,14 +993,15 @@ class SermatecProtocolParser:
                     newField["device_class"] = "FREQUENCY"
             
             if "deviceClass" in field:
-                logger.debug(f"Field has an explicit device class: {field['deviceClass']}")
+                logger.debug("Field has an explicit device class: %s", field['deviceClass'])
                 newField["device_class"] = field['deviceClass']
                                   
             # Do not parse when no data are supplied (dry run) -> checking out list of available sensors,
             # useful e.g. for Home Assistant.
             if not dryrun:
                 currentFieldData = reply[ replyPosition : (replyPosition + fieldLength) ]
-                logger.debug(f"Parsing field data: {currentFieldData.hex(' ')}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Parsing field data: %s", currentFieldData.hex(' '))
                 
                 if fieldType == "int":
                     newField["value"] = round(int.from_bytes(currentFieldData, byteorder = "big", signed = True) * fieldMultiplier, self.__getMultiplierDecimalPlaces(fieldMultiplier))
@@ -575,7 +1019,7 @@ class SermatecProtocolParser:
                     binLength = fieldEndBit - fieldFromBit
                     binaryMask = (1 << (binLength)) - 1
                     convertedBytes = (convertedBytes >> fieldFromBit) & binaryMask
-                    logger.debug(f"Masked value: {convertedBytes}")
+                    logger.debug("Masked value: %s", convertedBytes)
                     newField["value"] = convertedBytes
                 elif fieldType == "hex":
                     newField["value"] =  int.from_bytes(currentFieldData, byteorder = "big", signed = False)
@@ -606,128 +1050,346 @@ class SermatecProtocolParser:
 
             if not ignoreField:
                 parsedData[fieldTag] = newField
-                logger.debug(f"Parsed: {parsedData[fieldTag]}")
+                logger.debug("Parsed: %s", parsedData[fieldTag])
 
             prevReplyPosition = replyPosition
             replyPosition += fieldLength
+
+        if self.__observers and not dryrun:
+            self.__notifyParse(command, version, parseStart)
         
         return parsedData
     
+    def __compileReplyLayout(self, command : int, version : int) -> list[tuple]:
+        """Compile a reply layout to a list of fields decoded the same way decodeReply decodes them.
+
+        Returns:
+            list[tuple]: (key, start, end, change mask, decode function, field without value, listIgnore).
+                The change mask selects the field's bits in the little-endian integer of the reply data.
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        # Using the dry run to get names, units and device classes exactly like decodeReply.
+        dryrunFields : dict = self.decodeReply(command, version, bytes(), dryrun = True)
+
+        layout : list[tuple] = []
+
+        with self.__layoutErrors(command):
+            for field, start, fieldLength in self.__walkLayout(command, version):
+                fieldType = field["type"]
+                if "repeat" in field or fieldType not in self.PARSED_FIELD_TYPES:
+                    continue
+
+                end        = start + fieldLength
+                multiplier = float(field["unitValue"]) if "unitValue" in field else 1
+                decimals   = self.__getMultiplierDecimalPlaces(multiplier)
+                mask       = ((1 << (8 * fieldLength)) - 1) << (8 * start)
+
+                if fieldType in ("int", "long"):
+                    decode = lambda data, m = multiplier, d = decimals: round(int.from_bytes(data, byteorder = "big", signed = True) * m, d)
+                elif fieldType == "uInt":
+                    decode = lambda data, m = multiplier, d = decimals: round(int.from_bytes(data, byteorder = "big", signed = False) * m, d)
+                elif fieldType == "string":
+                    decode = lambda data: data.split(b"\x00", 1)[0].decode("ascii")
+                elif fieldType == "hex":
+                    decode = lambda data: int.from_bytes(data, byteorder = "big", signed = False)
+                elif fieldType == "bit":
+                    bitPosition = field["bitPosition"]
+                    decode = lambda data, b = bitPosition: bool(int.from_bytes(data, byteorder = "big", signed = False) & (1 << b))
+                    mask   = 1 << (8 * (end - 1 - bitPosition // 8) + bitPosition % 8)
+                else:
+                    fromBit, endBit = field["fromBit"], field["endBit"]
+                    bitMask = (1 << (endBit - fromBit)) - 1
+                    decode = lambda data, f = fromBit, b = bitMask: (int.from_bytes(data, byteorder = "big", signed = False) >> f) & b
+                    mask   = 0
+                    for bit in range(fromBit, endBit):
+                        mask |= 1 << (8 * (end - 1 - bit // 8) + bit % 8)
+
+                if field["name"] in self.NAME_BASED_FIELD_PARSERS:
+                    decode = lambda data, raw = decode, p = self.NAME_BASED_FIELD_PARSERS[field["name"]]: p.toFriendly(raw(data))
+
+                key = re.sub(r"[^A-Za-z0-9]", "_", field["name"]).lower()
+                fieldWithoutValue = {name: value for name, value in dryrunFields[key].items() if name != "listIgnore"}
+                layout.append((key, start, end, mask, decode, fieldWithoutValue, field.get("listIgnore", False)))
+
+        return layout
+
+    def parseReplyIncremental(self, command : int, version : int, reply : bytes) -> dict:
+        """Parse a command reply like parseReply, decoding only fields changed since the previous reply.
+
+        Args:
+            command (int): A single-byte code of the command to parse.
+            version (int): A PCU version (used to look up a correct response format).
+            reply (bytes): A reply to parse.
+
+        Returns:
+            dict: Parsed reply (same as from parseReply).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        return self.__render(self.decodeReplyIncremental(command, version, reply), self.translations)
+
+    def decodeReplyIncremental(self, command : int, version : int, reply : bytes) -> dict:
+        """Decode a command reply like decodeReply, decoding only fields changed since the previous reply.
+
+        The previous reply data and decoded values are kept per command. The data are XORed
+        with the previous ones and only fields with a changed bit are decoded again, the
+        cached values are used for the rest. Intended for periodic polling of a single inverter.
+
+        Args:
+            command (int): A single-byte code of the command to parse.
+            version (int): A PCU version (used to look up a correct response format).
+            reply (bytes): A reply to parse.
+
+        Returns:
+            dict: Decoded reply (same as from decodeReply).
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol (thus can't be parsed).
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+        """
+        parseStart = time.monotonic()
+
+        layout = self.__replyLayouts.get((command, version))
+        if layout is None:
+            layout = self.__replyLayouts[(command, version)] = self.__compileReplyLayout(command, version)
+
+        data     = bytes(reply[self.REPLY_OFFSET_DATA:])
+        previous = self.__previousReplies.get(command)
+
+        if previous is not None and previous[0] == version and len(previous[1]) == len(data):
+            values = previous[2]
+            diff   = int.from_bytes(data, byteorder = "little") ^ int.from_bytes(previous[1], byteorder = "little")
+            if diff:
+                values = list(values)
+                for idx, (key, start, end, mask, decode, fieldWithoutValue, listIgnore) in enumerate(layout):
+                    if diff & mask:
+                        values[idx] = decode(data[start:end])
+        else:
+            values = [decode(data[start:end]) for key, start, end, mask, decode, fieldWithoutValue, listIgnore in layout]
+
+        self.__previousReplies[command] = (version, data, values)
+
+        parsedData : dict = {}
+        for (key, start, end, mask, decode, fieldWithoutValue, listIgnore), value in zip(layout, values):
+            newField = fieldWithoutValue.copy()
+            newField["value"]      = value
+            newField["listIgnore"] = listIgnore
+            parsedData[key] = newField
+
+        if self.__observers:
+            self.__notifyParse(command, version, parseStart)
+
+        return parsedData
+
+    def clearReplyCache(self) -> None:
+        """Forget previous replies used by parseReplyIncremental (e.g. after reconnecting to another inverter)."""
+        self.__previousReplies.clear()
+
     def __calculateChecksum(self, data : bytes) -> bytes:
         checksum : int = 0x0f
         
         for byte in data:
             checksum = (checksum & 0xff) ^ byte
         
-        logger.debug(f"Calculated checksum: {hex(checksum)}")
+        logger.debug("Calculated checksum: 0x%02x", checksum)
 
         return checksum.to_bytes(1, byteorder="little")
 
     def checkResponseIntegrity(self, responses : list[bytes], command : int) -> bool:
+        return self.getIntegrityFailureReason(responses, command) is None
+
+    def getIntegrityFailureReason(self, responses : list[bytes], command : int) -> str | None:
+        """Check integrity of responses to a command.
+
+        Args:
+            responses (list[bytes]): Raw responses.
+            command (int): A single-byte code of the command the responses belong to.
+
+        Returns:
+            str | None: None if the responses are correct, otherwise the reason of the failure:
+                "count", "length", "signature", "address", "command", "zero", "checksum" or "footer".
+        """
 
         reponseCommands = self.getResponseCommands(command)
 
         if len(responses) != len(reponseCommands):
-            logger.debug(f"Invalid count of response packets. Expected {len(response)}, got {len(reponseCommands)}.")
-            return False
+            logger.debug(f"Invalid count of response packets. Expected {len(reponseCommands)}, got {len(responses)}.")
+            return "count"
 
         for response, commandCode in zip(responses, reponseCommands):
             # Length check.
-            if len(response) < 8: return False
+            if len(response) < 8: return "length"
 
             # Signature check.
             if response[0x00:0x02] != self.REQ_SIGNATURE:
                 logger.debug("Bad response signature.")
-                return False
+                return "signature"
             # Sender + receiver check.
             if response[0x02:0x03] != self.REQ_INVERTER_ADDRESS:
                 logger.debug("Bad response sender address.")
-                return False
+                return "address"
             if response[0x03:0x04] != self.REQ_APP_ADDRESS:
                 logger.debug("Bad response recipient address.")
-                return False
+                return "address"
             # Response command check.
             if int.from_bytes(response[0x04:0x05], byteorder = "little", signed = False) != commandCode:
                 logger.debug(f"Bad response expected command. Expected: {commandCode:02x}, got: {response[0x04:0x05].hex()}.")
-                return False
+                return "command"
             # Zero.
             if response[0x05] != 0:
                 logger.debug("No zero at response position 0x00.")
-                return False
+                return "zero"
             # Checksum verification.
             if response[-0x02:-0x01] != self.__calculateChecksum(response[:len(response) - 2]):
                 logger.debug(f"Bad response checksum: {response[-0x03:-0x02].hex()}")
-                return False
+                return "checksum"
             # Footer check.
             if response[-0x01] != int.from_bytes(self.REQ_FOOTER, byteorder="big"):
                 logger.debug("Bad response footer.")
-                return False
+                return "footer"
 
-        return True
+        return None
 
     def generateRequest(self, command : int, payload : bytes = bytes()) -> bytes:
         request : bytearray = bytearray([*self.REQ_SIGNATURE, *self.REQ_APP_ADDRESS, *self.REQ_INVERTER_ADDRESS, command, 0x00, len(payload)]) + payload
         request += self.__calculateChecksum(request)
         request += self.REQ_FOOTER
 
-        logger.debug(f"Built command: {[hex(x) for x in request]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Built command: {[hex(x) for x in request]}")
 
         return request
 
-    def build66Payload(self, taggedData : dict) -> bytes:
-        """Generate 0x66 command payload from specified data.
+    def generateResponse(self, command : int, payload : bytes = bytes()) -> bytes:
+        """Build a reply frame as the inverter sends it (used by the simulator)."""
+        response : bytearray = bytearray([*self.REQ_SIGNATURE, *self.REQ_INVERTER_ADDRESS, *self.REQ_APP_ADDRESS, command, 0x00, len(payload)]) + payload
+        response += self.__calculateChecksum(response)
+        response += self.REQ_FOOTER
+
+        return response
+
+    def __compilePayloadPlan(self, command : int, version : int) -> tuple[Callable, Callable, tuple, tuple]:
+        """Compile a set command layout to a struct packing the tagged fields in order,
+        a getter picking the values of these fields from tagged data and the tags and
+        lengths of the fields for checking the values.
+
+        Preserved fields are packed as zeroes. Groups repeated by a count field (repeatRef)
+        are left out, their count field is zero.
+
+        Raises:
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: The layout contains fields sharing bytes ("same"), repeated
+                or untagged fields (their values can't be supplied).
+        """
+        cmd : dict = self.__getCommandByVersion(command, version)
+
+        packFormat : str = ">"
+        tags : list[str] = []
+        lengths : list[int] = []
+
+        with self.__layoutErrors(command):
+            countFields = {int(field["repeatRef"]) for field in cmd["fields"] if "repeatRef" in field}
+
+            for field, _, fieldLength in self.__walkLayout(command, version):
+                if field.get("same", False):
+                    logger.error(f"Building payload of 0x{command:02x} with fields sharing bytes is not supported.")
+                    raise ParsingNotImplemented()
+
+                if "repeatRef" in field:
+                    continue
+
+                if field["type"] == "preserve" or int(field["order"]) in countFields:
+                    packFormat += f"{fieldLength}x"
+                elif field.get("tag") and "repeat" not in field:
+                    packFormat += f"{fieldLength}s"
+                    tags.append(field["tag"])
+                    lengths.append(fieldLength)
+                else:
+                    logger.error(f"Building payload of 0x{command:02x} is not supported, field '{field.get('name')}' has no value to send.")
+                    raise ParsingNotImplemented()
+
+        if len(tags) > 1:
+            getter = operator.itemgetter(*tags)
+        elif tags:
+            getter = lambda taggedData, tag = tags[0]: (taggedData[tag],)
+        else:
+            getter = lambda taggedData: ()
+
+        return struct.Struct(packFormat).pack, getter, tuple(tags), tuple(lengths)
+
+    def buildPayload(self, command : int, taggedData : dict, version : int | None = None) -> bytes:
+        """Generate a set command payload from specified data using the command layout from the protocol.
 
         Args:
-            taggedData (dict): Data to build payload from.
+            command (int): A single-byte code of the set command.
+            taggedData (dict): Data to build payload from (raw values, e.g. from parseParameterReply).
+            version (int | None): A PCU version (used to look up a correct format), the newest one if None.
 
         Returns:
             bytes: Payload.
 
         Raises:
             MissingTaggedData: If not enough data was supplied to build payload.
-        """      
-        payload = bytearray();
+            CommandNotFoundInProtocol: The specified command is not found in the protocol.
+            ProtocolFileMalformed: There was an unexpected error in the protocol file.
+            ParsingNotImplemented: The command layout is not supported.
+            ValueError: A value doesn't have the length of its field.
+        """
+        if version is None:
+            version = self.__latestVersion
+
+        plan = self.__payloadPlans.get((command, version))
+        if plan is None:
+            plan = self.__payloadPlans[(command, version)] = self.__compilePayloadPlan(command, version)
+        pack, getter, tags, lengths = plan
 
         try:
-            payload.extend(taggedData["price1"])
-            payload.extend(taggedData["price2"])
-            payload.extend(taggedData["price3"])
-            payload.extend(taggedData["price4"])
-            payload.extend(taggedData["con"])
-            payload.extend(taggedData["chargePower"])
-            payload.extend(taggedData["operatingMode"])
-            payload.extend(taggedData["gridSwitch"])
-            payload.extend(taggedData["adjustMethod"])
-            payload.extend(taggedData["antiBackflow"])
-            payload.extend(taggedData["batteryCharge"])
-            payload.extend(taggedData["soc"])
-            # Zeroes for "How many sets of data are there" field.
-            payload.extend(b'\x00\x00')
+            values = getter(taggedData)
         except KeyError:
             raise MissingTaggedData()
+
+        # struct pads or truncates the values silently.
+        if tuple(map(len, values)) != lengths:
+            tag, value, length = next((tag, value, length) for tag, value, length in zip(tags, values, lengths) if len(value) != length)
+            raise ValueError(f"Value of '{tag}' has {len(value)} bytes, {length} expected.")
+
+        return pack(*values)
+
+    def build66Payload(self, taggedData : dict, version : int | None = None) -> bytes:
+        """Generate 0x66 command payload from specified data.
+
+        Args:
+            taggedData (dict): Data to build payload from.
+            version (int | None): A PCU version, the newest one if None.
+
+        Returns:
+            bytes: Payload.
+
+        Raises:
+            MissingTaggedData: If not enough data was supplied to build payload.
+        """
+        return self.buildPayload(0x66, taggedData, version)
         
-        return payload
-        
-    def build64Payload(self, taggedData : dict) -> bytes:
+    def build64Payload(self, taggedData : dict, version : int | None = None) -> bytes:
         """Generate 0x64 command payload from specified data.
 
         Args:
             taggedData (dict): Data to build payload from.
+            version (int | None): A PCU version, the newest one if None.
 
         Returns:
             bytes: Payload.
 
         Raises:
             MissingTaggedData: If not enough data was supplied to build payload.
-        """      
-        payload = bytearray();
-
-        try:
-            payload.extend(taggedData["onOff"])
-        except KeyError:
-            raise MissingTaggedData()
-        
-        return payload
+        """
+        return self.buildPayload(0x64, taggedData, version)
     
     def isInverterOff(self, value : bytes) -> bool:
         """Check whether the provided value corresponds to off state."""
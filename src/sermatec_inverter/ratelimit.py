@@ -0,0 +1,118 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+class SermatecTokenBucket:
+    """Token bucket limiting the rate of requests sent to a single inverter dongle.
+
+    Every request (including retries) takes a token; tokens are refilled at `rate`
+    per second up to `burst`. Requests waiting for a token are served by priority
+    (lower first) and in arrival order within a priority, so control commands and
+    writes overtake queued polls.
+
+    Buckets are shared by all connections to the same host and port, see forHost().
+    """
+
+    PRIORITY_CONTROL    = 0
+    PRIORITY_WRITE      = 1
+    PRIORITY_READ       = 2
+
+    # (host, port) -> bucket
+    __registry : dict[tuple[str, int], "SermatecTokenBucket"] = {}
+
+    def __init__(self, rate : float | None, burst : float = 1):
+        """
+        Args:
+            rate (float | None): Sustained requests per second, unlimited if None.
+            burst (float): How many requests can be sent at once after an idle period.
+        """
+        self.configure(rate, burst)
+        self.tokens         = float(self.burst)
+        self.__updatedAt    = time.monotonic()
+        # (priority, arrival, future)
+        self.__waiters      : list[tuple[int, int, asyncio.Future]] = []
+        self.__arrivals     = itertools.count()
+        self.__timer        : asyncio.TimerHandle | None = None
+
+    @classmethod
+    def forHost(cls, host : str, port : int, rate : float | None, burst : float = 1) -> "SermatecTokenBucket":
+        """Get the bucket shared by all connections to the host and port (created on the first use).
+
+        The rate and burst apply only to a newly created bucket, an existing one keeps
+        its configuration (see configure()).
+        """
+        key = (host, int(port))
+        bucket = cls.__registry.get(key)
+        if bucket is None:
+            bucket = cls.__registry[key] = cls(rate, burst)
+        return bucket
+
+    def configure(self, rate : float | None, burst : float = 1) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError("Rate limit has to be positive.")
+        self.rate  = rate
+        self.burst = max(1, burst)
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is None:
+            self.tokens = self.burst
+        else:
+            self.tokens = min(self.burst, self.tokens + (now - self.__updatedAt) * self.rate)
+        self.__updatedAt = now
+
+    @property
+    def waiting(self) -> int:
+        return len(self.__waiters)
+
+    async def acquire(self, priority : int = PRIORITY_READ) -> float:
+        """Wait for a token.
+
+        Args:
+            priority (int): Lower is served first (PRIORITY_CONTROL, PRIORITY_WRITE, PRIORITY_READ).
+
+        Returns:
+            float: Time spent waiting [s].
+        """
+        if self.rate is None:
+            return 0.0
+
+        self.__refill()
+        if not self.__waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        waitStart = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.__waiters, (priority, next(self.__arrivals), future))
+        self.__schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The token, if already granted, is lost; the next waiter gets the following one.
+            self.__schedule()
+            raise
+        return time.monotonic() - waitStart
+
+    def __schedule(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        self.__refill()
+        while self.__waiters and (self.rate is None or self.tokens >= 1):
+            _, _, future = heapq.heappop(self.__waiters)
+            if future.done():
+                # Cancelled while waiting.
+                continue
+            if self.rate is not None:
+                self.tokens -= 1
+            future.set_result(None)
+
+        # Drop cancelled waiters, they would keep the timer running.
+        while self.__waiters and self.__waiters[0][2].done():
+            heapq.heappop(self.__waiters)
+
+        if self.__waiters and self.rate is not None:
+            self.__timer = asyncio.get_running_loop().call_later((1 - self.tokens) / self.rate, self.__schedule)
@@ -0,0 +1,190 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from enum import IntEnum
+from typing import Any
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecRequestClass(IntEnum):
+    """Priority class of a request, lower is served first."""
+    # Writes (set commands) and reads they depend on.
+    CONTROL     = 0
+    # Reads somebody waits for (CLI, UI, automations).
+    INTERACTIVE = 1
+    # Periodic polling.
+    BACKGROUND  = 2
+
+class _SermatecRequest:
+    __slots__ = ("requestClass", "key", "enqueuedAt", "arrival", "granted", "result", "followers", "vacancy")
+
+    def __init__(self, requestClass : SermatecRequestClass, key : Hashable, arrival : int):
+        self.requestClass   = requestClass
+        self.key            = key
+        self.enqueuedAt     = time.monotonic()
+        self.arrival        = arrival
+        self.granted        = asyncio.get_running_loop().create_future()
+        # Outcome shared with superseded background requests.
+        self.result         = asyncio.get_running_loop().create_future()
+        self.followers      = 0
+        # Resolved when the caller sending the request is cancelled, a follower takes its place.
+        self.vacancy        = asyncio.get_running_loop().create_future()
+
+class SermatecRequestScheduler:
+    """Priority queue serializing requests on a single connection.
+
+    Only one request runs at a time; when it finishes, the queued request with the
+    best effective class runs next (arrival order within a class). Waiting promotes a
+    request by one class per `agingInterval` seconds, so polls are not starved by a
+    stream of writes. A control request therefore waits at most for the request in
+    progress (including its retries) and for requests aged into the control class.
+
+    A background request of the same key (command and payload) as an already queued one
+    supersedes it: the stale one is never sent, both callers get the result of the single
+    query sent when the queue reaches it. When the caller of the queued request is
+    cancelled, one of the joined callers takes its place in the queue.
+    """
+
+    def __init__(self, agingInterval : float = 5.0):
+        """
+        Args:
+            agingInterval (float): Waiting time promoting a request by one class [s].
+        """
+        self.agingInterval  = agingInterval
+
+        self.__queue        : list[_SermatecRequest] = []
+        # key -> queued background request
+        self.__background   : dict[Hashable, _SermatecRequest] = {}
+        self.__busy         = False
+        self.__arrivals     = itertools.count()
+
+        self.superseded     = 0
+        # requestClass -> longest time a request waited for its turn [s]
+        self.maxWait        : dict[SermatecRequestClass, float] = {}
+
+    @property
+    def queued(self) -> int:
+        return len(self.__queue)
+
+    def hasWaiting(self, requestClass : SermatecRequestClass) -> bool:
+        """Check whether a request of the class (or a better one, including aged requests) waits for its turn."""
+        now = time.monotonic()
+        return any(self.__effectiveClass(request, now) <= requestClass for request in self.__queue)
+
+    def stats(self) -> dict:
+        """Get the queue length, superseded background requests and the longest waits per class."""
+        return {
+            "queued"        : len(self.__queue),
+            "superseded"    : self.superseded,
+            "maxWait"       : {requestClass.name.lower(): wait for requestClass, wait in self.maxWait.items()},
+        }
+
+    def __effectiveClass(self, request : _SermatecRequest, now : float) -> int:
+        promotion = int((now - request.enqueuedAt) / self.agingInterval) if self.agingInterval > 0 else 0
+        return max(SermatecRequestClass.CONTROL, request.requestClass - promotion)
+
+    def __grantNext(self) -> None:
+        now = time.monotonic()
+        while self.__queue:
+            request = min(self.__queue, key = lambda request: (self.__effectiveClass(request, now), request.arrival))
+            self.__queue.remove(request)
+            if self.__background.get(request.key) is request:
+                del self.__background[request.key]
+            if request.granted.done():
+                # Cancelled while waiting.
+                continue
+            request.granted.set_result(None)
+            return
+        self.__busy = False
+
+    async def submit(self, execute : Callable[[], Awaitable[Any]], requestClass : SermatecRequestClass, key : Hashable = None) -> Any:
+        """Run a request when its turn comes.
+
+        Args:
+            execute (Callable[[], Awaitable[Any]]): Coroutine function sending the request.
+            requestClass (SermatecRequestClass): Priority class of the request.
+            key (Hashable): Identity of the request for superseding background requests (e.g. command and payload).
+
+        Returns:
+            Any: Result of `execute` (possibly of a fresher identical background request).
+        """
+        if requestClass == SermatecRequestClass.BACKGROUND and key in self.__background:
+            request = self.__background[key]
+            request.followers += 1
+            self.superseded += 1
+            _LOGGER.debug(f"Background request {key} superseded by a fresher one.")
+            return await self.__follow(request, execute)
+
+        request = _SermatecRequest(requestClass, key, next(self.__arrivals))
+        if not self.__busy:
+            self.__busy = True
+            request.granted.set_result(None)
+        else:
+            self.__queue.append(request)
+            if requestClass == SermatecRequestClass.BACKGROUND:
+                self.__background[key] = request
+        return await self.__lead(request, execute)
+
+    async def __follow(self, request : _SermatecRequest, execute : Callable[[], Awaitable[Any]]) -> Any:
+        """Wait for the result of a request sent by another caller, or send it when that caller is cancelled."""
+        try:
+            while not request.result.done():
+                vacancy = request.vacancy
+                # Unlike awaiting them, waiting doesn't cancel the shared futures.
+                await asyncio.wait((request.result, vacancy), return_when = asyncio.FIRST_COMPLETED)
+                if vacancy.done() and request.vacancy is vacancy and not request.result.done():
+                    request.followers -= 1
+                    request.vacancy = asyncio.get_running_loop().create_future()
+                    return await self.__lead(request, execute)
+        except asyncio.CancelledError:
+            if not request.result.done():
+                request.followers -= 1
+                if request.vacancy.done() and not request.followers:
+                    # Nobody is left to send it.
+                    self.__abandon(request)
+            raise
+        return request.result.result()
+
+    def __abandon(self, request : _SermatecRequest) -> None:
+        if request in self.__queue:
+            self.__queue.remove(request)
+            if self.__background.get(request.key) is request:
+                del self.__background[request.key]
+        else:
+            # Granted just before the cancellation, pass the turn on.
+            self.__grantNext()
+
+    async def __lead(self, request : _SermatecRequest, execute : Callable[[], Awaitable[Any]]) -> Any:
+        """Wait for the turn of a request and send it."""
+        try:
+            if not request.granted.done():
+                # Shielded, the turn stays with the request when the caller is cancelled.
+                await asyncio.shield(request.granted)
+        except asyncio.CancelledError:
+            if request.followers:
+                # The request keeps its place (or the granted turn), a follower sends it.
+                request.vacancy.set_result(None)
+            else:
+                self.__abandon(request)
+            raise
+
+        wait = time.monotonic() - request.enqueuedAt
+        self.maxWait[request.requestClass] = max(self.maxWait.get(request.requestClass, 0.0), wait)
+
+        try:
+            result = await execute()
+        except BaseException as e:
+            if request.followers:
+                if isinstance(e, asyncio.CancelledError):
+                    request.result.cancel()
+                else:
+                    request.result.set_exception(e)
+            raise
+        else:
+            if request.followers:
+                request.result.set_result(result)
+            return result
+        finally:
+            self.__grantNext()
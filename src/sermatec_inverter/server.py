@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qs, urlsplit
+
+from .fanout import SermatecOverflowPolicy
+from .poller import SermatecPoller
+from .translations import SermatecTranslations
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecSnapshotServer:
+    """Minimal HTTP/1.1 server sharing the poller's latest snapshot with local clients.
+
+    Endpoints:
+
+        GET /snapshot   the latest snapshot as JSON, with an ETag (304 for a matching If-None-Match)
+        GET /stream     server-sent events, one snapshot per event
+        GET /status     state of the poller and its subscribers
+        GET /metrics    communication metrics in the Prometheus text format
+
+    /snapshot and /stream accept `?lang=cs` (any bundled language) to name the fields in
+    the language, the inverter's language is used by default. The data are decoded once
+    per poll and serialized once per language.
+
+    Clients never query the inverter, they only read data already polled. Every stream
+    has a bounded queue dropping the oldest snapshots, so slow readers don't stall the poller.
+    """
+
+    MAX_REQUEST_SIZE    = 8192
+    REQUEST_TIMEOUT     = 10
+    # Comment line sent to idle streams, so dead clients are detected [s].
+    KEEPALIVE_INTERVAL  = 15
+
+    REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+    def __init__(self, poller : SermatecPoller, host : str = "127.0.0.1", port : int = 8080):
+        """
+        Args:
+            poller (SermatecPoller): Source of the snapshots.
+            host (str): Address to listen on.
+            port (int): Port to listen on (0 = any free port).
+        """
+        self.poller     = poller
+        self.host       = host
+        self.port       = port
+        self.__server   : asyncio.AbstractServer | None = None
+        self.__routes   = {
+            "/snapshot" : self.__getSnapshot,
+            "/stream"   : self.__getStream,
+            "/status"   : self.__getStatus,
+            "/metrics"  : self.__getMetrics,
+        }
+
+    async def start(self) -> None:
+        self.__server = await asyncio.start_server(self.__handleClient, self.host, self.port)
+        # Resolve the port when listening on any free one.
+        self.port = self.__server.sockets[0].getsockname()[1]
+        _LOGGER.info(f"Serving snapshots at http://{self.host}:{self.port}/")
+
+    async def serveForever(self) -> None:
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def stop(self) -> None:
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    # ====================================================================
+    # HTTP
+    # ====================================================================
+    async def __readRequest(self, reader : asyncio.StreamReader) -> tuple[str, str, dict[str, str], dict[str, str]] | None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.REQUEST_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+            return None
+        if len(head) > self.MAX_REQUEST_SIZE:
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+
+        headers = {}
+        for line in lines[1:]:
+            name, separator, value = line.partition(":")
+            if separator:
+                headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return method, url.path, query, headers
+
+    @classmethod
+    def __response(cls, status : int, body : bytes = b"", contentType : str = "application/json", headers : dict[str, str] | None = None) -> bytes:
+        lines = [f"HTTP/1.1 {status} {cls.REASONS[status]}"]
+        if status != 304:
+            lines.append(f"Content-Type: {contentType}")
+            lines.append(f"Content-Length: {len(body)}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append("Connection: keep-alive")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+    async def __handleClient(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        try:
+            # Keep-alive: serve requests until the client closes the connection or streams.
+            while (request := await self.__readRequest(reader)) is not None:
+                method, path, query, headers = request
+                handler = self.__routes.get(path)
+
+                if handler is None:
+                    writer.write(self.__response(404, b'{"error": "not found"}'))
+                elif method not in ("GET", "HEAD"):
+                    writer.write(self.__response(405, b'{"error": "method not allowed"}', headers = {"Allow": "GET, HEAD"}))
+                else:
+                    response = await handler(query, headers, writer)
+                    if response is None:
+                        # Streamed until the client disconnected.
+                        break
+                    if method == "HEAD":
+                        response = response[:response.index(b"\r\n\r\n") + 4]
+                    writer.write(response)
+
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    # ====================================================================
+    # Endpoints
+    # ====================================================================
+    @staticmethod
+    def __isLanguage(language : str | None) -> bool:
+        return language is None or language in SermatecTranslations.languages()
+
+    async def __getSnapshot(self, query : dict[str, str], headers : dict[str, str], writer : asyncio.StreamWriter) -> bytes:
+        language = query.get("lang")
+        if not self.__isLanguage(language):
+            return self.__response(400, b'{"error": "unknown language"}')
+
+        snapshot = self.poller.snapshot
+        if snapshot is None:
+            return self.__response(503, b'{"error": "no data polled yet"}', headers = {"Retry-After": "1"})
+
+        etag = snapshot.etagFor(language)
+        cacheHeaders = {"ETag": etag, "Cache-Control": "no-cache"}
+        ifNoneMatch = headers.get("if-none-match")
+        if ifNoneMatch is not None and (ifNoneMatch == "*" or etag in (tag.strip() for tag in ifNoneMatch.split(","))):
+            return self.__response(304, headers = cacheHeaders)
+
+        return self.__response(200, snapshot.toJson(language), headers = cacheHeaders)
+
+    async def __getStream(self, query : dict[str, str], headers : dict[str, str], writer : asyncio.StreamWriter) -> bytes | None:
+        language = query.get("lang")
+        if not self.__isLanguage(language):
+            return self.__response(400, b'{"error": "unknown language"}')
+
+        writer.write((
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1"))
+
+        peer = writer.get_extra_info("peername")
+        subscription = self.poller.subscribe(policy = SermatecOverflowPolicy.DROP_OLDEST, name = f"stream {peer[0]}:{peer[1]}" if peer else None)
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(subscription.get(), self.KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                else:
+                    writer.write(b"id: " + snapshot.etagFor(language).strip('"').encode() + b"\ndata: " + snapshot.toJson(language) + b"\n\n")
+                # Only this client waits for its socket, the poller keeps publishing.
+                await writer.drain()
+        except (ConnectionError, StopAsyncIteration):
+            return None
+        finally:
+            subscription.close()
+            if subscription.dropped:
+                _LOGGER.debug(f"Stream client was too slow, {subscription.dropped} snapshot(s) dropped.")
+
+    async def __getStatus(self, query : dict[str, str], headers : dict[str, str], writer : asyncio.StreamWriter) -> bytes:
+        snapshot = self.poller.snapshot
+        status = {
+            "connected"     : self.poller.smc.isConnected(),
+            "pcuVersion"    : self.poller.smc.pcuVersion,
+            "sequence"      : snapshot.sequence if snapshot else None,
+            "changedAt"     : snapshot.timestamp if snapshot else None,
+            "polledAt"      : self.poller.lastPollTime,
+            "failedPolls"   : self.poller.failedPolls,
+            "subscribers"   : self.poller.subscriberStats(),
+            "scheduler"     : self.poller.smc.scheduler.stats(),
+        }
+        return self.__response(200, json.dumps(status).encode())
+
+    async def __getMetrics(self, query : dict[str, str], headers : dict[str, str], writer : asyncio.StreamWriter) -> bytes:
+        return self.__response(200, self.poller.smc.getPrometheusMetrics().encode(), "text/plain; version=0.0.4")
@@ -0,0 +1,271 @@
+import logging
+import asyncio
+import random
+from pathlib import Path
+
+from . import protocol_parser
+from .exceptions import *
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecSimulator:
+    """A stand-in for the inverter's Wi-Fi dongle speaking the OSIM protocol over TCP.
+
+    Replies are taken from raw frames (e.g. the `dumps` folder) or synthesized from
+    the protocol layouts. Writes (0x64, 0x66, 0x6A...) are accepted and reflected
+    in subsequent parameter queries. Network faults can be injected to test the client.
+    """
+
+    # Replies to these commands are served.
+    QUERY_COMMANDS          = [0x98, 0x0a, 0x0b, 0x0c, 0x0d, 0x95]
+    # Writes to these commands are mirrored to the parameter queries (0x64 is handled separately).
+    WRITE_COMMANDS          = {
+        0x66: [0x95],
+        0x67: [0x95],
+        0x69: [0x95],
+        0x6a: [0x9d],
+    }
+    HEADER_LENGTH           = 7
+    # How long to wait between sending a frame split into two segments.
+    SPLIT_SEGMENT_DELAY     = 0.01
+
+    # The repository's dumps, not part of the installed package: only exists in a checkout
+    # (replies are synthesized otherwise, or pass a folder explicitly).
+    DEFAULT_DUMPS_FOLDER    = Path(__file__).parents[2] / "dumps"
+
+    def __init__(
+        self,
+        host : str = "127.0.0.1",
+        port : int = 8899,
+        protocolFilePath : str = None,
+        pcuVersion : int = 603,
+        dumpsFolder : Path | None = None,
+        latency : float = 0.0,
+        jitter : float = 0.0,
+        dropRate : float = 0.0,
+        splitRate : float = 0.0,
+        corruptRate : float = 0.0,
+        frameGap : float = 0.05,
+        seed : int | None = None
+    ):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 to pick a free one.
+            protocolFilePath (str): Path to the protocol JSON.
+            pcuVersion (int): PCU version to report and to synthesize replies for.
+            dumpsFolder (Path): Folder with raw reply frames to serve. Missing replies are synthesized.
+            latency (float): Delay before every reply [s].
+            jitter (float): Maximal random deviation of the delay [s].
+            dropRate (float): Probability of not replying at all.
+            splitRate (float): Probability of sending a reply in two TCP segments.
+            corruptRate (float): Probability of sending a reply with a bad checksum.
+            frameGap (float): Delay between frames of a multi-frame reply [s].
+            seed (int): Seed for the fault injection, for reproducible runs.
+        """
+        if not protocolFilePath:
+            protocolFilePath = (Path(__file__).parent / "protocol-en.json").resolve()
+
+        self.host           = host
+        self.port           = port
+        self.pcuVersion     = pcuVersion
+        self.latency        = latency
+        self.jitter         = jitter
+        self.dropRate       = dropRate
+        self.splitRate      = splitRate
+        self.corruptRate    = corruptRate
+        self.frameGap       = frameGap
+
+        self.parser         = protocol_parser.SermatecProtocolParser(protocolFilePath, Path(__file__).parent / "translations" / "en.csv")
+        self.__random       = random.Random(seed)
+        self.__server       = None
+        self.__clients : set[asyncio.StreamWriter] = set()
+
+        # Reply command -> data (payload without header, checksum and footer).
+        self.replies : dict[int, bytearray] = {}
+        for command in self.QUERY_COMMANDS:
+            for responseCode in self.parser.getResponseCommands(command):
+                self.replies[responseCode] = self.__synthesizeReply(responseCode)
+
+        if dumpsFolder is not None:
+            self.loadDumps(dumpsFolder)
+
+        # Statistics of served traffic.
+        self.requestsCount  = 0
+        self.writesCount    = 0
+
+    def __layoutVersion(self, command : int) -> int:
+        # Some commands (e.g. 0x9D) do not exist in older versions, use the newest layout then.
+        try:
+            self.parser.getPayloadLength(command, self.pcuVersion)
+        except CommandNotFoundInProtocol:
+            return max(ver["version"] for ver in self.parser.osim["versions"])
+        return self.pcuVersion
+
+    def __synthesizeReply(self, command : int) -> bytearray:
+        version = self.__layoutVersion(command)
+        data    = bytearray(self.parser.getPayloadLength(command, version))
+
+        if command == 0x98:
+            start, length = self.parser.getFieldSpans(command, version)["pcuVersion"]
+            data[start:start + length] = self.pcuVersion.to_bytes(length, byteorder = "big")
+
+        return data
+
+    def loadDumps(self, dumpsFolder : Path) -> None:
+        """Serve replies from raw frames stored in files of the folder.
+
+        Only inverter replies are used, request dumps are skipped. Checksums are
+        recalculated when serving (some dumps are anonymized), so they are not checked.
+        The reported PCU version is kept, so the 0x98 reply is patched accordingly.
+        """
+        loaded : set[int] = set()
+        for dumpPath in sorted(Path(dumpsFolder).iterdir()):
+            if not dumpPath.is_file():
+                continue
+
+            frame   = dumpPath.read_bytes()
+            if len(frame) < self.HEADER_LENGTH + 2:
+                continue
+
+            command = frame[4]
+            if frame[2:4] != self.parser.REQ_INVERTER_ADDRESS + self.parser.REQ_APP_ADDRESS:
+                continue
+            if frame[0:2] != self.parser.REQ_SIGNATURE or frame[6] + self.HEADER_LENGTH + 2 != len(frame):
+                _LOGGER.warning(f"Dump '{dumpPath.name}' is malformed, skipping.")
+                continue
+
+            # The first matching dump is used (e.g. 0c_offgrid before 0c_ongrid).
+            if command in loaded:
+                continue
+
+            self.replies[command] = bytearray(frame[self.HEADER_LENGTH:-2])
+            loaded.add(command)
+            _LOGGER.debug(f"Serving 0x{command:02x} from dump '{dumpPath.name}'.")
+
+        if 0x98 in self.replies:
+            start, length = self.parser.getFieldSpans(0x98, 0)["pcuVersion"]
+            self.replies[0x98][start:start + length] = self.pcuVersion.to_bytes(length, byteorder = "big")
+
+    def __applyWrite(self, command : int, payload : bytes) -> None:
+        """Mirror a write command to replies of the corresponding query commands."""
+        self.writesCount += 1
+
+        if command == 0x64:
+            # On/off is a single bit of the running status word.
+            start, length = self.parser.getFieldSpans(0x0c, self.__layoutVersion(0x0c))["onOff"]
+            word = int.from_bytes(self.replies[0x0c][start:start + length], byteorder = "big")
+            if self.parser.isInverterOff(bytes(payload[:1])):
+                word &= ~0x1
+            else:
+                word |= 0x1
+            self.replies[0x0c][start:start + length] = word.to_bytes(length, byteorder = "big")
+            return
+
+        if command not in self.WRITE_COMMANDS:
+            _LOGGER.debug(f"Write command 0x{command:02x} accepted, but not mirrored.")
+            return
+
+        writeSpans = self.parser.getFieldSpans(command, self.__layoutVersion(command))
+        for queryCommand in self.WRITE_COMMANDS[command]:
+            querySpans = self.parser.getFieldSpans(queryCommand, self.__layoutVersion(queryCommand))
+            for tag, (writeStart, length) in writeSpans.items():
+                if tag in querySpans and querySpans[tag][1] == length and writeStart + length <= len(payload):
+                    queryStart = querySpans[tag][0]
+                    self.replies[queryCommand][queryStart:queryStart + length] = payload[writeStart:writeStart + length]
+
+    async def __sendFrame(self, writer : asyncio.StreamWriter, command : int) -> None:
+        frame = self.parser.generateResponse(command, bytes(self.replies[command]))
+
+        if self.__random.random() < self.corruptRate:
+            _LOGGER.debug(f"Corrupting checksum of 0x{command:02x} reply.")
+            frame[-2] ^= 0xff
+
+        if self.__random.random() < self.splitRate:
+            splitAt = self.__random.randrange(1, len(frame))
+            _LOGGER.debug(f"Splitting 0x{command:02x} reply at byte {splitAt}.")
+            writer.write(frame[:splitAt])
+            await writer.drain()
+            await asyncio.sleep(self.SPLIT_SEGMENT_DELAY)
+            writer.write(frame[splitAt:])
+        else:
+            writer.write(frame)
+
+        await writer.drain()
+
+    async def __handleRequest(self, writer : asyncio.StreamWriter, command : int, payload : bytes) -> None:
+        self.requestsCount += 1
+        responseCommands = self.parser.getResponseCommands(command)
+
+        if command not in self.QUERY_COMMANDS:
+            if not responseCommands:
+                self.__applyWrite(command, payload)
+            else:
+                _LOGGER.debug(f"Command 0x{command:02x} is not simulated, ignoring.")
+            return
+
+        delay = self.latency + self.__random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.__random.random() < self.dropRate:
+            _LOGGER.debug(f"Dropping reply to 0x{command:02x}.")
+            return
+
+        for index, responseCode in enumerate(responseCommands):
+            if index > 0 and self.frameGap > 0:
+                await asyncio.sleep(self.frameGap)
+            await self.__sendFrame(writer, responseCode)
+
+    async def __handleClient(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        _LOGGER.info(f"Client {peer} connected.")
+        self.__clients.add(writer)
+
+        try:
+            while True:
+                header = await reader.readexactly(self.HEADER_LENGTH)
+                while header[0:2] != self.parser.REQ_SIGNATURE:
+                    # Resynchronize: skip to the next signature (or its first byte at the end).
+                    start = header.find(self.parser.REQ_SIGNATURE, 1)
+                    if start < 0:
+                        start = len(header) - 1 if header[-1:] == self.parser.REQ_SIGNATURE[:1] else len(header)
+                    _LOGGER.debug(f"Bad request signature, skipping {start} byte(s).")
+                    header = header[start:] + await reader.readexactly(start)
+
+                rest    = await reader.readexactly(header[6] + 2)
+                request = header + rest
+                if request != self.parser.generateRequest(header[4], rest[:-2]):
+                    _LOGGER.debug("Malformed request, ignoring.")
+                    continue
+
+                await self.__handleRequest(writer, header[4], rest[:-2])
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except asyncio.CancelledError:
+            # Stopping the simulator, the handler ends with the connection.
+            pass
+        finally:
+            _LOGGER.info(f"Client {peer} disconnected.")
+            self.__clients.discard(writer)
+            writer.close()
+
+    async def start(self) -> None:
+        """Start listening. If port 0 was requested, the assigned port is stored in `port`."""
+        self.__server = await asyncio.start_server(self.__handleClient, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        _LOGGER.info(f"Simulated inverter (PCU version {self.pcuVersion}) listening on {self.host}:{self.port}.")
+
+    async def stop(self) -> None:
+        if self.__server:
+            for client in list(self.__clients):
+                client.close()
+            self.__server.close()
+            await self.__server.wait_closed()
+            self.__server = None
+
+    async def serveForever(self) -> None:
+        if not self.__server:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
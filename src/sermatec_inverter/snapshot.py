@@ -0,0 +1,99 @@
+import time
+
+class SermatecSnapshotPart:
+    """Parsed reply of a single command with the moment it was received."""
+
+    __slots__ = ("command", "sequence", "receivedAt", "monotonic", "data")
+
+    def __init__(self, command : int, sequence : int, receivedAt : float, monotonic : float, data : dict):
+        """
+        Args:
+            command (int): The queried command.
+            sequence (int): Number of the reply, increasing across all commands of the inverter.
+            receivedAt (float): Time of receiving as seconds since the epoch.
+            monotonic (float): Monotonic time of receiving (for measuring skew and age).
+            data (dict): Parsed reply.
+        """
+        self.command    = command
+        self.sequence   = sequence
+        self.receivedAt = receivedAt
+        self.monotonic  = monotonic
+        self.data       = data
+
+    def __repr__(self) -> str:
+        return f"SermatecSnapshotPart(command=0x{self.command:02x}, sequence={self.sequence}, receivedAt={self.receivedAt})"
+
+class SermatecMultiSnapshot:
+    """Replies of several commands taken together, e.g. battery, grid/PV, status and BMS data.
+
+    The parts are received one after another, so they describe slightly different
+    moments; `skew` is the time between the oldest and the newest part. Values derived
+    from several commands (e.g. the power balance) are only as consistent as the skew.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, parts : list[SermatecSnapshotPart]):
+        if not parts:
+            raise ValueError("Snapshot needs at least one part.")
+        # command -> part, in the order of querying
+        self.parts : dict[int, SermatecSnapshotPart] = {part.command: part for part in parts}
+
+    def __getitem__(self, command : int) -> dict:
+        return self.parts[command].data
+
+    def __contains__(self, command : int) -> bool:
+        return command in self.parts
+
+    @property
+    def commands(self) -> list[int]:
+        return list(self.parts)
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the newest part; a newer snapshot has a higher number."""
+        return max(part.sequence for part in self.parts.values())
+
+    @property
+    def skew(self) -> float:
+        """Time between receiving the oldest and the newest part [s]."""
+        times = [part.monotonic for part in self.parts.values()]
+        return max(times) - min(times)
+
+    @property
+    def timestamp(self) -> float:
+        """Time of receiving the newest part as seconds since the epoch."""
+        return max(part.receivedAt for part in self.parts.values())
+
+    @property
+    def age(self) -> float:
+        """Time since receiving the oldest part [s]."""
+        return time.monotonic() - min(part.monotonic for part in self.parts.values())
+
+    @property
+    def data(self) -> dict:
+        """Decoded data of all parts merged (as returned by getCustomDecoded() for each command)."""
+        merged = {}
+        for part in self.parts.values():
+            merged.update(part.data)
+        return merged
+
+    def toDict(self) -> dict:
+        """Get the snapshot as a dictionary with commands as hex strings."""
+        return {
+            "sequence"  : self.sequence,
+            "timestamp" : self.timestamp,
+            "skew"      : self.skew,
+            "parts"     : {
+                f"{part.command:02x}" : {
+                    "sequence"   : part.sequence,
+                    "receivedAt" : part.receivedAt,
+                    "data"       : part.data,
+                }
+                for part in self.parts.values()
+            },
+        }
+
+    def __repr__(self) -> str:
+        commands = ", ".join(f"0x{command:02x}" for command in self.parts)
+        return f"SermatecMultiSnapshot(sequence={self.sequence}, commands=[{commands}], skew={self.skew * 1000:.1f} ms)"
@@ -0,0 +1,321 @@
+import bisect
+import json
+import logging
+import math
+import mmap
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from .exceptions import *
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecColumnStore:
+    """Append-only on-disk columnar store of numeric sensor values.
+
+    Layout of the store folder:
+
+        meta.json                   description of all columns
+        <code>/timestamps.i8        little-endian int64, milliseconds since the epoch
+        <code>/<sensor key>.f8      little-endian float64, one value per timestamp (NaN = missing)
+
+    where <code> is the reply code in hex (e.g. "0b"). All columns of a reply code have
+    the same number of rows, so a column can be viewed without parsing, e.g. by
+    `numpy.memmap(path, dtype = "<f8", mode = "r")`.
+
+    Rows are buffered in memory and appended in batches without fsync. After a crash,
+    columns are aligned to the timestamp column when the store is opened again.
+    """
+
+    FORMAT_VERSION      = 1
+    META_FILE           = "meta.json"
+    TIMESTAMPS_FILE     = "timestamps.i8"
+    VALUE_SUFFIX        = ".f8"
+    ITEM_SIZE           = 8
+    DOWNSAMPLE_METHODS  = ("mean", "min", "max", "last")
+
+    def __init__(self, path : Path | str, batchSize : int = 60):
+        """
+        Args:
+            path (Path | str): Folder of the store, created if missing.
+            batchSize (int): How many rows of a reply code to buffer before writing them.
+
+        Raises:
+            StoreMalformed: meta.json exists, but can't be read.
+        """
+        self.path       = Path(path)
+        self.batchSize  = batchSize
+        self.path.mkdir(parents = True, exist_ok = True)
+
+        self.__meta : dict = {"format": "sermatec-columns", "version": self.FORMAT_VERSION, "byteorder": "little", "timestampUnit": "ms", "commands": {}}
+        metaPath = self.path / self.META_FILE
+        if metaPath.exists():
+            try:
+                self.__meta = json.loads(metaPath.read_text())
+                self.__meta["commands"]
+            except (ValueError, KeyError):
+                raise StoreMalformed(f"Store metadata '{metaPath}' malformed.")
+
+        # responseCode -> rows written to the files
+        self.__rows         : dict[int, int] = {}
+        # responseCode -> buffered timestamps
+        self.__pendingTimes : dict[int, array] = {}
+        # responseCode -> sensor key -> buffered values
+        self.__pending      : dict[int, dict[str, array]] = {}
+
+        for code in self.__meta["commands"]:
+            self.__repair(int(code, 16))
+
+    # ====================================================================
+    # Layout
+    # ====================================================================
+    def __folder(self, responseCode : int) -> Path:
+        return self.path / f"{responseCode:02x}"
+
+    def __columnPath(self, responseCode : int, key : str) -> Path:
+        return self.__folder(responseCode) / f"{key}{self.VALUE_SUFFIX}"
+
+    def __timestampsPath(self, responseCode : int) -> Path:
+        return self.__folder(responseCode) / self.TIMESTAMPS_FILE
+
+    def __columns(self, responseCode : int) -> dict:
+        return self.__meta["commands"].get(f"{responseCode:02x}", {}).get("columns", {})
+
+    def __writeMeta(self) -> None:
+        metaPath = self.path / self.META_FILE
+        temporaryPath = metaPath.with_suffix(".tmp")
+        temporaryPath.write_text(json.dumps(self.__meta, indent = 2))
+        temporaryPath.replace(metaPath)
+
+    def __repair(self, responseCode : int) -> None:
+        """Align all columns of a reply code to its timestamp column (after an interrupted write)."""
+        timestampsPath = self.__timestampsPath(responseCode)
+        rows = timestampsPath.stat().st_size // self.ITEM_SIZE if timestampsPath.exists() else 0
+        with open(timestampsPath, "ab") as timestampsFile:
+            timestampsFile.truncate(rows * self.ITEM_SIZE)
+
+        for key in self.__columns(responseCode):
+            columnPath = self.__columnPath(responseCode, key)
+            columnRows = columnPath.stat().st_size // self.ITEM_SIZE if columnPath.exists() else 0
+            if columnRows != rows:
+                _LOGGER.warning(f"Column '{columnPath}' has {columnRows} rows instead of {rows}, aligning.")
+                with open(columnPath, "ab") as columnFile:
+                    columnFile.truncate(min(columnRows, rows) * self.ITEM_SIZE)
+                    if columnRows < rows:
+                        columnFile.write(self.__toLittleEndian(array("d", [math.nan]) * (rows - columnRows)))
+
+        self.__rows[responseCode] = rows
+
+    @staticmethod
+    def __toLittleEndian(values : array) -> bytes:
+        if sys.byteorder == "big":
+            values = array(values.typecode, values)
+            values.byteswap()
+        return values.tobytes()
+
+    @staticmethod
+    def __fromLittleEndian(nativeValue : int) -> int:
+        """Get the value of an int64 stored little-endian, but read in the host's byte order."""
+        return int.from_bytes(nativeValue.to_bytes(8, sys.byteorder, signed = True), "little", signed = True)
+
+    # ====================================================================
+    # Writing
+    # ====================================================================
+    def append(self, responseCode : int, parsedData : dict, timestamp : float | None = None) -> None:
+        """Buffer numeric values of a parsed reply, writing the buffer when it is full.
+
+        Args:
+            responseCode (int): Code of the reply.
+            parsedData (dict): Parsed reply (from parseReply).
+            timestamp (float | None): Time of the reply (seconds since the epoch), now if None.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        pendingTimes = self.__pendingTimes.setdefault(responseCode, array("q"))
+        pending      = self.__pending.setdefault(responseCode, {})
+        columns      = self.__columns(responseCode)
+        pendingRows  = len(pendingTimes)
+
+        pendingTimes.append(int(timestamp * 1000))
+        for key, field in parsedData.items():
+            value = field.get("value")
+            if not isinstance(value, (int, float)):
+                continue
+
+            values = pending.get(key)
+            if values is None:
+                # Values missing in the previous buffered rows.
+                values = pending[key] = array("d", [math.nan]) * pendingRows
+                if key not in columns:
+                    self.__addColumn(responseCode, key, field)
+            values.append(value)
+
+        for values in pending.values():
+            if len(values) <= pendingRows:
+                values.append(math.nan)
+
+        if len(pendingTimes) >= self.batchSize:
+            self.flush(responseCode)
+
+    def __addColumn(self, responseCode : int, key : str, field : dict) -> None:
+        command = self.__meta["commands"].setdefault(f"{responseCode:02x}", {
+            "timestamps" : f"{responseCode:02x}/{self.TIMESTAMPS_FILE}",
+            "columns"    : {}
+        })
+        command["columns"][key] = {
+            "file"  : f"{responseCode:02x}/{key}{self.VALUE_SUFFIX}",
+            "dtype" : "<f8",
+            "name"  : field.get("name", key),
+            "unit"  : field.get("unit"),
+        }
+
+        # Values of the rows written before the column existed.
+        self.__folder(responseCode).mkdir(exist_ok = True)
+        rows = self.__rows.setdefault(responseCode, 0)
+        with open(self.__columnPath(responseCode, key), "ab") as columnFile:
+            columnFile.write(self.__toLittleEndian(array("d", [math.nan]) * rows))
+
+        self.__writeMeta()
+
+    def flush(self, responseCode : int | None = None) -> None:
+        """Write buffered rows (of a single reply code or all of them) to the files."""
+        codes = [responseCode] if responseCode is not None else list(self.__pendingTimes)
+
+        for code in codes:
+            pendingTimes = self.__pendingTimes.get(code)
+            if not pendingTimes:
+                continue
+
+            pending = self.__pending[code]
+            rows    = len(pendingTimes)
+
+            for key in self.__columns(code):
+                values = pending.get(key)
+                if values is None:
+                    values = array("d", [math.nan]) * rows
+                with open(self.__columnPath(code, key), "ab") as columnFile:
+                    columnFile.write(self.__toLittleEndian(values))
+
+            # Timestamps last, the rows are complete only when they are written.
+            with open(self.__timestampsPath(code), "ab") as timestampsFile:
+                timestampsFile.write(self.__toLittleEndian(pendingTimes))
+
+            self.__rows[code] = self.__rows.get(code, 0) + rows
+            self.__pendingTimes[code] = array("q")
+            self.__pending[code] = {}
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> "SermatecColumnStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ====================================================================
+    # Reading
+    # ====================================================================
+    def keys(self, responseCode : int | None = None) -> list[str]:
+        """Get keys of stored sensors (of a single reply code or all of them)."""
+        if responseCode is not None:
+            return list(self.__columns(responseCode))
+        return [key for command in self.__meta["commands"].values() for key in command["columns"]]
+
+    def __findCode(self, key : str) -> int:
+        for code, command in self.__meta["commands"].items():
+            if key in command["columns"]:
+                return int(code, 16)
+        raise KeyError(key)
+
+    def query(self, key : str, since : float | None = None, until : float | None = None, step : float | None = None, method : str = "mean") -> tuple[array, array]:
+        """Get values of a sensor in a time range (inclusive), the oldest first.
+
+        The files are memory-mapped, only the requested range is read.
+
+        Args:
+            key (str): Sensor key (as in parseReply).
+            since (float | None): Start of the range (seconds since the epoch), from the first value if None.
+            until (float | None): End of the range (seconds since the epoch), to the last value if None.
+            step (float | None): Downsample to buckets of this length [s], no downsampling if None.
+            method (str): Value of a bucket: "mean", "min", "max" or "last" (NaNs are skipped).
+
+        Returns:
+            tuple[array, array]: Timestamps [ms] (starts of buckets when downsampling) and values.
+
+        Raises:
+            KeyError: The sensor is not stored.
+            ValueError: Unknown downsampling method.
+        """
+        if method not in self.DOWNSAMPLE_METHODS:
+            raise ValueError(f"Unknown downsampling method '{method}'.")
+
+        responseCode = self.__findCode(key)
+        self.flush(responseCode)
+
+        rows = self.__rows.get(responseCode, 0)
+        if not rows:
+            return array("q"), array("d")
+
+        with open(self.__timestampsPath(responseCode), "rb") as timestampsFile, open(self.__columnPath(responseCode, key), "rb") as columnFile:
+            with mmap.mmap(timestampsFile.fileno(), rows * self.ITEM_SIZE, access = mmap.ACCESS_READ) as timestampsMap, \
+                 mmap.mmap(columnFile.fileno(), rows * self.ITEM_SIZE, access = mmap.ACCESS_READ) as columnMap:
+                timestampsView = memoryview(timestampsMap).cast("q")
+                columnView     = memoryview(columnMap).cast("d")
+                # The view is in the host's byte order, compare real (little-endian) timestamps.
+                timestampKey = None if sys.byteorder == "little" else self.__fromLittleEndian
+                try:
+                    first = 0 if since is None else bisect.bisect_left(timestampsView, int(since * 1000), key = timestampKey)
+                    last  = rows if until is None else bisect.bisect_right(timestampsView, int(until * 1000), key = timestampKey)
+
+                    timestamps = array("q", timestampsView[first:max(first, last)])
+                    values     = array("d", columnView[first:max(first, last)])
+                finally:
+                    timestampsView.release()
+                    columnView.release()
+
+        if sys.byteorder == "big":
+            timestamps.byteswap()
+            values.byteswap()
+
+        if step is None or not timestamps:
+            return timestamps, values
+
+        return self.__downsample(timestamps, values, int(step * 1000), method)
+
+    @staticmethod
+    def __downsample(timestamps : array, values : array, stepMs : int, method : str) -> tuple[array, array]:
+        bucketTimes  = array("q")
+        bucketValues = array("d")
+
+        bucketStart = None
+        bucket : list[float] = []
+
+        def close() -> None:
+            bucketTimes.append(bucketStart)
+            if not bucket:
+                bucketValues.append(math.nan)
+            elif method == "mean":
+                bucketValues.append(math.fsum(bucket) / len(bucket))
+            elif method == "min":
+                bucketValues.append(min(bucket))
+            elif method == "max":
+                bucketValues.append(max(bucket))
+            else:
+                bucketValues.append(bucket[-1])
+
+        for timestamp, value in zip(timestamps, values):
+            start = timestamp - timestamp % stepMs
+            if start != bucketStart:
+                if bucketStart is not None:
+                    close()
+                bucketStart = start
+                bucket = []
+            if not math.isnan(value):
+                bucket.append(value)
+        close()
+
+        return bucketTimes, bucketValues
@@ -0,0 +1,43 @@
+class SermatecObserver:
+    """Base class for tracing communication with the inverter and parsing.
+
+    Override only the callbacks you need. All timestamps come from `time.monotonic()`.
+    The callbacks are called synchronously from the polling code, so they should
+    be quick; hand the data over to another task if heavy processing is needed.
+
+    Observers are registered with `Sermatec.addObserver()` (which registers them
+    with its parser as well) or `SermatecProtocolParser.addObserver()`. When no observer
+    is registered, no timestamps are taken and no events are built.
+    """
+
+    def onConnect(self, host : str, port : int, startedAt : float, finishedAt : float, success : bool) -> None:
+        """Connection attempt finished."""
+        pass
+
+    def onQueryStart(self, command : int, timestamp : float) -> None:
+        """A query (possibly consisting of multiple attempts) started."""
+        pass
+
+    def onSend(self, command : int, attempt : int, data : bytes, timestamp : float) -> None:
+        """A request was written to the socket."""
+        pass
+
+    def onReceive(self, command : int, attempt : int, index : int, data : bytes, timestamp : float) -> None:
+        """A single response (index-th of the expected ones) was received."""
+        pass
+
+    def onIntegrityCheck(self, command : int, attempt : int, failureReason : str | None, timestamp : float) -> None:
+        """Integrity of the responses was checked, failureReason is None on success."""
+        pass
+
+    def onRetry(self, command : int, attempt : int, reason : str, timestamp : float) -> None:
+        """The attempt failed and another one follows. Reason is e.g. "sendTimeout", "recvTimeout" or "integrity:checksum"."""
+        pass
+
+    def onQueryEnd(self, command : int, attempts : int, success : bool, startedAt : float, finishedAt : float) -> None:
+        """The query finished, successfully or not."""
+        pass
+
+    def onParse(self, command : int, version : int, startedAt : float, finishedAt : float) -> None:
+        """A reply was parsed."""
+        pass
@@ -0,0 +1,80 @@
+import logging
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecTranslations(Mapping):
+    """Table translating protocol field names to a language, read from a CSV file.
+
+    Tables are shared by all parsers and inverters in the process (see forFile()) and
+    the file is read only on the first lookup, so unused languages cost nothing.
+    """
+
+    FOLDER = Path(__file__).parent / "translations"
+
+    # resolved path -> table
+    __registry : dict[Path, "SermatecTranslations"] = {}
+
+    def __init__(self, path : Path):
+        """
+        Args:
+            path (Path): CSV file with lines "original name";"translated name".
+        """
+        self.path       = Path(path)
+        self.language   = self.path.stem
+        self.__names    : dict[str, str] | None = None
+
+    @classmethod
+    def forFile(cls, path : Path) -> "SermatecTranslations":
+        """Get the shared table of the file (created on the first use).
+
+        Raises:
+            FileNotFoundError: The file doesn't exist.
+        """
+        path = Path(path).resolve()
+        table = cls.__registry.get(path)
+        if table is None:
+            if not path.exists():
+                raise FileNotFoundError("Required translation not exists!")
+            table = cls.__registry[path] = cls(path)
+        return table
+
+    @classmethod
+    def forLanguage(cls, language : str) -> "SermatecTranslations":
+        """Get the shared table of a bundled language (e.g. "en", "cs").
+
+        Raises:
+            FileNotFoundError: The language is not available.
+        """
+        return cls.forFile(cls.FOLDER / f"{language}.csv")
+
+    @classmethod
+    def languages(cls) -> list[str]:
+        """Get codes of the bundled languages."""
+        return sorted(path.stem for path in cls.FOLDER.glob("*.csv"))
+
+    @property
+    def names(self) -> dict[str, str]:
+        if self.__names is None:
+            names = {}
+            with self.path.open("r") as langFile:
+                for line in langFile.readlines():
+                    splitLine = line.replace("\"", "").replace("\n", "").split(";")
+                    names[splitLine[0]] = splitLine[1]
+            _LOGGER.debug(f"Loaded {len(names)} translations from {self.path.name}.")
+            self.__names = names
+        return self.__names
+
+    def __getitem__(self, name : str) -> str:
+        return self.names[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, name : str, default : str | None = None) -> str | None:
+        # Faster than Mapping.get(), called for every rendered field.
+        return self.names.get(name, default)
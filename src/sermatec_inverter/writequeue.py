@@ -0,0 +1,117 @@
+import logging
+import asyncio
+from typing import TYPE_CHECKING
+
+from .exceptions import *
+
+if TYPE_CHECKING:
+    from . import Sermatec
+
+_LOGGER = logging.getLogger(__name__)
+
+class SermatecWriteQueue:
+    """Write-behind queue coalescing rapid parameter changes.
+
+    The first write opens a window; writes arriving during the window replace older
+    values of the same tag. When the window closes, all pending values (of any set
+    command) are written by a single `Sermatec.setMany()` call, which orders the commands
+    (e.g. turning the inverter off before values requiring it), and every caller's
+    future gets its outcome.
+    """
+
+    def __init__(self, smc : "Sermatec", window : float = 0.5, verify : bool = False):
+        """
+        Args:
+            smc (Sermatec): Connected inverter to write to.
+            window (float): How long to collect writes before sending them [s].
+            verify (bool): Verify the written values by a read-back after each batch (costs a
+                parameter query per batch; the parameter cache is updated by the write anyway).
+        """
+        self.smc        = smc
+        self.window     = window
+        self.verify     = verify
+
+        # tag -> friendly value
+        self.__pending  : dict[str, bool | int | str] = {}
+        # Futures of all callers waiting for the pending batch.
+        self.__waiters  : list[asyncio.Future] = []
+        self.__timer    : asyncio.TimerHandle | None = None
+        self.__tasks    : set[asyncio.Task] = set()
+        # Writes are serialized, the connection is shared.
+        self.__lock     = asyncio.Lock()
+
+    def set(self, tag : str, value : bool | int | str) -> asyncio.Future:
+        """Queue a parameter write.
+
+        The value is validated immediately, so invalid values do not spoil the whole batch.
+
+        Args:
+            tag (str): Tag of the parameter.
+            value (bool | int | str): Friendly value.
+
+        Returns:
+            asyncio.Future: Resolved when the batch containing the value is written
+                (with an exception if the write failed).
+
+        Raises:
+            ParameterNotFound: This parameter is not supported.
+            ValueError: If supplied value is invalid.
+        """
+        self.smc.parser.encodeParameter(tag, value)
+
+        loop   = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self.__pending[tag] = value
+        self.__waiters.append(future)
+
+        if self.__timer is None:
+            self.__timer = loop.call_later(self.window, self.__startFlush)
+
+        return future
+
+    def hasPending(self) -> bool:
+        """Check whether some writes are queued or being sent."""
+        return bool(self.__pending or self.__tasks)
+
+    def __startFlush(self) -> None:
+        task = asyncio.ensure_future(self.__flushPending())
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+    async def __flushPending(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+
+        values,  self.__pending = self.__pending, {}
+        waiters, self.__waiters = self.__waiters, []
+        if not values:
+            return
+
+        _LOGGER.debug(f"Writing {len(values)} coalesced value(s) of {len(waiters)} request(s).")
+
+        try:
+            async with self.__lock:
+                await self.smc.setMany(values, verify = self.verify)
+        except asyncio.CancelledError:
+            for waiter in waiters:
+                waiter.cancel()
+            raise
+        except BaseException as e:
+            # Library exceptions derive from BaseException.
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            if isinstance(e, (KeyboardInterrupt, SystemExit)):
+                raise
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def flush(self) -> None:
+        """Write all pending values now and wait for running writes."""
+        await self.__flushPending()
+        if self.__tasks:
+            await asyncio.gather(*self.__tasks, return_exceptions = True)